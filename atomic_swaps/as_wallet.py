@@ -3,7 +3,8 @@ import clvm
 from chiasim.hashable import CoinSolution, Program, ProgramHash, SpendBundle
 from clvm_tools import binutils
 from chiasim.validation.Conditions import ConditionOpcode
-from utilities.puzzle_utilities import puzzlehash_from_string
+from utilities.assembler import assemble, program_hash
+from utilities.puzzle_utilities import check_string_is_hex, puzzlehash_from_string
 from utilities.keys import signature_for_solution, sign_f_for_keychain
 
 
@@ -12,7 +13,7 @@ def build_spend_bundle(coin, solution, sign_f):
     signature = signature_for_solution(solution, sign_f)
     return SpendBundle([coin_solution], signature)
 
-from puzzles.p2_delegated_puzzle import puzzle_for_pk
+from puzzles.p2_delegated_puzzle import puzzle_for_pk, puzzle_hash_for_pk
 
 
 # ASWallet is subclass of Wallet
@@ -24,12 +25,33 @@ class ASWallet(Wallet):
         super().__init__()
         return
 
-    def notify(self, additions, deletions):
-        super().notify(additions, deletions)
+    def get_extra_state(self):
+        return dict(as_pending_utxos=self.as_pending_utxos, overlook=self.overlook,
+                    as_swap_list=self.as_swap_list)
+
+    # swap puzzle hashes depend on the other party and the secret
+    def watched_puzzle_hashes(self):
+        return None
+
+    # hex strings, or whatever stands in for one not known yet
+    def as_puzzlehashes(self):
         puzzlehashes = []
         for swap in self.as_swap_list:
             puzzlehashes.append(swap["outgoing puzzlehash"])
             puzzlehashes.append(swap["incoming puzzlehash"])
+        return puzzlehashes
+
+    def refresh_watch_filter(self):
+        super().refresh_watch_filter()
+        puzzlehashes = tuple(self.as_puzzlehashes())
+        self.watch_group("as", puzzlehashes, lambda: [
+            bytes.fromhex(_) for _ in puzzlehashes
+            if isinstance(_, str) and len(_) == 64 and check_string_is_hex(_)])
+
+    def notify(self, additions, deletions):
+        additions, deletions = self.filter_block(additions, deletions)
+        super().notify(additions, deletions)
+        puzzlehashes = self.as_puzzlehashes()
         if puzzlehashes != []:
             self.as_notify(additions, puzzlehashes)
 
@@ -66,8 +88,8 @@ class ASWallet(Wallet):
     def as_make_puzzle(self, as_pubkey_sender, as_pubkey_receiver, as_amount, as_timelock_block, as_secret_hash):
         as_pubkey_sender_cl = f"0x{as_pubkey_sender.hex()}"
         as_pubkey_receiver_cl = f"0x{as_pubkey_receiver.hex()}"
-        as_payout_puzzlehash_receiver = ProgramHash(puzzle_for_pk(as_pubkey_receiver))
-        as_payout_puzzlehash_sender = ProgramHash(puzzle_for_pk(as_pubkey_sender))
+        as_payout_puzzlehash_receiver = puzzle_hash_for_pk(as_pubkey_receiver)
+        as_payout_puzzlehash_sender = puzzle_hash_for_pk(as_pubkey_sender)
         payout_receiver = f"(c (q 0x{ConditionOpcode.CREATE_COIN.hex()}) (c (q 0x{as_payout_puzzlehash_receiver.hex()}) (c (q {as_amount}) (q ()))))"
         payout_sender = f"(c (q 0x{ConditionOpcode.CREATE_COIN.hex()}) (c (q 0x{as_payout_puzzlehash_sender.hex()}) (c (q {as_amount}) (q ()))))"
         aggsig_receiver = f"(c (q 0x{ConditionOpcode.AGG_SIG.hex()}) (c (q {as_pubkey_receiver_cl}) (c (sha256tree (a)) (q ()))))"
@@ -77,11 +99,11 @@ class ASWallet(Wallet):
         sender_puz = "(c " + aggsig_sender + " (c " + timelock + " (c " + payout_sender + " (q ()))))"
         as_puz_sender = "((c (i (= (f (a)) (q 77777)) (q " + sender_puz + ") (q (x (q 'not a valid option'))) ) (a)))"
         as_puz = "((c (i (= (f (a)) (q 33333)) (q " + receiver_puz + " (q " + as_puz_sender + ")) (a)))"
-        return Program(binutils.assemble(as_puz))
+        return assemble(as_puz)
 
     def as_get_new_puzzlehash(self, as_pubkey_sender, as_pubkey_receiver, as_amount, as_timelock_block, as_secret_hash):
         as_puz = self.as_make_puzzle(as_pubkey_sender, as_pubkey_receiver, as_amount, as_timelock_block, as_secret_hash)
-        as_puzzlehash = ProgramHash(as_puz)
+        as_puzzlehash = program_hash(as_puz)
         return as_puzzlehash
 
     # 33333 is the receiver solution code prefix
@@ -95,7 +117,7 @@ class ASWallet(Wallet):
     def as_make_solution_sender(self):
         sol = "(77777 "
         sol += ")"
-        return Program(binutils.assemble(sol))
+        return assemble(sol)
 
     # finds the secret used to spend a swap coin so that it can be used to spend the swap's other coin
     def pull_preimage(self, body, removals):
@@ -2,9 +2,8 @@ import asyncio
 import os
 from atomic_swaps.as_wallet import ASWallet
 from chiasim.clients.ledger_sim import connect_to_ledger_sim
-from chiasim.wallet.deltas import additions_for_body, removals_for_body
-from chiasim.hashable import Coin
-from chiasim.hashable.Body import BodyList
+from utilities.chain_follower import ChainFollower
+from utilities.instrumentation import enable_from_environment
 from utilities.decorations import print_leaf, divider, prompt, start_list, close_list, selectable, informative
 from clvm_tools import binutils
 from utilities.puzzle_utilities import pubkey_format, secret_hash_format, puzzlehash_from_string
@@ -1080,19 +1079,11 @@ def spend_coin(wallet, as_contacts):
 
               
 async def get_update(wallet, ledger_api, most_recent_header, as_contacts):
-    if most_recent_header is None:
-        r = await ledger_api.get_all_blocks()
-    else:
-        r = await ledger_api.get_recent_blocks(most_recent_header=most_recent_header)
-    update_list = BodyList.from_bytes(r)
-    for body in update_list:
-        additions = list(additions_for_body(body))
-        removals = removals_for_body(body)
-        removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
+    for block in await ChainFollower(ledger_api, coin_cache=wallet.coin_cache).recent_blocks(most_recent_header):
         if wallet.as_swap_list != []:
-            wallet.pull_preimage(body, removals)
-        remove_swap_instances(wallet, as_contacts, removals)
-        wallet.notify(additions, removals)
+            wallet.pull_preimage(block.body, block.removals)
+        remove_swap_instances(wallet, as_contacts, block.removals)
+        wallet.notify(block.additions, block.removals)
 
 
 async def update_ledger(wallet, ledger_api, most_recent_header, as_contacts):
@@ -1116,9 +1107,8 @@ async def farm_block(wallet, ledger_api, as_contacts):
     r = await ledger_api.next_block(coinbase_puzzle_hash=coinbase_puzzle_hash, fees_puzzle_hash=fees_puzzle_hash)
     body = r["body"]
     most_recent_header = r['header']
-    additions = list(additions_for_body(body))
-    removals = removals_for_body(body)
-    removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
+    block, = await ChainFollower(ledger_api, coin_cache=wallet.coin_cache).blocks_for_bodies([body])
+    additions, removals = block.additions, block.removals
     remove_swap_instances(wallet, as_contacts, removals)
     wallet.notify(additions, removals)
     del wallet.overlook[:]
@@ -1197,6 +1187,7 @@ async def main_loop():
 
 
 def main():
+    enable_from_environment()
     run = asyncio.get_event_loop().run_until_complete
     run(main_loop())
 
@@ -5,8 +5,10 @@ from chiasim.hashable.Coin import Coin
 from chiasim.hashable.CoinSolution import CoinSolutionList
 from clvm_tools import binutils
 from chiasim.puzzles.p2_delegated_puzzle import puzzle_for_pk
-from .ap_wallet_a_functions import ap_make_puzzle, ap_make_aggregation_puzzle
+from .ap_wallet_a_functions import ap_make_puzzle, ap_make_aggregation_puzzle, ap_get_new_puzzlehash
+from utilities.assembler import assemble, assemble_with_hash, program_hash
 from utilities.puzzle_utilities import puzzlehash_from_string
+from utilities.signing import spend_bundle_for_signatures
 from chiasim.validation.Conditions import ConditionOpcode
 
 
@@ -19,8 +21,16 @@ class APWallet(Wallet):
         self.approved_change_puzzle = None
         self.approved_change_signature = None
         self.temp_coin = None
+        # (coin puzzle hash, aggregation puzzle hash)
+        self.ap_aggregation = None
         return
 
+    AP_STATE = ["aggregation_coins", "a_pubkey", "AP_puzzlehash", "approved_change_puzzle",
+                "approved_change_signature", "temp_coin"]
+
+    def get_extra_state(self):
+        return {key: getattr(self, key) for key in self.AP_STATE}
+
     def set_sender_values(self, AP_puzzlehash, a_pubkey_used):
         if isinstance(AP_puzzlehash, str):
             self.AP_puzzlehash = puzzlehash_from_string(AP_puzzlehash)
@@ -56,13 +66,40 @@ class APWallet(Wallet):
             if hash == ProgramHash(puzzle_for_pk(bytes(pubkey))):
                 return (pubkey, self.extended_secret_key.secret_exponent_for_child(child))
             if a_pubkey_used is not None and b_pubkey_used is None:
-                if hash == ProgramHash(ap_make_puzzle(a_pubkey_used, bytes(pubkey))):
+                if hash == ap_get_new_puzzlehash(a_pubkey_used, bytes(pubkey)):
                     return (pubkey, self.extended_secret_key.secret_exponent_for_child(child))
             elif a_pubkey_used is None and b_pubkey_used is not None:
-                if hash == ProgramHash(ap_make_puzzle(bytes(pubkey), b_pubkey_used)):
+                if hash == ap_get_new_puzzlehash(bytes(pubkey), b_pubkey_used):
                     return (pubkey, self.extended_secret_key.secret_exponent_for_child(child))
 
+    # AP puzzle hashes also depend on the authoriser's key
+    def watched_puzzle_hashes(self):
+        return None
+
+    def refresh_watch_filter(self):
+        super().refresh_watch_filter()
+        names = frozenset(coin.name() for coin in self.my_utxos)
+        self.watch_group("ap", (self.AP_puzzlehash, names), self.ap_puzzle_hashes, lambda: names)
+
+    # The AP coin and coins locked for aggregating into a coin held. The
+    # coins held are watched as parents too, since ac_notify learns they
+    # were spent from their children.
+    def ap_puzzle_hashes(self):
+        puzzle_hashes = [self.ap_aggregation_puzzle_hash(coin.puzzle_hash) for coin in self.my_utxos]
+        if self.AP_puzzlehash is not None:
+            puzzle_hashes.append(self.AP_puzzlehash)
+        return puzzle_hashes
+
+    # The puzzle hash of coins locked for aggregating into a coin with
+    # puzzle_hash, kept for the last puzzle_hash asked about, which is
+    # nearly always that of the one coin held
+    def ap_aggregation_puzzle_hash(self, puzzle_hash):
+        if self.ap_aggregation is None or self.ap_aggregation[0] != puzzle_hash:
+            self.ap_aggregation = (puzzle_hash, program_hash(ap_make_aggregation_puzzle(puzzle_hash)))
+        return self.ap_aggregation[1]
+
     def notify(self, additions, deletions):
+        additions, deletions = self.filter_block(additions, deletions)
         super().notify(additions, deletions)
         self.my_utxos = self.temp_utxos
         self.ap_notify(additions)
@@ -95,7 +132,7 @@ class APWallet(Wallet):
                     self.my_utxos = my_utxos_copy.copy()
                     self.temp_coin = my_utxos_copy.copy().pop()
 
-            if ProgramHash(ap_make_aggregation_puzzle(self.temp_coin.puzzle_hash)) == coin.puzzle_hash:
+            if coin.puzzle_hash == self.ap_aggregation_puzzle_hash(self.temp_coin.puzzle_hash):
                 self.aggregation_coins.add(coin)
                 spend_bundle = self.ap_generate_signed_aggregation_transaction()
                 spend_bundle_list.append(spend_bundle)
@@ -145,20 +182,15 @@ class APWallet(Wallet):
     # this is for sending a locked coin
     # Wallet B must sign the whole transaction, and the appropriate puzhash signature from A must be included
     def ap_sign_transaction(self, spends: (Program, [CoinSolution]), signatures_from_a):
-        sigs = []
+        items = []
         for puzzle, solution in spends:
             pubkey, secret_exponent = self.get_keys(
                 solution.coin.puzzle_hash, self.a_pubkey)
-            signature = BLSSignature.create(ProgramHash(Program(solution.solution)), secret_exponent)
-            sigs.append(signature)
+            items.append((secret_exponent, ProgramHash(Program(solution.solution))))
+        sigs = self.signing_engine.sign_messages(items)
         for s in signatures_from_a:
             sigs.append(s)
-        aggsig = BLSSignature.aggregate(sigs)
-        solution_list = CoinSolutionList(
-            [CoinSolution(coin_solution.coin, clvm.to_sexp_f([puzzle, coin_solution.solution])) for
-             (puzzle, coin_solution) in spends])
-        spend_bundle = SpendBundle(solution_list, aggsig)
-        return spend_bundle
+        return spend_bundle_for_signatures(spends, sigs)
 
     # this is for sending a recieved ap coin, not sending a new ap coin
     def ap_generate_signed_transaction(self, puzzlehash_amount_list, signatures_from_a):
@@ -205,10 +237,10 @@ class APWallet(Wallet):
             consolidating_coin, clvm.to_sexp_f([puzzle, solution])))
         # Spend lock
         puzstring = f"(r (c (q 0x{consolidating_coin.name().hex()}) (q ())))"
-        puzzle = Program(binutils.assemble(puzstring))
-        solution = Program(binutils.assemble("()"))
-        list_of_coinsolutions.append(CoinSolution(Coin(self.temp_coin, ProgramHash(
-            puzzle), 0), clvm.to_sexp_f([puzzle, solution])))
+        puzzle, puzzle_hash = assemble_with_hash(puzstring)
+        solution = assemble("()")
+        list_of_coinsolutions.append(CoinSolution(Coin(self.temp_coin, puzzle_hash, 0),
+                                                  clvm.to_sexp_f([puzzle, solution])))
 
         self.temp_coin = Coin(self.temp_coin, self.temp_coin.puzzle_hash,
                               self.temp_coin.amount + consolidating_coin.amount)
@@ -1,5 +1,5 @@
-from chiasim.hashable import Program, ProgramHash
-from clvm_tools import binutils
+from puzzles.puzzle_template import PuzzleTemplate
+from utilities.assembler import assemble, program_hash
 from utilities.puzzle_utilities import pubkey_format
 from chiasim.validation.Conditions import ConditionOpcode
 
@@ -23,8 +23,9 @@ def merge_two_lists(list1=None, list2=None):
     return ret
 
 
-# this creates our authorised payee puzzle
-def ap_make_puzzle(a_pubkey_serialized, b_pubkey_serialized):
+# this creates the source of our authorised payee puzzle, it's called with
+# placeholder atoms once to build AP_TEMPLATE, see puzzles.puzzle_template
+def ap_puzzle_source(a_pubkey_serialized, b_pubkey_serialized):
     a_pubkey = pubkey_format(a_pubkey_serialized)
     b_pubkey = pubkey_format(b_pubkey_serialized)
 
@@ -49,7 +50,15 @@ def ap_make_puzzle(a_pubkey_serialized, b_pubkey_serialized):
          (c {create_lock} (c {create_consolidated} (q ())))))"
 
     puz = f"((c (i (= (f (a)) (q 1)) (q {mode_one}) (q {mode_two})) (a)))"
-    return Program(binutils.assemble(puz))
+    return puz
+
+
+AP_TEMPLATE = PuzzleTemplate(ap_puzzle_source, 2)
+
+
+# this creates our authorised payee puzzle
+def ap_make_puzzle(a_pubkey_serialized, b_pubkey_serialized):
+    return AP_TEMPLATE.program(pubkey_format(a_pubkey_serialized), pubkey_format(b_pubkey_serialized))
 
 
 def ap_make_aggregation_puzzle(wallet_puzzle):
@@ -61,16 +70,16 @@ def ap_make_aggregation_puzzle(wallet_puzzle):
     parent_coin_id = f"(sha256 (f (r (a))) (q 0x{wallet_puzzle.hex()}) (f (r (r (a)))))"
     input_of_lock = f'(c (q 0x{ConditionOpcode.ASSERT_COIN_CONSUMED.hex()}) (c (sha256 {parent_coin_id} {lock_puzzle} (q 0)) (q ())))'
     puz = f"(c {me_is_my_id} (c {input_of_lock} (q ())))"
-    return Program(binutils.assemble(puz))
+    return assemble(puz)
 
 
 # returns the ProgramHash of a new puzzle
 def ap_get_new_puzzlehash(a_pubkey_serialized, b_pubkey_serialized):
-    return ProgramHash(ap_make_puzzle(a_pubkey_serialized, b_pubkey_serialized))
+    return AP_TEMPLATE.program_hash(pubkey_format(a_pubkey_serialized), pubkey_format(b_pubkey_serialized))
 
 
 def ap_get_aggregation_puzzlehash(wallet_puzzle):
-    return ProgramHash(ap_make_aggregation_puzzle(wallet_puzzle))
+    return program_hash(ap_make_aggregation_puzzle(wallet_puzzle))
 
 
 # this allows wallet A to approve of new puzzlehashes/spends from wallet B that weren't in the original list
@@ -3,9 +3,8 @@ from authorised_payees.ap_wallet import APWallet
 from authorised_payees.ap_wallet_a_functions import ap_get_aggregation_puzzlehash
 from utilities.decorations import print_leaf, divider, prompt, start_list, close_list, selectable, informative
 from chiasim.clients.ledger_sim import connect_to_ledger_sim
-from chiasim.wallet.deltas import additions_for_body, removals_for_body
-from chiasim.hashable import Coin
-from chiasim.hashable.Body import BodyList
+from utilities.chain_follower import ChainFollower
+from utilities.instrumentation import enable_from_environment
 from utilities.puzzle_utilities import pubkey_format, puzzlehash_from_string, BLSSignature_from_string
 from binascii import hexlify
 
@@ -102,25 +101,16 @@ async def new_block(wallet, ledger_api):
     r = await ledger_api.next_block(coinbase_puzzle_hash=coinbase_puzzle_hash, fees_puzzle_hash=fees_puzzle_hash)
     body = r["body"]
     most_recent_header = r['header']
-    additions = list(additions_for_body(body))
-    removals = removals_for_body(body)
-    removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
+    block, = await ChainFollower(ledger_api, coin_cache=wallet.coin_cache).blocks_for_bodies([body])
+    additions, removals = block.additions, block.removals
     wallet.notify(additions, removals)
     return most_recent_header
 
 
 async def update_ledger(wallet, ledger_api, most_recent_header):
-    if most_recent_header is None:
-        r = await ledger_api.get_all_blocks()
-    else:
-        r = await ledger_api.get_recent_blocks(most_recent_header=most_recent_header)
-    update_list = BodyList.from_bytes(r)
-    for body in update_list:
-        additions = list(additions_for_body(body))
-        print(additions)
-        removals = removals_for_body(body)
-        removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
-        spend_bundle_list = wallet.notify(additions, removals)
+    for block in await ChainFollower(ledger_api, coin_cache=wallet.coin_cache).recent_blocks(most_recent_header):
+        print(block.additions)
+        spend_bundle_list = wallet.notify(block.additions, block.removals)
         #breakpoint()
         if spend_bundle_list is not None:
             for spend_bundle in spend_bundle_list:
@@ -215,6 +205,7 @@ async def main_loop():
 
 
 def main():
+    enable_from_environment()
     run = asyncio.get_event_loop().run_until_complete
     run(main_loop())
 
@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+from chiasim.atoms import hexbytes
+from chiasim.hashable import Coin, ProgramHash
+from chiasim.wallet.deltas import additions_for_body, removals_for_body
+
+from authorised_payees import ap_wallet_a_functions
+from authorised_payees.ap_wallet import APWallet
+from multisig.signer import generate_signatures
+from multisig.wallet import MultisigHDWallet, spend_coin, finalize_pst
+from multisig.address import puzzle_hash_for_address
+from rate_limit.rl_wallet import RLWallet
+from standard_wallet.wallet import Wallet
+from utilities.BLSHDKey import BLSPrivateHDKey
+
+from .harness import make_client_server, result, time_call
+
+
+def next_block(remote, reward_recipient):
+    run = asyncio.get_event_loop().run_until_complete
+    r = run(remote.next_block(coinbase_puzzle_hash=reward_recipient.get_new_puzzlehash(),
+                              fees_puzzle_hash=reward_recipient.get_new_puzzlehash()))
+    body = r["body"]
+    additions = list(additions_for_body(body))
+    return additions, list(removals_for_body(body))
+
+
+def notify_all(remote, wallets, additions, removal_names, index=None):
+    """
+    Notify each wallet of a block, pushing any spend bundles it returns,
+    and return how long each wallet's notify took.
+    """
+    run = asyncio.get_event_loop().run_until_complete
+    removals = [Coin.from_bytes(run(remote.hash_preimage(hash=_))) for _ in removal_names]
+    times = []
+    for wallet in wallets:
+        start = time.perf_counter()
+        if isinstance(wallet, RLWallet):
+            spend_bundles = wallet.notify(additions, removals, index)
+        else:
+            spend_bundles = wallet.notify(additions, removals)
+        times.append(time.perf_counter() - start)
+        for spend_bundle in spend_bundles or []:
+            run(remote.push_tx(tx=spend_bundle))
+    return times
+
+
+def commit(remote, wallets, reward_recipient):
+    run = asyncio.get_event_loop().run_until_complete
+    additions, removals = next_block(remote, reward_recipient)
+    index = int(run(remote.get_tip())["tip_index"])
+    return notify_all(remote, wallets, additions, removals, index)
+
+
+def bench_rl_aggregation():
+    """
+    Time for an RL wallet to notice a coin sent to its aggregation puzzle
+    and build the signed spend that absorbs it.
+    """
+    run = asyncio.get_event_loop().run_until_complete
+    remote = make_client_server()
+    wallet_a = RLWallet()
+    wallet_b = RLWallet()
+    wallets = [wallet_a, wallet_b]
+    limit, interval = 10, 1
+    commit(remote, wallets, wallet_a)
+
+    origin_coin = wallet_a.my_utxos.copy().pop()
+    wallet_b_pk = bytes(wallet_b.get_next_public_key())
+    wallet_b.set_origin(origin_coin)
+    wallet_b.limit = limit
+    wallet_b.interval = interval
+    clawback_pk = hexbytes(bytes(wallet_a.get_next_public_key()))
+    wallet_b.rl_clawback_pk = clawback_pk
+    rl_puzzle = wallet_b.rl_puzzle_for_pk(wallet_b_pk, limit, interval, origin_coin.name(), clawback_pk)
+    rl_puzzlehash = ProgramHash(rl_puzzle)
+    spend_bundle = wallet_a.generate_signed_transaction_with_origin(5000, rl_puzzlehash, origin_coin.name())
+    run(remote.push_tx(tx=spend_bundle))
+    commit(remote, wallets, Wallet())
+
+    agg_puzzlehash = wallet_b.rl_get_aggregation_puzzlehash(rl_puzzlehash)
+    spend_bundle = wallet_a.generate_signed_transaction(5000, agg_puzzlehash)
+    run(remote.push_tx(tx=spend_bundle))
+    times = commit(remote, wallets, Wallet())
+    commit(remote, wallets, Wallet())
+    assert wallet_b.current_rl_balance == 10000
+    return [result("rl_aggregation", times[1])]
+
+
+def bench_ap_aggregation():
+    """
+    Time for an AP wallet to notice coins sent to its aggregation puzzle
+    and build the signed spend that absorbs them.
+    """
+    run = asyncio.get_event_loop().run_until_complete
+    remote = make_client_server()
+    wallet_a = Wallet()
+    wallet_b = APWallet()
+    wallets = [wallet_a, wallet_b]
+    a_pubkey = bytes(wallet_a.get_next_public_key())
+    b_pubkey = bytes(wallet_b.get_next_public_key())
+    ap_puzzlehash = ap_wallet_a_functions.ap_get_new_puzzlehash(a_pubkey, b_pubkey)
+    wallet_b.set_sender_values(ap_puzzlehash, a_pubkey)
+    wallet_b.set_approved_change_signature(ap_wallet_a_functions.ap_sign_output_newpuzzlehash(
+        ap_puzzlehash, wallet_a, a_pubkey))
+    commit(remote, wallets, wallet_a)
+
+    spend_bundle = wallet_a.generate_signed_transaction(5000, ap_puzzlehash)
+    run(remote.push_tx(tx=spend_bundle))
+    commit(remote, wallets, Wallet())
+
+    aggregation_puzzlehash = ap_wallet_a_functions.ap_get_aggregation_puzzlehash(ap_puzzlehash)
+    spend_bundle = wallet_a.generate_signed_transaction(5000, aggregation_puzzlehash)
+    run(remote.push_tx(tx=spend_bundle))
+    times = commit(remote, wallets, Wallet())
+    commit(remote, wallets, Wallet())
+    assert wallet_b.current_balance == 10000
+    return [result("ap_aggregation", times[1])]
+
+
+def bench_finalize_pst(m_of_n_list):
+    """
+    Time for multisig finalize_pst to assemble a spend bundle from M
+    signers' signatures, for each (M, N).
+    """
+    run = asyncio.get_event_loop().run_until_complete
+    results = []
+    for m, n in m_of_n_list:
+        remote = make_client_server()
+        private_wallets = [BLSPrivateHDKey.from_seed(b"%d" % _) for _ in range(n)]
+        wallet = MultisigHDWallet(m, [_.public_hd_key() for _ in private_wallets])
+        puzzle_hash = puzzle_hash_for_address(wallet.address_for_index(0))
+        r = run(remote.next_block(coinbase_puzzle_hash=puzzle_hash, fees_puzzle_hash=puzzle_hash))
+        coin = r["body"].coinbase_coin
+        pst = spend_coin(wallet, [coin], wallet.address_for_index(1))
+        sigs = []
+        for private_wallet in private_wallets[:m]:
+            sigs.extend(generate_signatures(pst, private_wallet))
+        seconds, (spend_bundle, summary_list) = time_call(lambda: finalize_pst(wallet, pst, sigs))
+        assert spend_bundle is not None
+        results.append(result("finalize_pst", seconds, m=m, n=n))
+    return results
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+
+from chiasim.hashable import Coin, ProgramHash
+
+from standard_wallet.pending_spends import PendingSpends
+from standard_wallet.wallet import Wallet
+from utilities.chain_follower import ChainFollower
+
+from .harness import make_client_server, result, time_call
+
+
+def fake_name(index):
+    return hashlib.sha256(b"bench%d" % index).digest()
+
+
+def wallet_with_addresses(count):
+    wallet = Wallet()
+    puzzlehashes = [wallet.get_new_puzzlehash() for _ in range(count)]
+    return wallet, puzzlehashes
+
+
+def bench_notify(address_counts, coins_per_block=1000, ours=10):
+    """
+    Throughput of Wallet.notify on a block of coins, most of them not
+    ours, as the wallet's address count grows.
+    """
+    results = []
+    for address_count in address_counts:
+        wallet, puzzlehashes = wallet_with_addresses(address_count)
+        blocks = []
+        for block in range(3):
+            additions = []
+            for index in range(coins_per_block):
+                if index < ours:
+                    puzzlehash = puzzlehashes[index % address_count]
+                else:
+                    puzzlehash = ProgramHash(fake_name(index + 1))
+                additions.append(Coin(fake_name(block * coins_per_block + index), puzzlehash, 1000))
+            blocks.append(additions)
+        blocks = iter(blocks)
+        seconds, _ = time_call(lambda: wallet.notify(next(blocks), []))
+        results.append(result("notify", seconds, coins_per_block, addresses=address_count))
+    return results
+
+
+def bench_generate_signed_transaction(utxo_counts):
+    """
+    Latency of selecting, building and signing a spend of most of the
+    wallet's balance as its UTXO count grows.
+    """
+    results = []
+    for utxo_count in utxo_counts:
+        wallet, puzzlehashes = wallet_with_addresses(utxo_count)
+        coins = [Coin(fake_name(_), puzzlehashes[_], 1000) for _ in range(utxo_count)]
+        wallet.notify(coins, [])
+        amount = wallet.current_balance * 3 // 4
+        destination = Wallet().get_new_puzzlehash()
+
+        def f():
+            wallet.pending_spends = PendingSpends()
+            wallet.update_temp_utxos()
+            return wallet.generate_signed_transaction(amount, destination)
+        seconds, _ = time_call(f)
+        results.append(result("generate_signed_transaction", seconds, utxos=utxo_count))
+    return results
+
+
+def bench_sync(block_counts):
+    """
+    Time for a fresh copy of a wallet to catch up over N blocks from the
+    in-process ledger.
+    """
+    run = asyncio.get_event_loop().run_until_complete
+    results = []
+    for block_count in block_counts:
+        remote = make_client_server()
+        wallet = Wallet()
+        for _ in range(block_count):
+            run(remote.next_block(coinbase_puzzle_hash=wallet.get_new_puzzlehash(),
+                                  fees_puzzle_hash=wallet.get_new_puzzlehash()))
+        tip = run(remote.get_tip())
+        copy = Wallet()
+        copy.set_seed(wallet.seed)
+        for _ in range(wallet.next_address):
+            copy.get_new_puzzlehash()
+
+        async def sync():
+            follower = ChainFollower(remote, coin_cache=copy.coin_cache)
+            async for block in follower.blocks_between(tip["genesis_hash"], tip["tip_hash"]):
+                copy.notify(block.additions, block.removals)
+            return copy
+
+        def f():
+            return run(sync())
+        seconds, copy = time_call(f, repeat=1)
+        assert len(copy.my_utxos) == 2 * block_count
+        results.append(result("sync", seconds, block_count, blocks=block_count))
+    return results
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
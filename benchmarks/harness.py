@@ -0,0 +1,56 @@
+import os
+import platform
+import time
+
+from tests.test_transactions import make_client_server, commit_and_notify  # noqa: F401
+
+
+def time_call(f, repeat=3):
+    """
+    Call f() repeat times and return the fastest time in seconds along
+    with the last result.
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def result(name, seconds, items=None, **params):
+    """
+    One benchmark measurement. items is how many things were processed in
+    that time, used to report a rate.
+    """
+    r = dict(name=name, params=params, seconds=seconds)
+    if items is not None:
+        r["items"] = items
+        r["per_second"] = items / seconds if seconds > 0 else None
+    return r
+
+
+def environment():
+    return dict(
+        python=platform.python_version(),
+        machine=platform.machine(),
+        cpus=os.cpu_count(),
+        time=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    )
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -0,0 +1,65 @@
+import argparse
+import json
+import sys
+
+from .bench_smart import bench_ap_aggregation, bench_finalize_pst, bench_rl_aggregation
+from .bench_wallet import bench_generate_signed_transaction, bench_notify, bench_sync
+from .harness import environment
+
+
+FULL = dict(
+    addresses=[10, 100, 1000],
+    utxos=[1, 10, 100, 500],
+    blocks=[10, 100, 500],
+    m_of_n=[(1, 1), (2, 3), (3, 5), (5, 7)],
+)
+
+QUICK = dict(
+    addresses=[10, 100],
+    utxos=[1, 10],
+    blocks=[10],
+    m_of_n=[(1, 1), (2, 3)],
+)
+
+
+def run_all(sizes):
+    results = []
+    results.extend(bench_notify(sizes["addresses"]))
+    results.extend(bench_generate_signed_transaction(sizes["utxos"]))
+    results.extend(bench_sync(sizes["blocks"]))
+    results.extend(bench_rl_aggregation())
+    results.extend(bench_ap_aggregation())
+    results.extend(bench_finalize_pst(sizes["m_of_n"]))
+    return results
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Run the wallet benchmarks and print JSON results.")
+    parser.add_argument("-o", "--output", help="write the results here instead of stdout")
+    parser.add_argument("--quick", action="store_true", help="use small sizes, for a smoke test")
+    args = parser.parse_args(args)
+    report = dict(environment=environment(), results=run_all(QUICK if args.quick else FULL))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -1,5 +1,8 @@
 from chiasim.atoms import hexbytes
 from standard_wallet.wallet import *
+from standard_wallet.seen_coins import SeenCoins
+from puzzles.puzzle_template import PuzzleTemplate
+from utilities.signing import spend_bundle_for_signatures
 import clvm
 from chiasim.hashable import Program, ProgramHash, CoinSolution, SpendBundle, BLSSignature
 from binascii import hexlify
@@ -8,22 +11,94 @@ from clvm_tools import binutils
 from chiasim.wallet.BLSPrivateKey import BLSPrivateKey
 from chiasim.validation.Conditions import ConditionOpcode
 
+
+def merge_two_lists(list1=None, list2=None):
+    if (list1 is None) or (list2 is None):
+        return None
+    ret = f"((c (q ((c (f (a)) (a)))) (c (q ((c (i ((c (i (f (r (a))) (q (q ())) (q (q 1))) (a))) (q (f (c (f (r (r (a)))) (q ())))) (q ((c (f (a)) (c (f (a)) (c (r (f (r (a)))) (c (c (f (f (r (a)))) (f (r (r (a))))) (q ())))))))) (a)))) (c {list1} (c {list2} (q ()))))))"
+    return ret
+
+
+# called with placeholder atoms, see puzzles.puzzle_template
+def cp_puzzle_source(pubkey_my, pubkey_permission, unlock_time):
+    opcode_aggsig = hexlify(ConditionOpcode.AGG_SIG).decode('ascii')
+    opcode_time_exceeds = hexlify(ConditionOpcode.ASSERT_TIME_EXCEEDS).decode('ascii')
+
+    TIME_EXCEEDS = f"(c (q 0x{opcode_time_exceeds}) (c (q 0x{unlock_time.hex()}) (q ())))"
+    AGGSIG_ME = f"(c (q 0x{opcode_aggsig}) (c (q 0x{pubkey_my.hex()}) (c (sha256tree (a)) (q ()))))"
+    AGGSIG_PERMISSION = f"(c (q 0x{opcode_aggsig}) (c (q 0x{pubkey_permission.hex()}) (c (sha256tree (a)) (q ()))))"
+    SOLO_PUZZLE_CONDITIONS = f"(c {TIME_EXCEEDS} (c {AGGSIG_ME} (q ())))"
+    SOLUTION_OUTPUTS = f"(f (r (a)))"
+    SOLO_PUZZLE = merge_two_lists(SOLO_PUZZLE_CONDITIONS, SOLUTION_OUTPUTS)
+    PERMISSION_PUZZLE_CONDITIONS = f"(c {AGGSIG_PERMISSION} (c {AGGSIG_ME} (q ())))"
+    PERMISSION_PUZZLE = merge_two_lists(PERMISSION_PUZZLE_CONDITIONS, SOLUTION_OUTPUTS)
+    WHOLE_PUZZLE = f"(i (= (f (a)) (q 1)) {SOLO_PUZZLE} {PERMISSION_PUZZLE})"
+    return WHOLE_PUZZLE
+
+
+# template of (pubkey_my, pubkey_permission, unlock_time)
+CP_TEMPLATE = PuzzleTemplate(cp_puzzle_source, 3)
+
+
 # CPWallet is subclass of Wallet
 class CPWallet(Wallet):
     def __init__(self):
         self.pubkey_orig = None
-        self.all_cp_additions = {}
-        self.all_cp_deletions = {}
+        self.all_cp_additions = SeenCoins()
+        self.all_cp_deletions = SeenCoins()
         self.pubkey_permission = None
         self.pubkey_approval = None
         self.unlock_time = 0
         self.tip_time = 0
         self.cp_balance = 0
         self.cp_coin = None
+        # see cp_puzzle_hash_index
+        self.cp_index_key = None
+        self.cp_puzzle_hashes = []  # by child
+        self.cp_children = {}  # {cp_puzzle_hash: child}
         super().__init__()
         return
 
+    CP_STATE = ["pubkey_orig", "pubkey_permission", "pubkey_approval", "unlock_time", "tip_time",
+                "cp_balance", "cp_coin"]
+
+    def get_extra_state(self):
+        return {key: getattr(self, key) for key in self.CP_STATE}
+
+    # custody puzzle hashes depend on state set after the keys are derived
+    def watched_puzzle_hashes(self):
+        return None
+
+    def refresh_watch_filter(self):
+        super().refresh_watch_filter()
+        self.cp_puzzle_hash_index()
+        self.watch_children("cp", self.cp_index_key, self.cp_puzzle_hashes.__getitem__)
+
+    def cp_puzzle_hash_for_child(self, child):
+        pubkey = self.extended_secret_key.public_child(child)
+        return self.cp_puzzle_hash(hexbytes(pubkey), self.pubkey_permission, self.unlock_time)
+
+    # {cp_puzzle_hash: child} for every address handed out, under the
+    # current permission key and unlock time, rebuilt when either changes
+    # and otherwise extended with the children handed out since the last
+    # call, as RLWallet.rl_puzzle_hash_index does
+    def cp_puzzle_hash_index(self):
+        key = None
+        if self.pubkey_permission is not None:
+            key = (self.pubkey_permission, self.unlock_time)
+        if key != self.cp_index_key:
+            self.cp_index_key = key
+            self.cp_puzzle_hashes = []
+            self.cp_children = {}
+        if key is not None:
+            for child in range(len(self.cp_puzzle_hashes), self.next_address):
+                puzzle_hash = self.cp_puzzle_hash_for_child(child)
+                self.cp_puzzle_hashes.append(puzzle_hash)
+                self.cp_children[puzzle_hash] = child
+        return self.cp_children
+
     def notify(self, additions, deletions, index):
+        additions, deletions = self.filter_block(additions, deletions)
         super().notify(additions, deletions)
         self.cp_notify(additions, deletions, index)
 
@@ -31,44 +106,33 @@ class CPWallet(Wallet):
         for coin in additions:
             if coin.name() in self.all_cp_additions:
                 continue
-            self.all_cp_additions[coin.name()] = coin
+            self.all_cp_additions.add(coin.name())
             if self.can_generate_cp_puzzle_hash(coin.puzzle_hash):
                 self.cp_balance += coin.amount
                 self.cp_coin = coin
         for coin in deletions:
             if coin.name() in self.all_cp_deletions:
                 continue
-            self.all_cp_deletions[coin.name()] = coin
+            self.all_cp_deletions.add(coin.name())
             if self.can_generate_cp_puzzle_hash(coin.puzzle_hash):
                 self.cp_balance -= coin.amount
+        self.all_cp_additions.next_block()
+        self.all_cp_deletions.next_block()
 
     def can_generate_cp_puzzle_hash(self, hash):
         if self.pubkey_permission is None:
             return None
-        return any(map(lambda child: hash == ProgramHash(self.cp_puzzle(
-            hexbytes(self.extended_secret_key.public_child(child)), self.pubkey_permission, self.unlock_time)),
-                       reversed(range(self.next_address))))
+        return hash in self.cp_puzzle_hash_index()
 
     def merge_two_lists(self, list1=None, list2=None):
-        if (list1 is None) or (list2 is None):
-            return None
-        ret = f"((c (q ((c (f (a)) (a)))) (c (q ((c (i ((c (i (f (r (a))) (q (q ())) (q (q 1))) (a))) (q (f (c (f (r (r (a)))) (q ())))) (q ((c (f (a)) (c (f (a)) (c (r (f (r (a)))) (c (c (f (f (r (a)))) (f (r (r (a))))) (q ())))))))) (a)))) (c {list1} (c {list2} (q ()))))))"
-        return ret
+        return merge_two_lists(list1, list2)
 
+    # the pubkeys are hex strings or bytes
     def cp_puzzle(self, pubkey_my, pubkey_permission, unlock_time):
-        opcode_aggsig = hexlify(ConditionOpcode.AGG_SIG).decode('ascii')
-        opcode_time_exceeds = hexlify(ConditionOpcode.ASSERT_TIME_EXCEEDS).decode('ascii')
-
-        TIME_EXCEEDS = f"(c (q 0x{opcode_time_exceeds}) (c (q {unlock_time}) (q ())))"
-        AGGSIG_ME = f"(c (q 0x{opcode_aggsig}) (c (q 0x{pubkey_my}) (c (sha256tree (a)) (q ()))))"
-        AGGSIG_PERMISSION = f"(c (q 0x{opcode_aggsig}) (c (q 0x{pubkey_permission}) (c (sha256tree (a)) (q ()))))"
-        SOLO_PUZZLE_CONDITIONS = f"(c {TIME_EXCEEDS} (c {AGGSIG_ME} (q ())))"
-        SOLUTION_OUTPUTS = f"(f (r (a)))"
-        SOLO_PUZZLE = self.merge_two_lists(SOLO_PUZZLE_CONDITIONS, SOLUTION_OUTPUTS)
-        PERMISSION_PUZZLE_CONDITIONS = f"(c {AGGSIG_PERMISSION} (c {AGGSIG_ME} (q ())))"
-        PERMISSION_PUZZLE = self.merge_two_lists(PERMISSION_PUZZLE_CONDITIONS, SOLUTION_OUTPUTS)
-        WHOLE_PUZZLE = f"(i (= (f (a)) (q 1)) {SOLO_PUZZLE} {PERMISSION_PUZZLE})"
-        return Program(binutils.assemble(WHOLE_PUZZLE))
+        return CP_TEMPLATE.program(pubkey_my, pubkey_permission, unlock_time)
+
+    def cp_puzzle_hash(self, pubkey_my, pubkey_permission, unlock_time):
+        return CP_TEMPLATE.program_hash(pubkey_my, pubkey_permission, unlock_time)
 
     def solution_for_cp_solo(self, puzzlehash_amount_list=[]):
         opcode_create = hexlify(ConditionOpcode.CREATE_COIN).decode('ascii')
@@ -90,11 +154,9 @@ class CPWallet(Wallet):
         s = super().get_keys(hash)
         if s is not None:
             return s
-        for child in reversed(range(self.next_address)):
-            pubkey = self.extended_secret_key.public_child(child)
-            if hash == ProgramHash(
-                    self.cp_puzzle(hexbytes(pubkey), self.pubkey_permission, self.unlock_time)):
-                return pubkey, self.extended_secret_key.private_child(child)
+        child = self.cp_puzzle_hash_index().get(hash)
+        if child is not None:
+            return self.extended_secret_key.public_child(child), self.extended_secret_key.private_child(child)
 
     def get_keys_pk(self, approval_pubkey):
         for child in reversed(range(self.next_address)):
@@ -143,22 +205,16 @@ class CPWallet(Wallet):
         return signature
 
     def cp_sign_transaction(self, spends: (Program, [CoinSolution]), approval=None):
-        sigs = []
+        items = []
         for puzzle, solution in spends:
             pubkey, secretkey = self.get_keys(
                 solution.coin.puzzle_hash)
-            signature = secretkey.sign(
-                ProgramHash(Program(solution.solution)))
-            sigs.append(signature)
+            items.append((secretkey, ProgramHash(Program(solution.solution))))
+        sigs = self.signing_engine.sign_messages(items)
         if approval is not None:
             app = BLSSignature(approval)
             sigs.append(app)
-        aggsig = BLSSignature.aggregate(sigs)
-        solution_list = CoinSolutionList(
-            [CoinSolution(coin_solution.coin, clvm.to_sexp_f([puzzle, coin_solution.solution])) for
-             (puzzle, coin_solution) in spends])
-        spend_bundle = SpendBundle(solution_list, aggsig)
-        return spend_bundle
+        return spend_bundle_for_signatures(spends, sigs)
 
 
 """
@@ -1,9 +1,8 @@
 import asyncio
 from custody_wallet.custody_wallet import CPWallet
 from chiasim.clients.ledger_sim import connect_to_ledger_sim
-from chiasim.wallet.deltas import additions_for_body, removals_for_body
-from chiasim.hashable import Coin
-from chiasim.hashable.Body import BodyList
+from utilities.chain_follower import ChainFollower
+from utilities.instrumentation import enable_from_environment
 from utilities.decorations import print_leaf, divider, prompt
 from chiasim.hashable import ProgramHash
 from binascii import hexlify
@@ -45,7 +44,7 @@ async def approve_transaction(wallet):
     print(f"Authorizing pubkey: {wallet.pubkey_approval}")
     print("Enter new that need's a approval:")
     newpubkey = input("Enter pubkey for new custody: ")
-    puzzlehash = ProgramHash(wallet.cp_puzzle(newpubkey, wallet.pubkey_approval, wallet.unlock_time))
+    puzzlehash = wallet.cp_puzzle_hash(newpubkey, wallet.pubkey_approval, wallet.unlock_time)
     amount = get_int("Enter amount: ")
     output = puzzlehash, amount
     outputs = [output]
@@ -75,7 +74,7 @@ async def create_custody(wallet, ledger_api):
         amount = get_int("Enter Chia amount to send to custody: ")
         wallet.unlock_time = unlock_time
 
-        puzzle_hash = ProgramHash(wallet.cp_puzzle(pubkey_custody, pubkey, unlock_time))
+        puzzle_hash = wallet.cp_puzzle_hash(pubkey_custody, pubkey, unlock_time)
         spend_bundle = wallet.generate_signed_transaction(amount, puzzle_hash)
         _ = await ledger_api.push_tx(tx=spend_bundle)
         return
@@ -94,7 +93,7 @@ async def move_custody(wallet, ledger_api):
     if unlock_time > current_time:
         new_pub = input("Enter pubkey of the new custodian wallet: ")
         print("Permission needed before moving funds: ")
-        puzzle_hash = ProgramHash(wallet.cp_puzzle(new_pub, pubkey_permission, unlock_time))
+        puzzle_hash = wallet.cp_puzzle_hash(new_pub, pubkey_permission, unlock_time)
         approval = input("\nAdd authorization: ")
         approval = bytes.fromhex(approval)
         spend_bundle = wallet.cp_generate_signed_transaction_with_approval(puzzle_hash, amount, approval)
@@ -110,18 +109,11 @@ async def move_custody(wallet, ledger_api):
 
 
 async def update_ledger(wallet, ledger_api, most_recent_header):
-    if most_recent_header is None:
-        r = await ledger_api.get_all_blocks()
-    else:
-        r = await ledger_api.get_recent_blocks(most_recent_header=most_recent_header)
-    update_list = BodyList.from_bytes(r)
+    blocks = await ChainFollower(ledger_api, coin_cache=wallet.coin_cache).recent_blocks(most_recent_header)
     tip = await ledger_api.get_tip()
     index = int(tip["tip_index"])
-    for body in update_list:
-        additions = list(additions_for_body(body))
-        removals = removals_for_body(body)
-        removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
-        spend_bundle_list = wallet.notify(additions, removals, index)
+    for block in blocks:
+        spend_bundle_list = wallet.notify(block.additions, block.removals, index)
         if spend_bundle_list is not None:
             for spend_bundle in spend_bundle_list:
                 _ = await ledger_api.push_tx(tx=spend_bundle)
@@ -137,9 +129,8 @@ async def new_block(wallet, ledger_api):
     tip = await  ledger_api.get_tip()
     index = tip["tip_index"]
     most_recent_header = r['header']
-    additions = list(additions_for_body(body))
-    removals = removals_for_body(body)
-    removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
+    block, = await ChainFollower(ledger_api, coin_cache=wallet.coin_cache).blocks_for_bodies([body])
+    additions, removals = block.additions, block.removals
     wallet.notify(additions, removals, index)
     return most_recent_header
 
@@ -196,6 +187,7 @@ async def main_loop():
 
 
 def main():
+    enable_from_environment()
     run = asyncio.get_event_loop().run_until_complete
     run(main_loop())
 
@@ -24,6 +24,7 @@ from puzzles.p2_conditions import puzzle_for_conditions, solution_for_conditions
 
 
 from utilities.BLSHDKey import BLSPublicHDKey, fingerprint_for_pk
+from utilities.instrumentation import enable_from_environment
 
 from .pst import PartiallySignedTransaction
 from .storage import Storage
@@ -407,6 +408,7 @@ async def main_loop(path, storage=None, input=input):
 
 
 def main(path=Path("multisig-wallet.json"), input=input):
+    enable_from_environment()
     asyncio.get_event_loop().run_until_complete(main_loop(path, input=input))
 
 
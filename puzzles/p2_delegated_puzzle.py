@@ -12,19 +12,33 @@ you can use p2_conditions.
 This roughly corresponds to bitcoin's graftroot.
 """
 
-from clvm_tools import binutils
-
 from chiasim.hashable import Program
 from chiasim.validation.Conditions import ConditionOpcode
 
 from . import p2_conditions
+from .puzzle_template import PuzzleTemplate
 
 
-def puzzle_for_pk(public_key):
+def make_source(public_key):
     aggsig = ConditionOpcode.AGG_SIG[0]
-    TEMPLATE = (f"(c (c (q {aggsig}) (c (q 0x%s) (c (sha256tree (f (a))) (q ())))) "
-                f"((c (f (a)) (f (r (a))))))")
-    return Program.to(binutils.assemble(TEMPLATE % public_key.hex()))
+    return (f"(c (c (q {aggsig}) (c (q 0x{public_key.hex()}) (c (sha256tree (f (a))) (q ())))) "
+            f"((c (f (a)) (f (r (a))))))")
+
+
+# assembled once, each key is spliced into the serialized template
+TEMPLATE = PuzzleTemplate(make_source, 1)
+
+
+def puzzle_for_pk(public_key):
+    return Program.to(TEMPLATE.program(bytes(public_key)))
+
+
+def puzzle_hash_for_pk(public_key):
+    """
+    Return ProgramHash(puzzle_for_pk(public_key)) without building the puzzle.
+    Only the key atom and the constant suffix are hashed per call.
+    """
+    return TEMPLATE.program_hash(bytes(public_key))
 
 
 def solution_for_conditions(puzzle_reveal, conditions):
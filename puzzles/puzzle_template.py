@@ -0,0 +1,111 @@
+"""
+Puzzle templates
+
+Most puzzles the wallets generate are one large constant tree with a few
+atoms filled in: public keys, origin ids, limits. A ProgramHash is the sha256
+of the whole serialized program, so it can't be pieced together from hashes
+of subtrees. What can be done is to assemble the tree once, with placeholder
+atoms where the values go, and keep the constant runs of its serialization
+in between. Filling in a template is then byte concatenation, and hashing
+it is one sha256 pass over those bytes starting from the state after the
+first constant run, with no assembling, tree walking or reserializing.
+"""
+
+import hashlib
+
+from clvm_tools import binutils
+
+from chiasim.hashable import Program, ProgramHash
+
+
+def placeholder(index):
+    return hashlib.sha256(b"puzzle template placeholder %d" % index).digest()
+
+
+def atom_blob(value):
+    """
+    Serialize value as a clvm atom. value is bytes, an int, or a hex string
+    with or without a 0x prefix.
+    """
+    if isinstance(value, str):
+        value = bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(Program.to(value))
+
+
+class PuzzleTemplate:
+    """
+    make_source(*placeholders) returns the clvm source of the puzzle, with
+    the i-th placeholder, 32 bytes, used wherever the i-th value goes. It
+    must only appear as a whole atom, e.g. formatted as 0x{hex}. A value
+    may be used any number of times.
+    """
+
+    def __init__(self, make_source, value_count):
+        placeholders = [placeholder(_) for _ in range(value_count)]
+        blob = bytes(Program(binutils.assemble(make_source(*placeholders))))
+        markers = [atom_blob(_) for _ in placeholders]
+        self.segments = []
+        self.holes = []
+        start = 0
+        while True:
+            found = [(blob.find(marker, start), index) for index, marker in enumerate(markers)]
+            found = [_ for _ in found if _[0] >= 0]
+            if not found:
+                break
+            position, index = min(found)
+            self.segments.append(blob[start:position])
+            self.holes.append(index)
+            start = position + len(markers[index])
+        self.segments.append(blob[start:])
+        missing = set(range(value_count)) - set(self.holes)
+        if missing:
+            raise ValueError("placeholders %s not found in the assembled template" % sorted(missing))
+        self.value_count = value_count
+        self._prefix_hash = hashlib.sha256(self.segments[0])
+
+    def _atoms(self, values):
+        if len(values) != self.value_count:
+            raise ValueError("expected %d values, got %d" % (self.value_count, len(values)))
+        return [atom_blob(_) for _ in values]
+
+    def serialize(self, *values):
+        atoms = self._atoms(values)
+        parts = [self.segments[0]]
+        for index, segment in zip(self.holes, self.segments[1:]):
+            parts.append(atoms[index])
+            parts.append(segment)
+        return b"".join(parts)
+
+    def program(self, *values):
+        return Program.from_bytes(self.serialize(*values))
+
+    def program_hash(self, *values):
+        """
+        Return ProgramHash(self.program(*values)) without building the program.
+        """
+        atoms = self._atoms(values)
+        h = self._prefix_hash.copy()
+        for index, segment in zip(self.holes, self.segments[1:]):
+            h.update(atoms[index])
+            h.update(segment)
+        return ProgramHash(h.digest())
+
+
+class TemplateFamily:
+    """
+    Templates for a puzzle whose structure, not just its atoms, depends on
+    some parameters, e.g. which opcode it asserts. make_source(key,
+    *placeholders) is turned into one PuzzleTemplate per key, on first use.
+    """
+
+    def __init__(self, make_source, value_count):
+        self.make_source = make_source
+        self.value_count = value_count
+        self._templates = {}
+
+    def __getitem__(self, key):
+        template = self._templates.get(key)
+        if template is None:
+            template = PuzzleTemplate(lambda *_: self.make_source(key, *_), self.value_count)
+            self._templates[key] = template
+        return template
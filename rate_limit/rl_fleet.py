@@ -0,0 +1,137 @@
+from chiasim.atoms import hexbytes
+from chiasim.hashable import CoinSolution, ProgramHash
+
+from standard_wallet.wallet import MAX_OUTPUTS_PER_SPEND
+from utilities.signing import spend_bundle_for_signatures
+
+from .rl_wallet import RL_TEMPLATES, rl_clawback_solution
+
+
+class IssuedRLCoin:
+    __slots__ = ("receiver_pk", "amount", "limit", "interval", "origin_id", "clawback_pk", "puzzle_hash", "coin")
+
+    def __init__(self, receiver_pk, amount, limit, interval, origin_id, clawback_pk, puzzle_hash):
+        self.receiver_pk = receiver_pk
+        self.amount = amount
+        self.limit = limit
+        self.interval = interval
+        self.origin_id = origin_id
+        self.clawback_pk = clawback_pk
+        self.puzzle_hash = puzzle_hash
+        # the unspent coin with puzzle_hash, once one is seen
+        self.coin = None
+
+    def puzzle(self):
+        return RL_TEMPLATES[self.limit, self.interval].program(self.receiver_pk, self.origin_id, self.clawback_pk)
+
+
+class RLFleet:
+    """
+    The issuing side of many rate limited coins, funded and clawed back by
+    a standard wallet.
+
+    Every coin issued is indexed by its puzzle hash, which is what the
+    issuer claws back, and follows the coin as its receiver spends it, so
+    any subset can be clawed back at once. A batch of coins is created by
+    one spend bundle, each coin taking as its origin the coin whose spend
+    creates it, and clawed back by another, with one aggregate signature.
+    """
+
+    def __init__(self, wallet):
+        self.wallet = wallet
+        self.issued = {}  # {puzzle_hash: IssuedRLCoin}
+
+    def generate_signed_issue_transaction(self, grants, max_outputs_per_spend=MAX_OUTPUTS_PER_SPEND):
+        """
+        grants is a list of (receiver_pk, amount, limit, interval). One
+        clawback key is derived for the batch. Returns the spend bundle and
+        the IssuedRLCoins it creates, which are tracked from then on, or
+        None if the wallet can't pay for them.
+
+        Two grants with the same receiver, limit and interval would share a
+        puzzle hash if created by the same spend, so they are rejected with
+        ValueError.
+        """
+        terms = [(bytes(receiver_pk), int(limit), int(interval)) for receiver_pk, amount, limit, interval in grants]
+        if len(set(terms)) != len(terms):
+            raise ValueError("grants to the same receiver need a different limit or interval")
+        clawback_pk = hexbytes(bytes(self.wallet.get_next_public_key()))
+        issued = []
+
+        def payment(receiver_pk, amount, limit, interval):
+            def puzzle_hash_for_origin(origin_id):
+                puzzle_hash = RL_TEMPLATES[limit, interval].program_hash(receiver_pk, origin_id, clawback_pk)
+                issued.append(IssuedRLCoin(receiver_pk, amount, limit, interval, origin_id, clawback_pk, puzzle_hash))
+                return puzzle_hash
+            return puzzle_hash_for_origin, amount
+
+        payments = [payment(bytes(receiver_pk), amount, int(limit), int(interval))
+                    for receiver_pk, amount, limit, interval in grants]
+        spend_bundle = self.wallet.generate_signed_batch_transaction(payments, max_outputs_per_spend)
+        if spend_bundle is None:
+            return None
+        for grant in issued:
+            self.issued[grant.puzzle_hash] = grant
+        return spend_bundle, issued
+
+    def notify(self, additions, deletions):
+        # additions first, so a coin created and spent in the same block
+        # is replaced by the one its spend creates
+        for coin in additions:
+            grant = self.issued.get(coin.puzzle_hash)
+            if grant is not None:
+                grant.coin = coin
+        for coin in deletions:
+            grant = self.issued.get(coin.puzzle_hash)
+            if grant is not None and grant.coin == coin:
+                grant.coin = None
+
+    def outstanding(self):
+        return [grant for grant in self.issued.values() if grant.coin is not None]
+
+    def outstanding_balance(self):
+        return sum(grant.coin.amount for grant in self.outstanding())
+
+    def generate_signed_clawback_transaction(self, puzzle_hashes, to_puzzlehash=None):
+        """
+        Claw back the unspent coins issued under puzzle_hashes into
+        to_puzzlehash, a fresh address of the wallet by default. Those
+        without an unspent coin are skipped. Returns None if none are left.
+        Raises ValueError if a clawback key isn't one the wallet derived.
+        """
+        if to_puzzlehash is None:
+            to_puzzlehash = self.wallet.get_new_puzzlehash()
+        secret_keys = {}
+        spends = []
+        items = []
+        for puzzle_hash in puzzle_hashes:
+            grant = self.issued.get(puzzle_hash)
+            if grant is None or grant.coin is None:
+                continue
+            secret_key = secret_keys.get(grant.clawback_pk)
+            if secret_key is None:
+                child = self.wallet.puzzle_hash_lookup.child_for_pubkey(grant.clawback_pk)
+                if child is None:
+                    raise ValueError("clawback key %s is not one of the wallet's" % bytes(grant.clawback_pk).hex())
+                secret_key = secret_keys[grant.clawback_pk] = self.wallet.extended_secret_key.private_child(child)
+            solution = rl_clawback_solution(to_puzzlehash, grant.coin.amount)
+            spends.append((grant.puzzle(), CoinSolution(grant.coin, solution)))
+            items.append((secret_key, ProgramHash(solution)))
+        if not spends:
+            return None
+        sigs = self.wallet.signing_engine.sign_messages(items)
+        return spend_bundle_for_signatures(spends, sigs)
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -1,5 +1,8 @@
 from chiasim.atoms import hexbytes
 from standard_wallet.wallet import *
+from standard_wallet.seen_coins import SeenCoins
+from utilities.assembler import assemble, assemble_with_hash, program_hash
+from utilities.signing import spend_bundle_for_signatures
 import clvm
 from chiasim.hashable import Program, ProgramHash, CoinSolution, SpendBundle, BLSSignature
 from binascii import hexlify
@@ -7,9 +10,57 @@ from chiasim.hashable.Coin import Coin
 from chiasim.hashable.CoinSolution import CoinSolutionList
 from clvm_tools import binutils
 from chiasim.validation.Conditions import ConditionOpcode
-from puzzles.p2_delegated_puzzle import puzzle_for_pk
+from puzzles.p2_delegated_puzzle import puzzle_for_pk, puzzle_hash_for_pk
+from puzzles.puzzle_template import TemplateFamily
 import math
 
+
+# called with placeholder atoms, see puzzles.puzzle_template
+def rl_puzzle_source(params, pubkey, origin_id, clawback_pk):
+    rate_amount, interval_time = params
+    hex_pk = pubkey.hex()
+    origin_id = origin_id.hex()
+    clawback_pk = clawback_pk.hex()
+    opcode_aggsig = hexlify(ConditionOpcode.AGG_SIG).decode('ascii')
+    opcode_coin_block_age = hexlify(ConditionOpcode.ASSERT_BLOCK_AGE_EXCEEDS).decode('ascii')
+    opcode_create = hexlify(ConditionOpcode.CREATE_COIN).decode('ascii')
+    opcode_myid = hexlify(ConditionOpcode.ASSERT_MY_COIN_ID).decode('ascii')
+
+    TEMPLATE_MY_PARENT_ID = "(sha256 (f (r (r (r (r (r (r (a)))))))) (f (r (a))) (f (r (r (r (r (r (r (r (a))))))))))"
+    TEMPLATE_SINGLETON_RL = f"((c (i (i (= {TEMPLATE_MY_PARENT_ID} (f (a))) (q 1) (= (f (a)) (q 0x{origin_id}))) (q (c (q 1) (q ()))) (q (x (q \"Parent doesnt satisfy RL conditions\")))) (a)))"
+    TEMPLATE_BLOCK_AGE = f"((c (i (i (= (* (f (r (r (r (r (r (a))))))) (q {rate_amount})) (* (f (r (r (r (r (a)))))) (q {interval_time}))) (q 1) (q (> (* (f (r (r (r (r (r (a))))))) (q {rate_amount})) (* (f (r (r (r (r (a))))))) (q {interval_time})))) (q (c (q 0x{opcode_coin_block_age}) (c (f (r (r (r (r (r (a))))))) (q ())))) (q (x (q \"wrong min block time\")))) (a) ))"
+    TEMPLATE_MY_ID = f"(c (q 0x{opcode_myid}) (c (sha256 (f (a)) (f (r (a))) (f (r (r (a))))) (q ())))"
+    CREATE_CHANGE = f"(c (q 0x{opcode_create}) (c (f (r (a))) (c (- (f (r (r (a)))) (f (r (r (r (r (a))))))) (q ()))))"
+    CREATE_NEW_COIN = f"(c (q 0x{opcode_create}) (c (f (r (r (r (a))))) (c (f (r (r (r (r (a)))))) (q ()))))"
+    RATE_LIMIT_PUZZLE = f"(c {TEMPLATE_SINGLETON_RL} (c {TEMPLATE_BLOCK_AGE} (c {CREATE_CHANGE} (c {TEMPLATE_MY_ID} (c {CREATE_NEW_COIN} (q ()))))))"
+
+    TEMPLATE_MY_PARENT_ID_2 = "(sha256 (f (r (r (r (r (r (r (r (r (a)))))))))) (f (r (a))) (f (r (r (r (r (r (r (r (a))))))))))"
+    TEMPLATE_SINGLETON_RL_2 = f"((c (i (i (= {TEMPLATE_MY_PARENT_ID_2} (f (r (r (r (r (r (a)))))))) (q 1) (= (f (r (r (r (r (r (a))))))) (q 0x{origin_id}))) (q (c (q 1) (q ()))) (q (x (q \"Parent doesnt satisfy RL conditions\")))) (a)))"
+    CREATE_CONSOLIDATED = f"(c (q 0x{opcode_create}) (c (f (r (a))) (c (+ (f (r (r (r (r (a)))))) (f (r (r (r (r (r (r (a))))))))) (q ()))))"
+    MODE_TWO_ME_STRING = f"(c (q 0x{opcode_myid}) (c (sha256 (f (r (r (r (r (r (a))))))) (f (r (a))) (f (r (r (r (r (r (r (a))))))))) (q ())))"
+    CREATE_LOCK = f"(c (q 0x{opcode_create}) (c (sha256tree (c (q 7) (c (c (q 5) (c (c (q 1) (c (sha256 (f (r (r (a)))) (f (r (r (r (a))))) (f (r (r (r (r (a))))))) (q ()))) (c (q (q ())) (q ())))) (q ())))) (c (q 0) (q ()))))"
+
+    MODE_TWO = f"(c {TEMPLATE_SINGLETON_RL_2} (c {MODE_TWO_ME_STRING} (c {CREATE_LOCK} (c {CREATE_CONSOLIDATED} (q ())))))"
+
+    AGGSIG_ENTIRE_SOLUTION = f"(c (q 0x{opcode_aggsig}) (c (q 0x{hex_pk}) (c (sha256tree (a)) (q ()))))"
+
+    WHOLE_PUZZLE = f"(c {AGGSIG_ENTIRE_SOLUTION} ((c (i (= (f (a)) (q 1)) (q ((c (q {RATE_LIMIT_PUZZLE}) (r (a))))) (q {MODE_TWO})) (a))) (q ()))"
+    CLAWBACK = f"(c (c (q 0x{opcode_aggsig}) (c (q 0x{clawback_pk}) (c (sha256tree (a)) (q ())))) (r (a)))"
+    WHOLE_PUZZLE_WITH_CLAWBACK = f"((c (i (= (f (a)) (q 3)) (q {CLAWBACK}) (q {WHOLE_PUZZLE})) (a)))"
+
+    return WHOLE_PUZZLE_WITH_CLAWBACK
+
+
+# templates of (pubkey, origin_id, clawback_pk), one per (rate_amount, interval_time)
+RL_TEMPLATES = TemplateFamily(rl_puzzle_source, 3)
+
+
+def rl_clawback_solution(puzzlehash, amount):
+    opcode_create = hexlify(ConditionOpcode.CREATE_COIN).decode('ascii')
+    solution = f"(3 (0x{opcode_create} 0x{puzzlehash} {amount}))"
+    return Program(binutils.assemble(solution))
+
+
 # RLWallet is subclass of Wallet
 class RLWallet(Wallet):
     def __init__(self):
@@ -23,8 +74,8 @@ class RLWallet(Wallet):
         self.current_rl_balance = 0
         self.rl_index = 0
         self.tip_index = 0
-        self.all_rl_additions = {}
-        self.all_rl_deletions = {}
+        self.all_rl_additions = SeenCoins()
+        self.all_rl_deletions = SeenCoins()
         self.rl_clawback_pk = None
         self.clawback_limit = 0
         self.clawback_interval = 0
@@ -33,9 +84,23 @@ class RLWallet(Wallet):
         self.clawback_puzzlehash = None
         self.rl_receiver_pk = None
         self.latest_clawback_coin = None
+        # see rl_puzzle_hash_index
+        self.rl_index_key = None
+        self.rl_puzzle_hashes = []  # by child
+        self.rl_children = {}  # {rl_puzzle_hash: child}
+        # (rl_coin puzzle hash, aggregation puzzle, aggregation puzzle hash)
+        self.rl_aggregation = None
         super().__init__()
         return
 
+    RL_STATE = ["aggregation_coins", "rl_parent", "rl_coin", "interval", "limit", "rl_origin",
+                "pubkey_orig", "current_rl_balance", "rl_index", "tip_index", "rl_clawback_pk",
+                "clawback_limit", "clawback_interval", "clawback_origin", "clawback_pk",
+                "clawback_puzzlehash", "rl_receiver_pk", "latest_clawback_coin"]
+
+    def get_extra_state(self):
+        return {key: getattr(self, key) for key in self.RL_STATE}
+
     def set_origin(self, origin):
         #In tests Coin object is passed, in runnable it's a dictionary
         if isinstance(origin, Coin):
@@ -52,7 +117,57 @@ class RLWallet(Wallet):
         available_amount = min(unlocked, total_amount)
         return available_amount
 
+    # the rate limited coin's puzzle hash isn't among the derived ones, and
+    # the tip index has to advance every block
+    def watched_puzzle_hashes(self):
+        return None
+
+    def refresh_watch_filter(self):
+        super().refresh_watch_filter()
+        self.rl_puzzle_hash_index()
+        self.watch_children("rl", self.rl_index_key, self.rl_puzzle_hashes.__getitem__)
+        rl_puzzle_hash = None if self.rl_coin is None else self.rl_coin.puzzle_hash
+        self.watch_group("rl_coin", (rl_puzzle_hash, self.clawback_puzzlehash), self.rl_coin_puzzle_hashes)
+
+    def rl_puzzle_hash_for_child(self, child):
+        pubkey = self.extended_secret_key.public_child(child)
+        return self.rl_puzzle_hash_for_pk(
+            bytes(pubkey), self.limit, self.interval, self.rl_origin, self.rl_clawback_pk)
+
+    # {rl_puzzle_hash: child} for every address handed out, under the
+    # current origin, limit, interval and clawback key. It's rebuilt when
+    # any of those change, and otherwise only extended with the children
+    # handed out since the last call, so finding the child of an RL puzzle
+    # hash doesn't depend on how many addresses there are.
+    def rl_puzzle_hash_index(self):
+        key = None
+        if self.rl_origin is not None and self.rl_clawback_pk is not None:
+            key = (self.rl_origin, self.limit, self.interval, self.rl_clawback_pk)
+        if key != self.rl_index_key:
+            self.rl_index_key = key
+            self.rl_puzzle_hashes = []
+            self.rl_children = {}
+        if key is not None:
+            for child in range(len(self.rl_puzzle_hashes), self.next_address):
+                puzzle_hash = self.rl_puzzle_hash_for_child(child)
+                self.rl_puzzle_hashes.append(puzzle_hash)
+                self.rl_children[puzzle_hash] = child
+        return self.rl_children
+
+    # The RL coin, coins locked for aggregating into it and coins to claw
+    # back. An aggregation coin for the first RL coin arriving in the same
+    # block as it isn't seen, but it's only made once the RL coin exists.
+    def rl_coin_puzzle_hashes(self):
+        puzzle_hashes = []
+        if self.rl_coin is not None:
+            puzzle_hashes.append(self.rl_coin.puzzle_hash)
+            puzzle_hashes.append(self.rl_aggregation_puzzle()[1])
+        if self.clawback_puzzlehash is not None:
+            puzzle_hashes.append(self.clawback_puzzlehash)
+        return puzzle_hashes
+
     def notify(self, additions, deletions, index):
+        additions, deletions = self.filter_block(additions, deletions)
         super().notify(additions, deletions)
         self.tip_index = index
         self.rl_notify(additions, deletions, index)
@@ -66,7 +181,7 @@ class RLWallet(Wallet):
             if coin.puzzle_hash == self.clawback_puzzlehash:
                 self.latest_clawback_coin = coin
                 continue
-            self.all_rl_additions[coin.name()] = coin
+            self.all_rl_additions.add(coin.name())
             if self.can_generate_rl_puzzle_hash(coin.puzzle_hash):
                 self.current_rl_balance += coin.amount
                 if self.rl_coin:
@@ -80,7 +195,7 @@ class RLWallet(Wallet):
                 break
             if coin.name() in self.all_rl_deletions:
                 continue
-            self.all_rl_deletions[coin.name()] = coin
+            self.all_rl_deletions.add(coin.name())
             if coin.puzzle_hash == self.rl_coin.puzzle_hash:
                 self.current_rl_balance -= coin.amount
                 if self.current_rl_balance == 0:
@@ -88,6 +203,8 @@ class RLWallet(Wallet):
                     self.rl_origin = None
                     self.rl_parent = None
                 #TODO clean/reset all state so that new rl coin can be received again
+        self.all_rl_additions.next_block()
+        self.all_rl_deletions.next_block()
 
     def ac_notify(self, additions):
         if self.rl_coin is None:
@@ -95,11 +212,13 @@ class RLWallet(Wallet):
 
         spend_bundle_list = []
 
+        aggregation_puzzle_hash = self.rl_aggregation_puzzle()[1]
         for coin in additions:
-            if ProgramHash(self.rl_make_aggregation_puzzle(self.rl_coin.puzzle_hash)) == coin.puzzle_hash:
+            if coin.puzzle_hash == aggregation_puzzle_hash:
                 self.aggregation_coins.add(coin)
-                spend_bundle = self.rl_generate_signed_aggregation_transaction()
-                spend_bundle_list.append(spend_bundle)
+        # all of them in one bundle, separate ones would race to spend rl_coin
+        if self.aggregation_coins:
+            spend_bundle_list.append(self.rl_generate_signed_aggregation_transaction())
 
         if spend_bundle_list:
             return spend_bundle_list
@@ -111,10 +230,7 @@ class RLWallet(Wallet):
             return None
         if self.rl_clawback_pk is None:
             return None
-        return any(map(lambda child: hash == ProgramHash(self.rl_puzzle_for_pk(
-            bytes(self.extended_secret_key.public_child(child)), self.limit, self.interval,
-            self.rl_origin, self.rl_clawback_pk)),
-                       reversed(range(self.next_address))))
+        return hash in self.rl_puzzle_hash_index()
 
     # Solution to this puzzle must be in format:
     # (1 my_parent_id, my_puzzlehash, my_amount, outgoing_puzzle_hash, outgoing_amount, min_block_time, parent_parent_id, parent_amount)
@@ -126,38 +242,27 @@ class RLWallet(Wallet):
     # if not (min_block_age * M >=  V * N) do X (raise)
     # ASSERT_COIN_BLOCK_AGE_EXCEEDS min_block_age
     def rl_puzzle_for_pk(self, pubkey, rate_amount, interval_time, origin_id, clawback_pk):
-        hex_pk = hexbytes(pubkey)
-        #breakpoint()
-        opcode_aggsig = hexlify(ConditionOpcode.AGG_SIG).decode('ascii')
-        opcode_coin_block_age = hexlify(ConditionOpcode.ASSERT_BLOCK_AGE_EXCEEDS).decode('ascii')
-        opcode_create = hexlify(ConditionOpcode.CREATE_COIN).decode('ascii')
-        opcode_myid = hexlify(ConditionOpcode.ASSERT_MY_COIN_ID).decode('ascii')
         if (not origin_id):
             return None
+        return RL_TEMPLATES[int(rate_amount), int(interval_time)].program(
+            bytes(pubkey), origin_id, clawback_pk)
 
-        TEMPLATE_MY_PARENT_ID = "(sha256 (f (r (r (r (r (r (r (a)))))))) (f (r (a))) (f (r (r (r (r (r (r (r (a))))))))))"
-        TEMPLATE_SINGLETON_RL = f"((c (i (i (= {TEMPLATE_MY_PARENT_ID} (f (a))) (q 1) (= (f (a)) (q 0x{origin_id}))) (q (c (q 1) (q ()))) (q (x (q \"Parent doesnt satisfy RL conditions\")))) (a)))"
-        TEMPLATE_BLOCK_AGE = f"((c (i (i (= (* (f (r (r (r (r (r (a))))))) (q {rate_amount})) (* (f (r (r (r (r (a)))))) (q {interval_time}))) (q 1) (q (> (* (f (r (r (r (r (r (a))))))) (q {rate_amount})) (* (f (r (r (r (r (a))))))) (q {interval_time})))) (q (c (q 0x{opcode_coin_block_age}) (c (f (r (r (r (r (r (a))))))) (q ())))) (q (x (q \"wrong min block time\")))) (a) ))"
-        TEMPLATE_MY_ID = f"(c (q 0x{opcode_myid}) (c (sha256 (f (a)) (f (r (a))) (f (r (r (a))))) (q ())))"
-        CREATE_CHANGE = f"(c (q 0x{opcode_create}) (c (f (r (a))) (c (- (f (r (r (a)))) (f (r (r (r (r (a))))))) (q ()))))"
-        CREATE_NEW_COIN = f"(c (q 0x{opcode_create}) (c (f (r (r (r (a))))) (c (f (r (r (r (r (a)))))) (q ()))))"
-        RATE_LIMIT_PUZZLE = f"(c {TEMPLATE_SINGLETON_RL} (c {TEMPLATE_BLOCK_AGE} (c {CREATE_CHANGE} (c {TEMPLATE_MY_ID} (c {CREATE_NEW_COIN} (q ()))))))"
-
-        TEMPLATE_MY_PARENT_ID_2 = "(sha256 (f (r (r (r (r (r (r (r (r (a)))))))))) (f (r (a))) (f (r (r (r (r (r (r (r (a))))))))))"
-        TEMPLATE_SINGLETON_RL_2 = f"((c (i (i (= {TEMPLATE_MY_PARENT_ID_2} (f (r (r (r (r (r (a)))))))) (q 1) (= (f (r (r (r (r (r (a))))))) (q 0x{origin_id}))) (q (c (q 1) (q ()))) (q (x (q \"Parent doesnt satisfy RL conditions\")))) (a)))"
-        CREATE_CONSOLIDATED = f"(c (q 0x{opcode_create}) (c (f (r (a))) (c (+ (f (r (r (r (r (a)))))) (f (r (r (r (r (r (r (a))))))))) (q ()))))"
-        MODE_TWO_ME_STRING = f"(c (q 0x{opcode_myid}) (c (sha256 (f (r (r (r (r (r (a))))))) (f (r (a))) (f (r (r (r (r (r (r (a))))))))) (q ())))"
-        CREATE_LOCK = f"(c (q 0x{opcode_create}) (c (sha256tree (c (q 7) (c (c (q 5) (c (c (q 1) (c (sha256 (f (r (r (a)))) (f (r (r (r (a))))) (f (r (r (r (r (a))))))) (q ()))) (c (q (q ())) (q ())))) (q ())))) (c (q 0) (q ()))))"
-
-        MODE_TWO = f"(c {TEMPLATE_SINGLETON_RL_2} (c {MODE_TWO_ME_STRING} (c {CREATE_LOCK} (c {CREATE_CONSOLIDATED} (q ())))))"
-
-        AGGSIG_ENTIRE_SOLUTION = f"(c (q 0x{opcode_aggsig}) (c (q 0x{hex_pk}) (c (sha256tree (a)) (q ()))))"
-
-        WHOLE_PUZZLE = f"(c {AGGSIG_ENTIRE_SOLUTION} ((c (i (= (f (a)) (q 1)) (q ((c (q {RATE_LIMIT_PUZZLE}) (r (a))))) (q {MODE_TWO})) (a))) (q ()))"
-        CLAWBACK = f"(c (c (q 0x{opcode_aggsig}) (c (q 0x{clawback_pk}) (c (sha256tree (a)) (q ())))) (r (a)))"
-        WHOLE_PUZZLE_WITH_CLAWBACK = f"((c (i (= (f (a)) (q 3)) (q {CLAWBACK}) (q {WHOLE_PUZZLE})) (a)))"
+    # ProgramHash(self.rl_puzzle_for_pk(...)) without building the puzzle
+    def rl_puzzle_hash_for_pk(self, pubkey, rate_amount, interval_time, origin_id, clawback_pk):
+        if (not origin_id):
+            return None
+        return RL_TEMPLATES[int(rate_amount), int(interval_time)].program_hash(
+            bytes(pubkey), origin_id, clawback_pk)
 
-        return Program(binutils.assemble(WHOLE_PUZZLE_WITH_CLAWBACK))
+    # The puzzle locking coins to be aggregated into rl_coin, and its hash,
+    # which are only rebuilt when the puzzle hash of rl_coin changes
+    def rl_aggregation_puzzle(self):
+        if self.rl_coin is None:
+            return None, None
+        if self.rl_aggregation is None or self.rl_aggregation[0] != self.rl_coin.puzzle_hash:
+            puzzle = self.rl_make_aggregation_puzzle(self.rl_coin.puzzle_hash)
+            self.rl_aggregation = (self.rl_coin.puzzle_hash, puzzle, program_hash(puzzle))
+        return self.rl_aggregation[1:]
 
     def rl_make_aggregation_puzzle(self, wallet_puzzle):
         # If Wallet A wants to send further funds to Wallet B then they can lock them up using this code
@@ -172,7 +277,7 @@ class RLWallet(Wallet):
         input_of_lock = f"(c (q 0x{opcode_consumed}) (c (sha256 {parent_coin_id} {lock_puzzle} (q 0)) (q ())))"
         puz = f"(c {me_is_my_id} (c {input_of_lock} (q ())))"
 
-        return Program(binutils.assemble(puz))
+        return assemble(puz)
 
     # Solution is (1 my_parent_id, my_puzzlehash, my_amount, outgoing_puzzle_hash, outgoing_amount, min_block_time, parent_parent_id, parent_amount)
     # min block time = Math.ceil((new_amount * self.interval) / self.limit)
@@ -192,9 +297,7 @@ class RLWallet(Wallet):
         return Program(binutils.assemble(sol))
 
     def make_clawback_solution(self, puzzlehash, amount):
-        opcode_create = hexlify(ConditionOpcode.CREATE_COIN).decode('ascii')
-        solution = f"(3 (0x{opcode_create} 0x{puzzlehash} {amount}))"
-        return Program(binutils.assemble(solution))
+        return rl_clawback_solution(puzzlehash, amount)
 
     def rl_make_aggregation_solution(self, myid, wallet_coin_primary_input, wallet_coin_amount):
         opcode_myid = hexlify(myid).decode('ascii')
@@ -206,11 +309,9 @@ class RLWallet(Wallet):
         s = super().get_keys(hash)
         if s is not None:
             return s
-        for child in reversed(range(self.next_address)):
-            pubkey = self.extended_secret_key.public_child(child)
-            if hash == ProgramHash(
-                    self.rl_puzzle_for_pk(bytes(pubkey), self.limit, self.interval, self.rl_origin, self.rl_clawback_pk)):
-                return pubkey, self.extended_secret_key.private_child(child)
+        child = self.rl_puzzle_hash_index().get(hash)
+        if child is not None:
+            return self.extended_secret_key.public_child(child), self.extended_secret_key.private_child(child)
 
     def get_keys_pk(self, clawback_pubkey):
         for child in reversed(range(self.next_address)):
@@ -241,19 +342,13 @@ class RLWallet(Wallet):
         return self.rl_sign_transaction(transaction)
 
     def rl_sign_transaction(self, spends: (Program, [CoinSolution])):
-        sigs = []
+        items = []
         for puzzle, solution in spends:
             pubkey, secretkey = self.get_keys(
                 solution.coin.puzzle_hash)
-            signature = secretkey.sign(
-                ProgramHash(Program(solution.solution)))
-            sigs.append(signature)
-        aggsig = BLSSignature.aggregate(sigs)
-        solution_list = CoinSolutionList(
-            [CoinSolution(coin_solution.coin, clvm.to_sexp_f([puzzle, coin_solution.solution])) for
-             (puzzle, coin_solution) in spends])
-        spend_bundle = SpendBundle(solution_list, aggsig)
-        return spend_bundle
+            items.append((secretkey, ProgramHash(Program(solution.solution))))
+        sigs = self.signing_engine.sign_messages(items)
+        return spend_bundle_for_signatures(spends, sigs)
 
     def generate_unsigned_clawback_transaction(self):
         spends = []
@@ -264,18 +359,12 @@ class RLWallet(Wallet):
         return spends
 
     def sign_clawback_transaction(self, spends: (Program, [CoinSolution]), clawback_pubkey):
-        sigs = []
+        items = []
         for puzzle, solution in spends:
             pubkey, secretkey = self.get_keys_pk(clawback_pubkey)
-            signature = secretkey.sign(
-                ProgramHash(Program(solution.solution)))
-            sigs.append(signature)
-        aggsig = BLSSignature.aggregate(sigs)
-        solution_list = CoinSolutionList(
-            [CoinSolution(coin_solution.coin, clvm.to_sexp_f([puzzle, coin_solution.solution])) for
-             (puzzle, coin_solution) in spends])
-        spend_bundle = SpendBundle(solution_list, aggsig)
-        return spend_bundle
+            items.append((secretkey, ProgramHash(Program(solution.solution))))
+        sigs = self.signing_engine.sign_messages(items)
+        return spend_bundle_for_signatures(spends, sigs)
 
     def clawback_rl_coin(self):
         transaction = self.generate_unsigned_clawback_transaction()
@@ -283,46 +372,54 @@ class RLWallet(Wallet):
             return None
         return self.sign_clawback_transaction(transaction, self.clawback_pk)
 
-    # This is for using the AC locked coin and aggregating it into wallet - must happen in same block as RL Mode 2
+    # This is for using the AC locked coins and aggregating them into wallet - must happen in same block as RL Mode 2
+    # A mode 2 spend absorbs one locked coin and creates the next RL coin,
+    # so every pending coin is folded in by a chain of them in one bundle,
+    # each spending the RL coin created by the one before it
     def rl_generate_signed_aggregation_transaction(self):
-        list_of_coinsolutions = []
-        if self.aggregation_coins is False:  # empty sets evaluate to false in python
-            return
-        consolidating_coin = self.aggregation_coins.pop()
+        if not self.aggregation_coins:
+            return None
+        consolidating_coins = sorted(self.aggregation_coins, key=lambda coin: coin.name())
+        self.aggregation_coins.clear()
 
-        pubkey, secretkey = self.get_keys(
-            self.rl_coin.puzzle_hash)
-        # Spend wallet coin
+        pubkey, secretkey = self.get_keys(self.rl_coin.puzzle_hash)
         puzzle = self.rl_puzzle_for_pk(bytes(pubkey), self.limit, self.interval, self.rl_origin, self.rl_clawback_pk)
-
+        aggregation_puzzle = self.rl_aggregation_puzzle()[0]
         if isinstance(self.rl_parent, Coin):
-            solution = self.rl_make_solution_mode_2(self.rl_coin.puzzle_hash, consolidating_coin.parent_coin_info,
-                                                consolidating_coin.puzzle_hash, consolidating_coin.amount,
-                                                self.rl_coin.parent_coin_info, self.rl_coin.amount,
-                                                self.rl_parent.amount, self.rl_parent.parent_coin_info)
+            parent_amount, parent_parent_id = self.rl_parent.amount, self.rl_parent.parent_coin_info
         else:
-            solution = self.rl_make_solution_mode_2(self.rl_coin.puzzle_hash, consolidating_coin.parent_coin_info,
+            parent_amount, parent_parent_id = self.rl_parent["amount"], self.rl_parent["parent_coin_info"]
+
+        list_of_coinsolutions = []
+        items = []
+        rl_coin = self.rl_coin
+        for consolidating_coin in consolidating_coins:
+            # Spend wallet coin
+            solution = self.rl_make_solution_mode_2(rl_coin.puzzle_hash, consolidating_coin.parent_coin_info,
                                                     consolidating_coin.puzzle_hash, consolidating_coin.amount,
-                                                    self.rl_coin.parent_coin_info, self.rl_coin.amount,
-                                                    self.rl_parent["amount"], self.rl_parent["parent_coin_info"])
-        signature = secretkey.sign(ProgramHash(solution))
-        list_of_coinsolutions.append(CoinSolution(self.rl_coin, clvm.to_sexp_f([puzzle, solution])))
-
-        # Spend consolidating coin
-        puzzle = self.rl_make_aggregation_puzzle(self.rl_coin.puzzle_hash)
-        solution = self.rl_make_aggregation_solution(consolidating_coin.name()
-                                                     , self.rl_coin.parent_coin_info
-                                                     , self.rl_coin.amount)
-        list_of_coinsolutions.append(CoinSolution(consolidating_coin, clvm.to_sexp_f([puzzle, solution])))
-        # Spend lock
-        puzstring = "(r (c (q 0x" + hexlify(consolidating_coin.name()).decode('ascii') + ") (q ())))"
-
-        puzzle = Program(binutils.assemble(puzstring))
-        solution = Program(binutils.assemble("()"))
-        list_of_coinsolutions.append(CoinSolution(Coin(self.rl_coin, ProgramHash(
-            puzzle), 0), clvm.to_sexp_f([puzzle, solution])))
-
-        aggsig = BLSSignature.aggregate([signature])
+                                                    rl_coin.parent_coin_info, rl_coin.amount,
+                                                    parent_amount, parent_parent_id)
+            items.append((secretkey, ProgramHash(solution)))
+            list_of_coinsolutions.append(CoinSolution(rl_coin, clvm.to_sexp_f([puzzle, solution])))
+
+            # Spend consolidating coin
+            solution = self.rl_make_aggregation_solution(consolidating_coin.name()
+                                                         , rl_coin.parent_coin_info
+                                                         , rl_coin.amount)
+            list_of_coinsolutions.append(CoinSolution(consolidating_coin,
+                                                      clvm.to_sexp_f([aggregation_puzzle, solution])))
+            # Spend lock
+            puzstring = "(r (c (q 0x" + hexlify(consolidating_coin.name()).decode('ascii') + ") (q ())))"
+
+            lock_puzzle, lock_puzzle_hash = assemble_with_hash(puzstring)
+            solution = assemble("()")
+            list_of_coinsolutions.append(CoinSolution(Coin(rl_coin, lock_puzzle_hash, 0),
+                                                      clvm.to_sexp_f([lock_puzzle, solution])))
+
+            parent_amount, parent_parent_id = rl_coin.amount, hexbytes(rl_coin.parent_coin_info)
+            rl_coin = Coin(rl_coin, rl_coin.puzzle_hash, rl_coin.amount + consolidating_coin.amount)
+
+        aggsig = BLSSignature.aggregate(self.signing_engine.sign_messages(items))
         solution_list = CoinSolutionList(list_of_coinsolutions)
 
         return SpendBundle(solution_list, aggsig)
@@ -332,35 +429,44 @@ class RLWallet(Wallet):
         return puzzle
 
     def get_puzzlehash_for_pk(self, pubkey):
-        puzzle = self.get_puzzle_for_pk(pubkey)
-        puzzlehash = ProgramHash(puzzle)
-        return puzzlehash
+        return puzzle_hash_for_pk(pubkey)
 
     def rl_get_aggregation_puzzlehash(self, wallet_puzzle):
-        return ProgramHash(self.rl_make_aggregation_puzzle(wallet_puzzle))
+        return program_hash(self.rl_make_aggregation_puzzle(wallet_puzzle))
 
     # We need to select origin primary input
     def select_coins(self, amount, origin_name=None):
+        if origin_name is None:
+            return super().select_coins(amount)
         if amount > self.temp_balance:
             return None
-        used_utxos = set()
-        if origin_name is not None:
-            for coin in self.temp_utxos.copy():
-                if str(coin.name()) == str(origin_name):
-                    used_utxos.add(coin)
-        while sum(map(lambda coin: coin.amount, used_utxos)) < amount:
-            tmp = self.temp_utxos.pop()
-            if tmp.amount is not 0:
-                used_utxos.add(tmp)
+        if isinstance(origin_name, str):
+            origin_name = bytes.fromhex(origin_name)
+        used_utxos = []
+        origin = self.temp_utxos.coin_for_name(origin_name)
+        if origin is not None:
+            self.temp_utxos.remove(origin)
+            used_utxos.append(origin)
+        remaining = amount - sum(coin.amount for coin in used_utxos)
+        if remaining > 0:
+            rest = self.temp_utxos.select(remaining, self.coin_selection)
+            if rest is None:
+                for coin in used_utxos:
+                    self.temp_utxos.add(coin)
+                return None
+            used_utxos.extend(rest)
         return used_utxos
 
     def generate_unsigned_transaction_with_origin(self, amount, newpuzzlehash, origin_name):
         if self.temp_balance < amount:
             return None  # TODO: Should we throw a proper error here, or just return None?
         utxos = self.select_coins(amount, origin_name)
+        if utxos is None:
+            return None
         spends = []
         spend_value = sum([coin.amount for coin in utxos])
         change = spend_value - amount
+        change_coins = []
         for coin in utxos:
             puzzle_hash = coin.puzzle_hash
             pubkey, secretkey = self.get_keys(puzzle_hash)
@@ -372,12 +478,14 @@ class RLWallet(Wallet):
                     primaries.append(
                         {'puzzlehash': changepuzzlehash, 'amount': change})
                     # add change coin into temp_utxo set
-                    self.temp_utxos.add(Coin(coin, changepuzzlehash, change))
+                    change_coins.append(Coin(coin, changepuzzlehash, change))
+                    self.temp_utxos.add(change_coins[-1])
                 solution = self.make_solution(primaries=primaries)
             else:
                 solution = self.make_solution(consumed=[coin.name()])
             spends.append((puzzle, CoinSolution(coin, solution)))
         self.temp_balance -= amount
+        self.pending_spends.add(utxos, change_coins)
         return spends
 
     def generate_signed_transaction_with_origin(self, amount, newpuzzlehash, origin_name):
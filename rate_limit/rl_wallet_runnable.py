@@ -1,9 +1,9 @@
 import asyncio
 from rate_limit.rl_wallet import RLWallet
 from chiasim.clients.ledger_sim import connect_to_ledger_sim
-from chiasim.wallet.deltas import additions_for_body, removals_for_body
-from chiasim.hashable import BLSPublicKey, Coin
-from chiasim.hashable.Body import BodyList
+from chiasim.hashable import BLSPublicKey
+from utilities.chain_follower import ChainFollower
+from utilities.instrumentation import enable_from_environment
 from utilities.decorations import print_leaf, divider, prompt
 from chiasim.hashable import ProgramHash
 from binascii import hexlify
@@ -91,8 +91,7 @@ async def create_rl_coin(wallet, ledger_api):
     print("Press Enter to continue:")
     input(prompt)
     pubkey = bytes(BLSPublicKey.from_bytes(bytes.fromhex(pubkey)))
-    rl_puzzle = wallet.rl_puzzle_for_pk(pubkey, rate, interval, origin.name(), my_pubkey)
-    rl_puzzlehash = ProgramHash(rl_puzzle)
+    rl_puzzlehash = wallet.rl_puzzle_hash_for_pk(pubkey, rate, interval, origin.name(), my_pubkey)
     wallet.clawback_puzzlehash = rl_puzzlehash
     wallet.clawback_origin = origin.name()
     wallet.clawback_limit = rate
@@ -158,18 +157,11 @@ async def add_funds_to_rl_coin(wallet, ledger_api):
 
 
 async def update_ledger(wallet, ledger_api, most_recent_header):
-    if most_recent_header is None:
-        r = await ledger_api.get_all_blocks()
-    else:
-        r = await ledger_api.get_recent_blocks(most_recent_header=most_recent_header)
-    update_list = BodyList.from_bytes(r)
+    blocks = await ChainFollower(ledger_api, coin_cache=wallet.coin_cache).recent_blocks(most_recent_header)
     tip = await ledger_api.get_tip()
     index = int(tip["tip_index"])
-    for body in update_list:
-        additions = list(additions_for_body(body))
-        removals = removals_for_body(body)
-        removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
-        spend_bundle_list = wallet.notify(additions, removals, index)
+    for block in blocks:
+        spend_bundle_list = wallet.notify(block.additions, block.removals, index)
         if spend_bundle_list is not None:
             for spend_bundle in spend_bundle_list:
                 _ = await ledger_api.push_tx(tx=spend_bundle)
@@ -185,9 +177,8 @@ async def new_block(wallet, ledger_api):
     tip = await  ledger_api.get_tip()
     index = tip["tip_index"]
     most_recent_header = r['header']
-    additions = list(additions_for_body(body))
-    removals = removals_for_body(body)
-    removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
+    block, = await ChainFollower(ledger_api, coin_cache=wallet.coin_cache).blocks_for_bodies([body])
+    additions, removals = block.additions, block.removals
     wallet.notify(additions, removals, index)
     return most_recent_header
 
@@ -249,6 +240,7 @@ async def main_loop():
 
 
 def main():
+    enable_from_environment()
     run = asyncio.get_event_loop().run_until_complete
     run(main_loop())
 
@@ -12,7 +12,7 @@ except Exception:
 
 from chiasim.validation.Conditions import ConditionOpcode
 from chiasim.atoms import hexbytes
-from chiasim.hashable import Program, ProgramHash, CoinSolution, SpendBundle, BLSSignature
+from chiasim.hashable import Coin, Program, ProgramHash, CoinSolution, SpendBundle, BLSSignature
 from chiasim.hashable.CoinSolution import CoinSolutionList
 from clvm_tools import binutils
 from clvm import to_sexp_f
@@ -23,7 +23,9 @@ from chiasim.validation.consensus import\
 from fractions import Fraction
 import math
 
+from puzzles.puzzle_template import PuzzleTemplate, TemplateFamily
 from utilities.BLSHDKey import BLSPublicHDKey
+from utilities.signing import spend_bundle_for_signatures
 
 
 def hash_sha256(val):
@@ -64,16 +66,90 @@ class DurationType(IntEnum):
     WALLCLOCK_TIME = 2
 
 
+# The puzzles are assembled once per duration type with placeholders for
+# their atoms, see puzzles.puzzle_template. Every value is passed in as a
+# placeholder atom, so these build the source with 0x literals throughout.
+
+def escrow_puzzle_source(duration_type, recovery_pubkey, pubkey, duration):
+    op_block_age_exceeds = ConditionOpcode.ASSERT_BLOCK_AGE_EXCEEDS[0]
+    op_time_exceeds = ConditionOpcode.ASSERT_TIME_EXCEEDS[0]
+    solution = args(0)
+    solution_args = args(1)
+    secure_switch = args(2)
+    evaluate_solution = eval(solution, solution_args)
+    standard_conditions = make_list(aggsig_condition(pubkey),
+                                    terminator=evaluate_solution)
+    if duration_type == DurationType.BLOCKS:
+        op_code = op_block_age_exceeds
+    elif duration_type == DurationType.WALLCLOCK_TIME:
+        op_code = op_time_exceeds
+    recovery_conditions = make_list(aggsig_condition(recovery_pubkey),
+                                    make_list(quote(op_code),
+                                              quote(f'0x{hexbytes(duration)}')),
+                                    terminator=evaluate_solution)
+    return make_if(is_zero(secure_switch),
+                   standard_conditions,
+                   recovery_conditions)
+
+
+def puzzle_source(pubkey, escrow_puzzlehash, stake_factor_numerator, stake_factor_denominator):
+    op_create = ConditionOpcode.CREATE_COIN[0]
+    op_consumed = ConditionOpcode.ASSERT_COIN_CONSUMED[0]
+    solution = args(0)
+    solution_args = args(1)
+    secure_switch = args(2)
+    parent = args(3)
+    puzzle_hash = args(4)
+    value = args(5)
+    new_value = args(6)
+    evaluate_solution = eval(solution, solution_args)
+    standard_conditions = make_list(aggsig_condition(pubkey),
+                                    terminator=evaluate_solution)
+    create_condition = make_if(equal(multiply(new_value, quote(f'0x{hexbytes(stake_factor_denominator)}')),
+                                     multiply(value, quote(f'0x{hexbytes(stake_factor_numerator)}'))),
+                               make_list(quote(op_create), quote(f'0x{hexbytes(escrow_puzzlehash)}'), new_value),
+                               fail())
+    coin_id = sha256(parent, puzzle_hash, value)
+    consumed_condition = make_list(quote(op_consumed), coin_id)
+    escrow_conditions = make_list(create_condition,
+                                  consumed_condition)
+    return make_if(is_zero(secure_switch),
+                   standard_conditions,
+                   escrow_conditions)
+
+
+# {duration_type: template of (recovery_pubkey, pubkey, duration)}
+ESCROW_TEMPLATES = TemplateFamily(escrow_puzzle_source, 3)
+
+# template of (pubkey, escrow_puzzlehash, stake_factor_numerator, stake_factor_denominator)
+PUZZLE_TEMPLATE = PuzzleTemplate(puzzle_source, 4)
+
+
 class RecoverableWallet(Wallet):
     def __init__(self, stake_factor, escrow_duration, duration_type):
         super().__init__()
         self.escrow_duration = escrow_duration
         self.duration_type = duration_type
         self.stake_factor = stake_factor
-        self.backup_hd_root_public_key = self.extended_secret_key.public_hd_key()
-        self.backup_private_key = self.extended_secret_key.private_child(self.next_address)
         self.next_address += 1
         self.escrow_coins = defaultdict(set)
+        # see recoverable_puzzle_hash_index
+        self.recoverable_index_key = None
+        self.recoverable_indexed = 0  # children indexed so far
+        self.recoverable_children = {}  # {puzzle_hash: child}
+        self.escrow_children = {}  # {escrow_puzzle_hash: child}
+
+    def set_seed(self, seed):
+        super().set_seed(seed)
+        # child 0 is reserved for the backup key
+        self.backup_hd_root_public_key = self.extended_secret_key.public_hd_key()
+        self.backup_private_key = self.extended_secret_key.private_child(0)
+
+    def get_extra_state(self):
+        return dict(escrow_coins=dict(self.escrow_coins))
+
+    def set_extra_state(self, state):
+        self.escrow_coins = defaultdict(set, state.get("escrow_coins", {}))
 
     def get_recovery_public_key(self):
         return self.backup_private_key.public_key()
@@ -103,59 +179,23 @@ class RecoverableWallet(Wallet):
         return str(hexbytes(cbor.dumps(d)))
 
     def get_escrow_puzzle_with_params(self, recovery_pubkey, pubkey, duration, duration_type):
-        op_block_age_exceeds = ConditionOpcode.ASSERT_BLOCK_AGE_EXCEEDS[0]
-        op_time_exceeds = ConditionOpcode.ASSERT_TIME_EXCEEDS[0]
-        solution = args(0)
-        solution_args = args(1)
-        secure_switch = args(2)
-        evaluate_solution = eval(solution, solution_args)
-        standard_conditions = make_list(aggsig_condition(pubkey),
-                                        terminator=evaluate_solution)
-        if duration_type == DurationType.BLOCKS:
-            op_code = op_block_age_exceeds
-        elif duration_type == DurationType.WALLCLOCK_TIME:
-            op_code = op_time_exceeds
-        recovery_conditions = make_list(aggsig_condition(recovery_pubkey),
-                                        make_list(quote(op_code),
-                                                  quote(duration)),
-                                        terminator=evaluate_solution)
-        escrow_puzzle = make_if(is_zero(secure_switch),
-                                standard_conditions,
-                                recovery_conditions)
-        program = Program(binutils.assemble(escrow_puzzle))
-        return program
+        return ESCROW_TEMPLATES[duration_type].program(bytes(recovery_pubkey), bytes(pubkey), duration)
 
-    def get_new_puzzle_with_params_and_root(self, recovery_pubkey, pubkey, stake_factor, duration, duration_type):
-        op_create = ConditionOpcode.CREATE_COIN[0]
-        op_consumed = ConditionOpcode.ASSERT_COIN_CONSUMED[0]
-        solution = args(0)
-        solution_args = args(1)
-        secure_switch = args(2)
-        parent = args(3)
-        puzzle_hash = args(4)
-        value = args(5)
-        new_value = args(6)
-        evaluate_solution = eval(solution, solution_args)
-        standard_conditions = make_list(aggsig_condition(pubkey),
-                                        terminator=evaluate_solution)
-        escrow_program = self.get_escrow_puzzle_with_params(recovery_pubkey, pubkey, duration, duration_type)
-        escrow_puzzlehash = f'0x' + str(hexbytes(ProgramHash(escrow_program)))
+    def get_escrow_puzzlehash_with_params(self, recovery_pubkey, pubkey, duration, duration_type):
+        return ESCROW_TEMPLATES[duration_type].program_hash(bytes(recovery_pubkey), bytes(pubkey), duration)
+
+    def puzzle_values(self, recovery_pubkey, pubkey, stake_factor, duration, duration_type):
+        escrow_puzzlehash = self.get_escrow_puzzlehash_with_params(recovery_pubkey, pubkey, duration, duration_type)
         f = Fraction(stake_factor)
-        stake_factor_numerator = quote(f.numerator)
-        stake_factor_denominator = quote(f.denominator)
-        create_condition = make_if(equal(multiply(new_value, stake_factor_denominator),
-                                         multiply(value, stake_factor_numerator)),
-                                   make_list(quote(op_create), quote(escrow_puzzlehash), new_value),
-                                   fail())
-        coin_id = sha256(parent, puzzle_hash, value)
-        consumed_condition = make_list(quote(op_consumed), coin_id)
-        escrow_conditions = make_list(create_condition,
-                                      consumed_condition)
-        puzzle = make_if(is_zero(secure_switch),
-                         standard_conditions,
-                         escrow_conditions)
-        program = Program(binutils.assemble(puzzle))
-        return program
+        return bytes(pubkey), escrow_puzzlehash, f.numerator, f.denominator
+
+    def get_new_puzzle_with_params_and_root(self, recovery_pubkey, pubkey, stake_factor, duration, duration_type):
+        return PUZZLE_TEMPLATE.program(*self.puzzle_values(
+            recovery_pubkey, pubkey, stake_factor, duration, duration_type))
+
+    def get_new_puzzlehash_with_params_and_root(self, recovery_pubkey, pubkey, stake_factor, duration, duration_type):
+        return PUZZLE_TEMPLATE.program_hash(*self.puzzle_values(
+            recovery_pubkey, pubkey, stake_factor, duration, duration_type))
 
     def get_new_puzzle_with_params(self, pubkey, stake_factor, escrow_duration, duration_type):
         return self.get_new_puzzle_with_params_and_root(bytes(self.get_recovery_public_key()),
@@ -164,6 +204,13 @@ class RecoverableWallet(Wallet):
                                                         escrow_duration,
                                                         duration_type)
 
+    def get_new_puzzlehash_with_params(self, pubkey, stake_factor, escrow_duration, duration_type):
+        return self.get_new_puzzlehash_with_params_and_root(bytes(self.get_recovery_public_key()),
+                                                            pubkey,
+                                                            stake_factor,
+                                                            escrow_duration,
+                                                            duration_type)
+
     def get_new_puzzle(self):
         pubkey = bytes(self.get_next_public_key())
         program = self.get_new_puzzle_with_params(pubkey,
@@ -173,17 +220,36 @@ class RecoverableWallet(Wallet):
         return program
 
     def get_new_puzzlehash(self):
-        puzzle = self.get_new_puzzle()
-        puzzlehash = ProgramHash(puzzle)
+        pubkey = bytes(self.get_next_public_key())
+        puzzlehash = self.get_new_puzzlehash_with_params(pubkey,
+                                                         self.get_stake_factor(),
+                                                         self.get_escrow_duration(),
+                                                         self.get_duration_type())
         return puzzlehash
 
+    # Index the recoverable and escrow puzzle hashes of every address
+    # handed out by child, under the current seed, stake factor and escrow
+    # duration. It's rebuilt when any of those change, and otherwise only
+    # extended with the children handed out since the last call.
+    def recoverable_puzzle_hash_index(self):
+        key = (self.backup_private_key, self.get_stake_factor(), self.get_escrow_duration(), self.get_duration_type())
+        if key != self.recoverable_index_key:
+            self.recoverable_index_key = key
+            self.recoverable_indexed = 0
+            self.recoverable_children = {}
+            self.escrow_children = {}
+        if self.recoverable_indexed < self.next_address:
+            recovery_pubkey = bytes(self.get_recovery_public_key())
+            for child in range(self.recoverable_indexed, self.next_address):
+                pubkey = bytes(self.extended_secret_key.public_child(child))
+                values = self.puzzle_values(recovery_pubkey, pubkey, *key[1:])
+                self.escrow_children[values[1]] = child
+                self.recoverable_children[PUZZLE_TEMPLATE.program_hash(*values)] = child
+            self.recoverable_indexed = self.next_address
+
     def can_generate_puzzle_hash(self, hash):
-        return any(map(lambda child: hash == ProgramHash(self.get_new_puzzle_with_params(
-            bytes(self.extended_secret_key.public_child(child)),
-            self.get_stake_factor(),
-            self.get_escrow_duration(),
-            self.get_duration_type())),
-                reversed(range(self.next_address))))
+        self.recoverable_puzzle_hash_index()
+        return hash in self.recoverable_children
 
     def is_in_escrow(self, coin):
         keys = self.get_keys_for_escrow_puzzle(coin.puzzle_hash)
@@ -192,11 +258,18 @@ class RecoverableWallet(Wallet):
     def balance(self):
         return sum([coin.amount for coin in self.my_utxos])
 
+    # recoverable and escrow puzzle hashes depend on the stake and duration
+    def watched_puzzle_hashes(self):
+        return None
+
     def notify(self, additions, deletions):
+        added = []
+        removed = []
         for coin in deletions:
             if coin in self.my_utxos:
                 self.my_utxos.remove(coin)
                 self.current_balance -= coin.amount
+                removed.append(coin)
             for _, coin_set in self.escrow_coins.items():
                 if coin in coin_set:
                     print(f'Notice: {coin.name()} was removed from escrow')
@@ -205,9 +278,10 @@ class RecoverableWallet(Wallet):
             if self.can_generate_puzzle_hash(coin.puzzle_hash):
                 self.current_balance += coin.amount
                 self.my_utxos.add(coin)
+                added.append(coin)
 
-        self.temp_utxos = self.my_utxos.copy()
-        self.temp_balance = self.current_balance
+        self.pending_spends.reconcile(deletions)
+        self.apply_to_temp_utxos(added, removed)
 
     def can_generate_puzzle_hash_with_root_public_key(self,
                                                       hash,
@@ -217,12 +291,12 @@ class RecoverableWallet(Wallet):
                                                       duration_type):
         root_public_key = BLSPublicHDKey.from_bytes(root_public_key_serialized)
         recovery_pubkey = bytes(root_public_key.public_child(0))
-        return any(map(lambda child: hash == ProgramHash(self.get_new_puzzle_with_params_and_root(
+        return any(map(lambda child: hash == self.get_new_puzzlehash_with_params_and_root(
             recovery_pubkey,
             bytes(root_public_key.public_child(child)),
             stake_factor,
             escrow_duration,
-            duration_type)),
+            duration_type),
                 reversed(range(20))))
 
     def find_pubkey_for_hash(self, hash, root_public_key_serialized, stake_factor, escrow_duration, duration_type):
@@ -230,23 +304,19 @@ class RecoverableWallet(Wallet):
         recovery_pubkey = bytes(root_public_key.public_child(0))
         for child in reversed(range(20)):
             pubkey = bytes(root_public_key.public_child(child))
-            puzzle = self.get_new_puzzle_with_params_and_root(recovery_pubkey,
-                                                              pubkey,
-                                                              stake_factor,
-                                                              escrow_duration,
-                                                              duration_type)
-            puzzlehash = ProgramHash(puzzle)
+            puzzlehash = self.get_new_puzzlehash_with_params_and_root(recovery_pubkey,
+                                                                      pubkey,
+                                                                      stake_factor,
+                                                                      escrow_duration,
+                                                                      duration_type)
             if hash == puzzlehash:
                 return pubkey
 
     def get_keys(self, hash):
-        for child in range(self.next_address):
-            pubkey = self.extended_secret_key.public_child(child)
-            if hash == ProgramHash(self.get_new_puzzle_with_params(bytes(pubkey),
-                                                                   self.get_stake_factor(),
-                                                                   self.get_escrow_duration(),
-                                                                   self.get_duration_type())):
-                return pubkey, self.extended_secret_key.private_child(child)
+        self.recoverable_puzzle_hash_index()
+        child = self.recoverable_children.get(hash)
+        if child is not None:
+            return self.extended_secret_key.public_child(child), self.extended_secret_key.private_child(child)
 
     def generate_unsigned_transaction(self, amount, newpuzzlehash):
         stake_factor = self.get_stake_factor()
@@ -257,6 +327,7 @@ class RecoverableWallet(Wallet):
         output_id = None
         spend_value = sum([coin.amount for coin in utxos])
         change = spend_value - amount
+        change_coins = []
         for coin in utxos:
             puzzle_hash = coin.puzzle_hash
 
@@ -270,11 +341,16 @@ class RecoverableWallet(Wallet):
                 if change > 0:
                     changepuzzlehash = self.get_new_puzzlehash()
                     primaries.append({'puzzlehash': changepuzzlehash, 'amount': change})
+                    # add change coin into temp_utxo set
+                    change_coins.append(Coin(coin, changepuzzlehash, change))
+                    self.temp_utxos.add(change_coins[-1])
+                    self.temp_balance += change
                 solution = make_solution(coin.parent_coin_info, coin.puzzle_hash, coin.amount, stake_factor, primaries=primaries)
                 output_id = hash_sha256(coin.name() + newpuzzlehash)
             else:
                 solution = make_solution(coin.parent_coin_info, coin.puzzle_hash, coin.amount, stake_factor)
             spends.append((puzzle, CoinSolution(coin, solution)))
+        self.pending_spends.add(utxos, change_coins)
         return spends
 
 
@@ -287,6 +363,7 @@ class RecoverableWallet(Wallet):
         output_id = None
         spend_value = sum([coin.amount for coin in utxos])
         change = spend_value - amount
+        change_coins = []
         for coin in utxos:
             puzzle_hash = coin.puzzle_hash
 
@@ -300,11 +377,16 @@ class RecoverableWallet(Wallet):
                 if change > 0:
                     changepuzzlehash = self.get_new_puzzlehash()
                     primaries.append({'puzzlehash': changepuzzlehash, 'amount': change})
+                    # add change coin into temp_utxo set
+                    change_coins.append(Coin(coin, changepuzzlehash, change))
+                    self.temp_utxos.add(change_coins[-1])
+                    self.temp_balance += change
                 solution = make_solution(coin.parent_coin_info, coin.puzzle_hash, coin.amount, stake_factor, primaries=primaries)
                 output_id = True
             else:
                 solution = make_solution(coin.parent_coin_info, coin.puzzle_hash, coin.amount, stake_factor)
             spends.append((puzzle, CoinSolution(coin, solution)))
+        self.pending_spends.add(utxos, change_coins)
         return spends
 
     def generate_recovery_to_escrow_transaction(self,
@@ -345,34 +427,21 @@ class RecoverableWallet(Wallet):
         return signed_transaction, destination_puzzlehash, amount
 
     def sign_transaction(self, spends: (Program, CoinSolution)):
-        sigs = []
+        items = []
         for puzzle, solution in spends:
             val = self.get_keys(solution.coin.puzzle_hash)
             if val is None:
                 continue
             pubkey, secretkey = val
-            code_ = [puzzle, solution.solution]
-            sexp = clvm.to_sexp_f(code_)
-            conditions_dict = conditions_by_opcode(conditions_for_solution(sexp))
-            for _ in hash_key_pairs_for_conditions_dict(conditions_dict):
-                signature = secretkey.sign(_.message_hash)
-                sigs.append(signature)
-        aggsig = BLSSignature.aggregate(sigs)
-        solution_list = CoinSolutionList(
-            [CoinSolution(coin_solution.coin, clvm.to_sexp_f([puzzle, coin_solution.solution])) for
-             (puzzle, coin_solution) in spends])
-        spend_bundle = SpendBundle(solution_list, aggsig)
-        return spend_bundle
+            items.append((secretkey, puzzle, solution.solution))
+        sigs = self.signing_engine.sign_solutions(items)
+        return spend_bundle_for_signatures(spends, sigs)
 
     def get_keys_for_escrow_puzzle(self, hash):
-        for child in range(self.next_address):
-            pubkey = self.extended_secret_key.public_child(child)
-            escrow_hash = ProgramHash(self.get_escrow_puzzle_with_params(bytes(self.get_recovery_public_key()),
-                                                                         bytes(pubkey),
-                                                                         self.get_escrow_duration(),
-                                                                         self.get_duration_type()))
-            if hash == escrow_hash:
-                return pubkey, self.extended_secret_key.private_child(child)
+        self.recoverable_puzzle_hash_index()
+        child = self.escrow_children.get(hash)
+        if child is not None:
+            return self.extended_secret_key.public_child(child), self.extended_secret_key.private_child(child)
 
     def generate_signed_transaction(self, amount, newpuzzlehash):
         transaction = self.generate_unsigned_transaction(amount, newpuzzlehash)
@@ -415,10 +484,10 @@ class RecoverableWallet(Wallet):
         child = 0
         while True:
             pubkey = root_public_key.public_child(child)
-            test_hash = ProgramHash(self.get_escrow_puzzle_with_params(recovery_pubkey,
-                                                                       bytes(pubkey),
-                                                                       duration,
-                                                                       duration_type))
+            test_hash = self.get_escrow_puzzlehash_with_params(recovery_pubkey,
+                                                               bytes(pubkey),
+                                                               duration,
+                                                               duration_type)
             if coin.puzzle_hash == test_hash:
                 return pubkey
             child += 1
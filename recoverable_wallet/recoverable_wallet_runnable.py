@@ -9,6 +9,8 @@ from chiasim.hashable import ProgramHash
 from chiasim.remote.client import RemoteError
 from decimal import Decimal
 from utilities.BLSHDKey import BLSPublicHDKey, BLSPrivateKey
+from utilities.chain_follower import ChainFollower
+from utilities.instrumentation import enable_from_environment
 
 
 async def view_coins(ledger_api, wallet, most_recent_header):
@@ -46,28 +48,22 @@ async def spend_coins(wallet, ledger_api):
 
 
 async def process_blocks(wallet, ledger_api, last_known_header, current_header_hash):
-    r = await ledger_api.hash_preimage(hash=current_header_hash)
-    header = Header.from_bytes(r)
-    body = Body.from_bytes(await ledger_api.hash_preimage(hash=header.body_hash))
-    if header.previous_hash != last_known_header:
-        await process_blocks(wallet, ledger_api, last_known_header, header.previous_hash)
-    print(f'processing block {HeaderHash(header)}')
-    additions = list(additions_for_body(body))
-    removals = removals_for_body(body)
-    removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
-    wallet.notify(additions, removals)
-    clawback_coins = [coin for coin in additions if wallet.is_in_escrow(coin)]
-    if len(clawback_coins) != 0:
-        print(f'WARNING! Coins from this wallet have been moved to escrow!\n'
-              f'Attempting to send a clawback for these coins:')
-        for coin in clawback_coins:
-            print(f'Coin ID: {coin.name()}, Amount: {coin.amount}')
-        transaction = wallet.generate_clawback_transaction(clawback_coins)
-        r = await ledger_api.push_tx(tx=transaction)
-        if type(r) is RemoteError:
-            print('Clawback failed')
-        else:
-            print('Clawback transaction submitted')
+    follower = ChainFollower(ledger_api, coin_cache=wallet.coin_cache)
+    async for block in follower.blocks_between(last_known_header, current_header_hash):
+        print(f'processing block {block.header_hash}')
+        wallet.notify(block.additions, block.removals)
+        clawback_coins = [coin for coin in block.additions if wallet.is_in_escrow(coin)]
+        if len(clawback_coins) != 0:
+            print(f'WARNING! Coins from this wallet have been moved to escrow!\n'
+                  f'Attempting to send a clawback for these coins:')
+            for coin in clawback_coins:
+                print(f'Coin ID: {coin.name()}, Amount: {coin.amount}')
+            transaction = wallet.generate_clawback_transaction(clawback_coins)
+            r = await ledger_api.push_tx(tx=transaction)
+            if type(r) is RemoteError:
+                print('Clawback failed')
+            else:
+                print('Clawback transaction submitted')
 
 
 async def farm_block(wallet, ledger_api, last_known_header):
@@ -252,6 +248,7 @@ async def main_loop():
 
 
 def main():
+    enable_from_environment()
     run = asyncio.get_event_loop().run_until_complete
     run(main_loop())
 
@@ -25,6 +25,7 @@ setuptools.setup(
     entry_points={
         "console_scripts": [
             "wallet = standard_wallet.wallet_runnable:main",
+            "wallet_daemon = standard_wallet.wallet_daemon:main",
             "ap_wallet = authorised_payees.ap_wallet_runnable:main",
             "as_wallet = atomic_swaps.as_wallet_runnable:main",
             "multisig_wallet = multisig.wallet:main",
@@ -0,0 +1,80 @@
+from chiasim.hashable import BLSPublicKey
+
+from utilities.BLSHDKey import PUBLIC_KEY_SIZE
+
+
+class KeyIndex:
+    """
+    The keys one wallet has derived, mapping each puzzle hash it owns to
+    (child_index, pubkey) like a read only dict, and a serialized public key
+    back to its child index.
+
+    Public keys are packed end to end in a bytearray indexed by child
+    number, and both maps only hold child numbers, so an entry costs two
+    dict slots and 48 bytes rather than a tuple and a key object, and an
+    empty index is three empty containers.
+    """
+
+    __slots__ = ("_pubkeys", "_by_puzzle_hash", "_by_pubkey")
+
+    def __init__(self):
+        self._pubkeys = bytearray()
+        self._by_puzzle_hash = {}  # {puzzle_hash: child_index}
+        self._by_pubkey = {}  # {bytes(pubkey): child_index}
+
+    def add(self, child, pubkey, puzzle_hash):
+        pubkey = bytes(pubkey)
+        end = (child + 1) * PUBLIC_KEY_SIZE
+        if len(self._pubkeys) < end:
+            self._pubkeys.extend(bytes(end - len(self._pubkeys)))
+        self._pubkeys[end - PUBLIC_KEY_SIZE:end] = pubkey
+        self._by_puzzle_hash[puzzle_hash] = child
+        self._by_pubkey[pubkey] = child
+
+    def pubkey(self, child):
+        start = child * PUBLIC_KEY_SIZE
+        return BLSPublicKey.from_bytes(bytes(self._pubkeys[start:start + PUBLIC_KEY_SIZE]))
+
+    def child_for_pubkey(self, pubkey):
+        return self._by_pubkey.get(bytes(pubkey))
+
+    def child_for_puzzle_hash(self, puzzle_hash):
+        return self._by_puzzle_hash.get(puzzle_hash)
+
+    def __getitem__(self, puzzle_hash):
+        child = self._by_puzzle_hash[puzzle_hash]
+        return child, self.pubkey(child)
+
+    def get(self, puzzle_hash, default=None):
+        child = self._by_puzzle_hash.get(puzzle_hash)
+        return default if child is None else (child, self.pubkey(child))
+
+    def __contains__(self, puzzle_hash):
+        return puzzle_hash in self._by_puzzle_hash
+
+    def __iter__(self):
+        return iter(self._by_puzzle_hash)
+
+    def __len__(self):
+        return len(self._by_puzzle_hash)
+
+    def keys(self):
+        return self._by_puzzle_hash.keys()
+
+    def items(self):
+        for puzzle_hash, child in self._by_puzzle_hash.items():
+            yield puzzle_hash, (child, self.pubkey(child))
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -0,0 +1,144 @@
+import hashlib
+
+
+# blocks a transaction can go unconfirmed before its coins are released
+PENDING_SPEND_TIMEOUT = 20
+
+
+def transaction_id(coins):
+    """
+    A transaction is identified by the names of the coins it spends, which
+    no other valid transaction can share.
+    """
+    h = hashlib.sha256()
+    for name in sorted(coin.name() for coin in coins):
+        h.update(name)
+    return h.digest()
+
+
+class PendingSpend:
+    __slots__ = ("tx_id", "inputs", "change", "age")
+
+    def __init__(self, tx_id, inputs, change):
+        self.tx_id = tx_id
+        self.inputs = inputs
+        self.change = change
+        self.age = 0
+
+
+class PendingSpends:
+    """
+    The transactions a wallet has built but not yet seen in a block: the
+    coins each one spends, which must not be selected again, and the change
+    it creates, which can already be spent by the next transaction.
+
+    A transaction is confirmed, and forgotten, as soon as a block removes
+    any of its inputs. One that is still unconfirmed after `timeout` blocks
+    is released, making its inputs selectable again and dropping its
+    change, along with every transaction that spent that change.
+
+    The transactions forgotten either way are kept until drain is called,
+    so a wallet can update what it can spend from just those.
+    """
+
+    def __init__(self, timeout=PENDING_SPEND_TIMEOUT):
+        self.timeout = timeout
+        self._spends = {}  # {tx_id: PendingSpend}
+        self._by_input = {}  # {coin_name: tx_id}
+        self._by_change = {}  # {coin_name: tx_id}
+        self._dropped = []  # [PendingSpend]
+
+    def add(self, inputs, change=()):
+        tx_id = transaction_id(inputs)
+        self.release(tx_id)
+        spend = PendingSpend(tx_id, list(inputs), list(change))
+        self._spends[tx_id] = spend
+        for coin in spend.inputs:
+            self._by_input[coin.name()] = tx_id
+        for coin in spend.change:
+            self._by_change[coin.name()] = tx_id
+        return tx_id
+
+    def _forget(self, tx_id):
+        spend = self._spends.pop(tx_id, None)
+        if spend is None:
+            return None
+        for coin in spend.inputs:
+            self._by_input.pop(coin.name(), None)
+        for coin in spend.change:
+            self._by_change.pop(coin.name(), None)
+        self._dropped.append(spend)
+        return spend
+
+    def release(self, tx_id):
+        """
+        Drop a transaction that won't be confirmed, e.g. because pushing it
+        failed, and every pending transaction spending its change. Returns
+        the ids released.
+        """
+        spend = self._forget(tx_id)
+        if spend is None:
+            return []
+        released = [tx_id]
+        for coin in spend.change:
+            child = self._by_input.get(coin.name())
+            if child is not None:
+                released.extend(self.release(child))
+        return released
+
+    def reconcile(self, deletions):
+        """
+        Call once per block with its removals. Returns the ids of the
+        transactions confirmed and the ids of those released for being too
+        old.
+        """
+        confirmed = set()
+        for coin in deletions:
+            tx_id = self._by_input.get(coin.name())
+            if tx_id is not None:
+                confirmed.add(tx_id)
+        for tx_id in confirmed:
+            self._forget(tx_id)
+        expired = []
+        for spend in list(self._spends.values()):
+            spend.age += 1
+            if spend.age > self.timeout and spend.tx_id in self._spends:
+                expired.extend(self.release(spend.tx_id))
+        return list(confirmed), expired
+
+    def reserved_names(self):
+        return self._by_input.keys()
+
+    def pending_change(self):
+        return [coin for spend in self._spends.values() for coin in spend.change]
+
+    def is_pending_change(self, coin):
+        return coin.name() in self._by_change
+
+    def drain(self):
+        """
+        Return the PendingSpends forgotten since the last call, whether
+        confirmed or released.
+        """
+        dropped, self._dropped = self._dropped, []
+        return dropped
+
+    def __contains__(self, tx_id):
+        return tx_id in self._spends
+
+    def __len__(self):
+        return len(self._spends)
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
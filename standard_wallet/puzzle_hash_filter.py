@@ -0,0 +1,97 @@
+# bytes of each puzzle hash or coin id kept by the filter
+PREFIX_SIZE = 8
+
+
+class PuzzleHashFilter:
+    """
+    A compact prefilter over the coins of a block: keeps only the first
+    PREFIX_SIZE bytes of every puzzle hash a wallet cares about, and
+    optionally of coin ids whose children it cares about, and lets through
+    the coins matching either. A prefix collision lets an unrelated coin
+    through, which the exact checks after it drop, but no coin of the
+    wallet's is ever filtered out.
+
+    Hashes are kept in named groups so the ones that depend on a wallet's
+    state can be replaced when it changes without touching the others.
+    Prefixes are counted, so a prefix shared by two groups survives either
+    being replaced.
+    """
+
+    __slots__ = ("_puzzle_hashes", "_parents", "_groups")
+
+    def __init__(self):
+        self._puzzle_hashes = {}  # {prefix: count}
+        self._parents = {}  # {prefix: count}
+        self._groups = {}  # {group: ([puzzle hash prefixes], [parent prefixes])}
+
+    @staticmethod
+    def _add(counts, prefixes):
+        for prefix in prefixes:
+            counts[prefix] = counts.get(prefix, 0) + 1
+
+    @staticmethod
+    def _remove(counts, prefixes):
+        for prefix in prefixes:
+            count = counts[prefix] - 1
+            if count:
+                counts[prefix] = count
+            else:
+                del counts[prefix]
+
+    def add(self, group, puzzle_hashes=(), parent_ids=()):
+        """
+        Add to group, creating it if needed.
+        """
+        puzzle_prefixes, parent_prefixes = self._groups.setdefault(group, ([], []))
+        new_puzzle_prefixes = [bytes(_[:PREFIX_SIZE]) for _ in puzzle_hashes]
+        new_parent_prefixes = [bytes(_[:PREFIX_SIZE]) for _ in parent_ids]
+        puzzle_prefixes.extend(new_puzzle_prefixes)
+        parent_prefixes.extend(new_parent_prefixes)
+        self._add(self._puzzle_hashes, new_puzzle_prefixes)
+        self._add(self._parents, new_parent_prefixes)
+
+    def replace(self, group, puzzle_hashes=(), parent_ids=()):
+        self.discard(group)
+        self.add(group, puzzle_hashes, parent_ids)
+
+    def discard(self, group):
+        prefixes = self._groups.pop(group, None)
+        if prefixes is not None:
+            self._remove(self._puzzle_hashes, prefixes[0])
+            self._remove(self._parents, prefixes[1])
+
+    def group_size(self, group):
+        prefixes = self._groups.get(group)
+        return 0 if prefixes is None else len(prefixes[0]) + len(prefixes[1])
+
+    def __contains__(self, puzzle_hash):
+        return puzzle_hash[:PREFIX_SIZE] in self._puzzle_hashes
+
+    def select(self, coins):
+        """
+        Return the coins which may matter, in their original order.
+        """
+        puzzle_hashes = self._puzzle_hashes
+        parents = self._parents
+        if parents:
+            return [coin for coin in coins
+                    if coin.puzzle_hash[:PREFIX_SIZE] in puzzle_hashes
+                    or coin.parent_coin_info[:PREFIX_SIZE] in parents]
+        return [coin for coin in coins if coin.puzzle_hash[:PREFIX_SIZE] in puzzle_hashes]
+
+    def __len__(self):
+        return len(self._puzzle_hashes) + len(self._parents)
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -0,0 +1,116 @@
+import collections
+import math
+
+
+# coins from the last RECENT_BLOCKS blocks are remembered exactly
+RECENT_BLOCKS = 100
+
+# older coins go into bloom filters of this capacity and false positive rate
+FILTER_CAPACITY = 100000
+FILTER_ERROR_RATE = 1e-6
+
+
+class BloomFilter:
+    """
+    A fixed size bloom filter over coin names. Coin names are already
+    sha256 hashes, so the bit positions are taken straight from the name
+    rather than hashing it again.
+    """
+
+    def __init__(self, capacity=FILTER_CAPACITY, error_rate=FILTER_ERROR_RATE):
+        self.capacity = capacity
+        bit_count = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(bit_count / capacity * math.log(2))))
+        self.bit_count = bit_count
+        self.bits = bytearray((bit_count + 7) // 8)
+        self.count = 0
+
+    def _positions(self, name):
+        # double hashing, h1 + i * h2, from two halves of the name
+        name = bytes(name)
+        h1 = int.from_bytes(name[:8], "big")
+        h2 = int.from_bytes(name[8:16], "big") | 1
+        return [(h1 + i * h2) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, name):
+        for position in self._positions(name):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def __contains__(self, name):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(name))
+
+
+class SeenCoins:
+    """
+    Remembers the names of coins a wallet has already processed so that a
+    block which is notified twice isn't counted twice, without growing
+    with the length of the chain.
+
+    Names added during the last `window` blocks are kept exactly. Older
+    names move into a bloom filter, and once that is full a fresh one is
+    started and the one before it is dropped, so at most two filters are
+    kept. A false positive means a coin is treated as already seen, which
+    at the default sizes happens for about one coin in a million.
+    """
+
+    def __init__(self, window=RECENT_BLOCKS, capacity=FILTER_CAPACITY, error_rate=FILTER_ERROR_RATE):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._recent = {}  # {coin_name: block_number}
+        self._blocks = collections.deque([[]])
+        self._block_number = 0
+        # filters are only allocated once names start leaving the window,
+        # so a wallet that sees few coins doesn't carry one
+        self._filters = []
+
+    def next_block(self):
+        """
+        Start a new block, moving the names from the block that falls out
+        of the window into the filter.
+        """
+        self._block_number += 1
+        self._blocks.append([])
+        if len(self._blocks) > self.window:
+            old_number = self._block_number - len(self._blocks) + 1
+            for name in self._blocks.popleft():
+                if self._recent.get(name) == old_number:
+                    del self._recent[name]
+                    self._add_to_filter(name)
+
+    def _add_to_filter(self, name):
+        if not self._filters or self._filters[-1].is_full():
+            self._filters = self._filters[-1:] + [BloomFilter(self.capacity, self.error_rate)]
+        self._filters[-1].add(name)
+
+    def add(self, name):
+        self._recent[name] = self._block_number
+        self._blocks[-1].append(name)
+
+    def __contains__(self, name):
+        if name in self._recent:
+            return True
+        return any(name in _ for _ in self._filters)
+
+    def __len__(self):
+        # only the exactly remembered names are counted
+        return len(self._recent)
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
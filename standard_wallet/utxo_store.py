@@ -0,0 +1,377 @@
+import random
+
+
+LARGEST_FIRST = "largest_first"
+BRANCH_AND_BOUND = "branch_and_bound"
+FEWEST_INPUTS = "fewest_inputs"
+
+# give up on finding an exact match after this many branches
+BNB_MAX_TRIES = 100000
+
+# enough levels for an index of 2 ** 32 coins
+MAX_LEVELS = 32
+
+
+class _End:
+    """
+    Sorts after every key, so walks along the index stop at the end.
+    """
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return self is other
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        # how many keys each link skips over, counting the one it lands on
+        self.width = [1] * levels
+
+
+END = _Node(_End(), 0)
+
+
+class SortedKeys:
+    """
+    A sorted sequence of keys, as an indexable skip list. Adding, removing,
+    indexing, bisecting and popping the largest key all take O(log n)
+    expected time, where a sorted list pays O(n) to shift its tail.
+    """
+
+    __slots__ = ("_head", "_top", "_len", "_random")
+
+    def __init__(self, keys=()):
+        self._head = _Node(None, MAX_LEVELS)
+        self._head.next = [END] * MAX_LEVELS
+        # levels above _top only link the head to END
+        self._top = 1
+        self._len = 0
+        self._random = random.Random()
+        for key in keys:
+            self.add(key)
+
+    def _levels(self):
+        levels = 1
+        while levels < MAX_LEVELS and self._random.getrandbits(1):
+            levels += 1
+        return levels
+
+    def add(self, key):
+        levels = self._levels()
+        if levels > self._top:
+            for level in range(self._top, levels):
+                self._head.width[level] = self._len + 1
+            self._top = levels
+        # the last node before key on each level, and its position
+        chain = [None] * self._top
+        positions = [0] * self._top
+        node = self._head
+        position = 0
+        for level in reversed(range(self._top)):
+            while node.next[level].key <= key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        new_node = _Node(key, levels)
+        for level in range(levels):
+            previous = chain[level]
+            skipped = position - positions[level]
+            new_node.next[level] = previous.next[level]
+            new_node.width[level] = previous.width[level] - skipped
+            previous.next[level] = new_node
+            previous.width[level] = skipped + 1
+        for level in range(levels, self._top):
+            chain[level].width[level] += 1
+        self._len += 1
+
+    def remove(self, key):
+        chain = [None] * self._top
+        node = self._head
+        for level in reversed(range(self._top)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        node = node.next[0]
+        if node is END or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            previous = chain[level]
+            previous.width[level] += node.width[level] - 1
+            previous.next[level] = node.next[level]
+        for level in range(len(node.next), self._top):
+            chain[level].width[level] -= 1
+        self._len -= 1
+
+    def pop(self):
+        """
+        Remove and return the largest key.
+        """
+        key = self[-1]
+        self.remove(key)
+        return key
+
+    def bisect_left(self, key, lo=0, hi=None):
+        """
+        Like bisect.bisect_left on a sorted list of the keys.
+        """
+        node = self._head
+        position = 0
+        for level in reversed(range(self._top)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        if hi is None:
+            hi = self._len
+        return max(lo, min(position, hi))
+
+    def _node(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("SortedKeys index out of range")
+        node = self._head
+        remaining = index + 1
+        for level in reversed(range(self._top)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def __getitem__(self, index):
+        return self._node(index).key
+
+    def slice(self, start, stop):
+        """
+        The keys from start up to stop, as a list.
+        """
+        start = max(start, 0)
+        stop = min(stop, self._len)
+        keys = []
+        if start >= stop:
+            return keys
+        node = self._node(start)
+        for _ in range(stop - start):
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not END:
+            yield node.key
+            node = node.next[0]
+
+    def __len__(self):
+        return self._len
+
+
+class UTXOStore:
+    """
+    A set of coins which also keeps an index of the coins sorted by amount,
+    so coins can be selected without scanning or re-summing the whole set.
+    Adding, removing and selecting each coin take O(log n).
+    """
+
+    def __init__(self, coins=()):
+        self._coins = {}  # {coin_name: coin}
+        self._total = 0
+        for coin in coins:
+            name = coin.name()
+            if name not in self._coins:
+                self._coins[name] = coin
+                self._total += coin.amount
+        self._keys = SortedKeys((coin.amount, name) for name, coin in self._coins.items())
+
+    def add(self, coin):
+        name = coin.name()
+        if name in self._coins:
+            return
+        self._coins[name] = coin
+        self._total += coin.amount
+        self._keys.add((coin.amount, name))
+
+    def remove(self, coin):
+        name = coin.name()
+        if name not in self._coins:
+            raise KeyError(coin)
+        del self._coins[name]
+        self._total -= coin.amount
+        self._keys.remove((coin.amount, name))
+
+    def discard(self, coin):
+        if coin in self:
+            self.remove(coin)
+
+    def pop(self):
+        if not self._keys:
+            raise KeyError("pop from an empty UTXOStore")
+        amount, name = self._keys.pop()
+        self._total -= amount
+        return self._coins.pop(name)
+
+    def copy(self):
+        return UTXOStore(self._coins.values())
+
+    def coin_for_name(self, name):
+        return self._coins.get(name)
+
+    def total(self):
+        return self._total
+
+    def coins_by_amount(self):
+        """
+        Return the coins from smallest to largest.
+        """
+        return [self._coins[name] for _, name in self._keys]
+
+    def smallest_spendable(self, count):
+        """
+        Return up to count of the smallest coins with a non-zero amount.
+        """
+        lowest = first_spendable_index(self._keys)
+        return [self._coins[name] for _, name in self._keys.slice(lowest, lowest + count)]
+
+    def select(self, amount, strategy=FEWEST_INPUTS):
+        """
+        Pick coins adding up to at least amount using the named strategy,
+        remove them from the store and return them as a list. Falls back to
+        FEWEST_INPUTS if the strategy finds nothing, and returns None if the
+        store can't cover the amount.
+        """
+        if amount > self._total:
+            return None
+        keys = STRATEGIES[strategy](self._keys, amount)
+        if keys is None and strategy != FEWEST_INPUTS:
+            keys = select_fewest_inputs(self._keys, amount)
+        if keys is None:
+            return None
+        coins = [self._coins[name] for _, name in keys]
+        for coin in coins:
+            self.remove(coin)
+        return coins
+
+    def __contains__(self, coin):
+        return coin.name() in self._coins
+
+    def __iter__(self):
+        return iter(list(self._coins.values()))
+
+    def __len__(self):
+        return len(self._coins)
+
+    def __repr__(self):
+        return "<%s: %d coins, %d total>" % (self.__class__.__name__, len(self), self._total)
+
+
+def first_spendable_index(keys):
+    """
+    Zero-value coins can't fund anything, so selection skips them.
+    """
+    return keys.bisect_left((1,))
+
+
+def select_largest_first(keys, amount):
+    """
+    Take coins from the largest down until the amount is covered.
+    """
+    selected = []
+    total = 0
+    index = len(keys)
+    lowest = first_spendable_index(keys)
+    while total < amount and index > lowest:
+        index -= 1
+        selected.append(keys[index])
+        total += keys[index][0]
+    if total < amount:
+        return None
+    return selected
+
+
+def select_fewest_inputs(keys, amount):
+    """
+    Take the smallest single coin that covers what's left of the amount,
+    otherwise take the largest coin and try again.
+    """
+    selected = []
+    remaining = amount
+    end = len(keys)
+    lowest = first_spendable_index(keys)
+    while remaining > 0:
+        if end <= lowest:
+            return None
+        index = keys.bisect_left((remaining,), lowest, end)
+        if index < end:
+            selected.append(keys[index])
+            return selected
+        end -= 1
+        selected.append(keys[end])
+        remaining -= keys[end][0]
+    return selected
+
+
+def select_branch_and_bound(keys, amount, max_tries=BNB_MAX_TRIES):
+    """
+    Search for a set of coins adding up to exactly amount, so the spend
+    needs no change output. Returns None if no exact match is found
+    within max_tries branches.
+    """
+    if amount <= 0:
+        return []
+    lowest = first_spendable_index(keys)
+    candidates = keys.slice(lowest, keys.bisect_left((amount + 1,)))
+    candidates.reverse()
+    # remaining[i] is the sum of candidates[i:]
+    remaining = [0] * (len(candidates) + 1)
+    for index in reversed(range(len(candidates))):
+        remaining[index] = remaining[index + 1] + candidates[index][0]
+    if remaining[0] < amount:
+        return None
+
+    selected = []  # indices into candidates, in increasing order
+    tries = 0
+    # each stack entry is (index, total before index, include candidate at index)
+    stack = [(0, 0, False), (0, 0, True)]
+    while stack and tries < max_tries:
+        tries += 1
+        index, total, include = stack.pop()
+        while selected and selected[-1] >= index:
+            selected.pop()
+        if include:
+            total += candidates[index][0]
+            selected.append(index)
+        if total == amount:
+            return [candidates[_] for _ in selected]
+        index += 1
+        if total > amount or index >= len(candidates) or total + remaining[index] < amount:
+            continue
+        stack.append((index, total, False))
+        stack.append((index, total, True))
+    return None
+
+
+STRATEGIES = {
+    LARGEST_FIRST: select_largest_first,
+    BRANCH_AND_BOUND: select_branch_and_bound,
+    FEWEST_INPUTS: select_fewest_inputs,
+}
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
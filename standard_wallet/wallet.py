@@ -1,6 +1,7 @@
 import clvm
+import itertools
 from os import urandom
-from chiasim.hashable import Program, ProgramHash, CoinSolution, SpendBundle, BLSSignature, Coin
+from chiasim.hashable import Program, ProgramHash, CoinSolution, SpendBundle, BLSSignature, BLSPublicKey, Coin
 from chiasim.hashable.CoinSolution import CoinSolutionList
 from chiasim.validation.Conditions import (
     conditions_by_opcode, make_create_coin_condition, make_assert_my_coin_id_condition, make_assert_min_time_condition, make_assert_coin_consumed_condition
@@ -9,36 +10,132 @@ from chiasim.validation.consensus import (
     conditions_for_solution, hash_key_pairs_for_conditions_dict
 )
 
-from utilities.BLSHDKey import BLSPrivateHDKey
+from utilities.BLSHDKey import BLSPrivateHDKey, unpack_keys
+from utilities.coin_cache import CoinCache
+from utilities.signing import SigningEngine, spend_bundle_for_signatures
 
-from puzzles.p2_delegated_puzzle import puzzle_for_pk
+from puzzles.p2_delegated_puzzle import puzzle_for_pk, puzzle_hash_for_pk
 from puzzles.p2_conditions import puzzle_for_conditions
 
+from standard_wallet.key_index import KeyIndex
+from standard_wallet.pending_spends import PendingSpends, transaction_id
+from standard_wallet.puzzle_hash_filter import PuzzleHashFilter
+from standard_wallet.seen_coins import SeenCoins
+from standard_wallet.utxo_store import UTXOStore, FEWEST_INPUTS
+
+
+# CREATE_COIN conditions per spend in a batch payment, which keeps the cost
+# of running any one solution bounded
+MAX_OUTPUTS_PER_SPEND = 100
+
+# a restore keeps deriving addresses until this many past the last one
+# used have turned up nothing
+RESTORE_GAP_LIMIT = 100
+
 
 class Wallet:
     seed = b'seed'
-    next_address = 0
-    pubkey_num_lookup = {}
 
     def __init__(self):
+        self.next_address = 0
         self.current_balance = 0
         self.my_utxos = set()
-        self.seed = urandom(1024)
-        self.extended_secret_key = BLSPrivateHDKey.from_seed(self.seed)
+        self.set_seed(urandom(1024))
         # self.contacts = {}  # {'name': (puzzlegenerator, last, extradata)}
         self.generator_lookups = {}  # {generator_hash: generator}
         self.name = "MyChiaWallet"
-        self.temp_utxos = set()
+        self.temp_utxos = UTXOStore()
         self.temp_balance = 0
-        self.all_additions = {}
-        self.all_deletions = {}
+        self.coin_selection = FEWEST_INPUTS
+        # give this an executor to sign large transactions in parallel
+        self.signing_engine = SigningEngine()
+        self.all_additions = SeenCoins()
+        self.all_deletions = SeenCoins()
+        # recent additions, so their removals can be resolved locally
+        self.coin_cache = CoinCache()
+        # transactions built but not yet confirmed
+        self.pending_spends = PendingSpends()
+        # a WalletHost sharing one chain follower between wallets, if any
+        self.router = None
+        # what notify lets through, see refresh_watch_filter
+        self.watch_filter = PuzzleHashFilter()
+        self.watch_keys = {}  # {group: state the group was built from}
+
+    def set_seed(self, seed):
+        self.seed = seed
+        self.extended_secret_key = BLSPrivateHDKey.from_seed(self.seed)
+        self.puzzle_hash_lookup = KeyIndex()  # {puzzle_hash: (child_index, pubkey)}
+
+    # Subclasses return whatever else they need restored by WalletStore.load
+    def get_extra_state(self):
+        return {}
+
+    def set_extra_state(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
 
     def get_next_public_key(self):
         pubkey = self.extended_secret_key.public_child(self.next_address)
-        self.pubkey_num_lookup[bytes(pubkey)] = self.next_address
+        puzzle_hash = puzzle_hash_for_pk(bytes(pubkey))
+        self.puzzle_hash_lookup.add(self.next_address, pubkey, puzzle_hash)
+        self.watch(puzzle_hash)
         self.next_address = self.next_address + 1
         return pubkey
 
+    # Derive children [start, start + count) and add them to the lookups
+    # without handing them out, returning their puzzle hashes. The executor,
+    # if any, derives the keys in parallel.
+    def derive_addresses(self, start, count, executor=None):
+        blob = self.extended_secret_key.derive_public_range(start, count, executor)
+        puzzle_hashes = []
+        for child, pubkey in enumerate(unpack_keys(blob), start):
+            puzzle_hash = puzzle_hash_for_pk(pubkey)
+            self.puzzle_hash_lookup.add(child, pubkey, puzzle_hash)
+            self.watch(puzzle_hash)
+            puzzle_hashes.append(puzzle_hash)
+        return puzzle_hashes
+
+    # The puzzle hashes whose coins this wallet needs to be notified of, or
+    # None if it can't tell and has to see every block
+    def watched_puzzle_hashes(self):
+        return self.puzzle_hash_lookup.keys()
+
+    # Called with every puzzle hash the wallet starts owning
+    def watch(self, puzzle_hash):
+        if self.router is not None:
+            self.router.route(puzzle_hash, self)
+
+    def restore(self, blocks, gap_limit=RESTORE_GAP_LIMIT, executor=None):
+        """
+        Rediscover the coins of this wallet's seed from blocks, which have
+        additions and removals and come oldest first, e.g. from
+        ChainFollower.blocks_between. See restore_block.
+        """
+        for block in blocks:
+            self.restore_block(block.additions, block.removals, gap_limit, executor)
+
+    def restore_block(self, additions, deletions, gap_limit=RESTORE_GAP_LIMIT, executor=None):
+        """
+        Notify the wallet of one block of a restore, first deriving
+        addresses in batches so there are always gap_limit of them past the
+        highest one seen in use. Only coins within the gap are recognised,
+        so memory grows with the wallet rather than the chain.
+        """
+        lookup = self.puzzle_hash_lookup
+        while True:
+            derived = len(lookup)
+            if self.next_address + gap_limit > derived:
+                self.derive_addresses(derived, self.next_address + gap_limit - derived, executor)
+            # a coin found in use may put more of the block within the gap
+            next_address = self.next_address
+            for coin in additions:
+                child = lookup.child_for_puzzle_hash(coin.puzzle_hash)
+                if child is not None and child >= self.next_address:
+                    self.next_address = child + 1
+            if self.next_address == next_address:
+                break
+        return self.notify(additions, deletions)
+
     # def add_contact(self, name, puzzlegenerator, last, extradata):
     #    if name in self.contacts:
     #        return None
@@ -49,43 +146,132 @@ class Wallet:
         self.name = name
 
     def can_generate_puzzle_hash(self, hash):
-        return any(map(lambda child: hash == ProgramHash(puzzle_for_pk(
-            bytes(self.extended_secret_key.public_child(child)))),
-            reversed(range(self.next_address))))
+        return hash in self.puzzle_hash_lookup
 
     def get_keys(self, hash):
-        for child in range(self.next_address):
-            pubkey = self.extended_secret_key.public_child(child)
-            if hash == ProgramHash(puzzle_for_pk(bytes(pubkey))):
-                return (pubkey, self.extended_secret_key.private_child(child))
+        if hash not in self.puzzle_hash_lookup:
+            return None
+        child, pubkey = self.puzzle_hash_lookup[hash]
+        return (pubkey, self.extended_secret_key.private_child(child))
+
+    # Bring watch_filter up to date with the derived puzzle hashes, which
+    # are only ever appended to. Subclasses add the puzzle hashes that
+    # depend on their own state with watch_group and watch_children.
+    def refresh_watch_filter(self):
+        lookup = self.puzzle_hash_lookup
+        old_lookup, watched = self.watch_keys.get("standard", (None, 0))
+        if old_lookup is not lookup:
+            # set_seed started a new index
+            self.watch_filter.discard("standard")
+            watched = 0
+        if len(lookup) > watched:
+            self.watch_filter.add("standard", itertools.islice(lookup.keys(), watched, None))
+        self.watch_keys["standard"] = (lookup, len(lookup))
+
+    # Keep group made of puzzle_hashes_f() and parent_ids_f(), only calling
+    # them when key changes
+    def watch_group(self, group, key, puzzle_hashes_f, parent_ids_f=None):
+        if group in self.watch_keys and self.watch_keys[group] == key:
+            return
+        parent_ids = () if parent_ids_f is None else parent_ids_f()
+        self.watch_filter.replace(group, puzzle_hashes_f(), parent_ids)
+        self.watch_keys[group] = key
+
+    # Keep group made of puzzle_hash_for_child(child) for every address
+    # handed out, rebuilt when key changes and extended as addresses are
+    # handed out. A key of None leaves the group empty.
+    def watch_children(self, group, key, puzzle_hash_for_child):
+        old_key, watched = self.watch_keys.get(group, (None, 0))
+        if key != old_key:
+            self.watch_filter.discard(group)
+            watched = 0
+        if key is not None and self.next_address > watched:
+            self.watch_filter.add(group, [puzzle_hash_for_child(child)
+                                          for child in range(watched, self.next_address)])
+            watched = self.next_address
+        self.watch_keys[group] = (key, watched)
+
+    # Drop the coins of a block which can't be this wallet's, so the exact
+    # checks here and in subclasses only see a handful of candidates
+    def filter_block(self, additions, deletions):
+        self.refresh_watch_filter()
+        return self.watch_filter.select(additions), self.watch_filter.select(deletions)
 
     def notify(self, additions, deletions):
+        additions, deletions = self.filter_block(additions, deletions)
+        self.coin_cache.add_coins(additions)
+        added = []
+        removed = []
         for coin in additions:
             if coin.name() in self.all_additions:
                 continue
-            self.all_additions[coin.name()] = coin
+            self.all_additions.add(coin.name())
             if self.can_generate_puzzle_hash(coin.puzzle_hash):
                 self.current_balance += coin.amount
                 self.my_utxos.add(coin)
+                added.append(coin)
         for coin in deletions:
             if coin.name() in self.all_deletions:
                 continue
-            self.all_deletions[coin.name()] = coin
+            self.all_deletions.add(coin.name())
             if coin in self.my_utxos:
                 self.my_utxos.remove(coin)
                 self.current_balance -= coin.amount
+                removed.append(coin)
+        self.all_additions.next_block()
+        self.all_deletions.next_block()
+
+        self.pending_spends.reconcile(deletions)
+        self.apply_to_temp_utxos(added, removed)
 
-        self.temp_utxos = self.my_utxos.copy()
-        self.temp_balance = self.current_balance
+    # The coins available to spend: the confirmed ones less those spent by
+    # transactions still pending, plus the change those transactions create.
+    # This rebuilds temp_utxos, for when my_utxos is replaced wholesale.
+    def update_temp_utxos(self):
+        self.pending_spends.drain()
+        reserved = self.pending_spends.reserved_names()
+        coins = [coin for coin in self.my_utxos if coin.name() not in reserved]
+        coins.extend(coin for coin in self.pending_spends.pending_change() if coin.name() not in reserved)
+        self.temp_utxos = UTXOStore(coins)
+        self.temp_balance = self.temp_utxos.total()
+
+    # Keep temp_utxos as update_temp_utxos would leave it, given the coins
+    # added to and removed from my_utxos and the pending transactions
+    # confirmed or released since the last update, in time proportional to
+    # those alone
+    def apply_to_temp_utxos(self, added=(), removed=()):
+        pending = self.pending_spends
+        reserved = pending.reserved_names()
+        for coin in removed:
+            self.temp_utxos.discard(coin)
+        for coin in added:
+            if coin.name() not in reserved:
+                self.temp_utxos.add(coin)
+        # inputs of a dropped transaction are spendable again unless spent
+        # meanwhile, and its change only once it's been seen in a block
+        for spend in pending.drain():
+            for coin in spend.inputs:
+                if coin.name() not in reserved and (coin in self.my_utxos or pending.is_pending_change(coin)):
+                    self.temp_utxos.add(coin)
+            for coin in spend.change:
+                if coin not in self.my_utxos:
+                    self.temp_utxos.discard(coin)
+        self.temp_balance = self.temp_utxos.total()
+
+    # Forget a transaction that won't be confirmed, e.g. because pushing it
+    # failed, so its coins can be selected again
+    def release_transaction(self, spend_bundle):
+        coins = [coin_solution.coin for coin_solution in spend_bundle.coin_solutions]
+        self.pending_spends.release(transaction_id(coins))
+        self.apply_to_temp_utxos()
 
     def select_coins(self, amount):
         if amount > self.temp_balance:
             return None
-        used_utxos = set()
-        while sum(map(lambda coin: coin.amount, used_utxos)) < amount:
-            temp = self.temp_utxos.pop()
-            used_utxos.add(temp)
-            self.temp_balance -= temp.amount
+        used_utxos = self.temp_utxos.select(amount, self.coin_selection)
+        if used_utxos is None:
+            return None
+        self.temp_balance -= sum(coin.amount for coin in used_utxos)
         return used_utxos
 
     def puzzle_for_pk(self, pubkey):
@@ -97,12 +283,15 @@ class Wallet:
         return puzzle
 
     def get_new_puzzlehash(self):
-        puzzle = self.get_new_puzzle()
-        puzzlehash = ProgramHash(puzzle)
+        pubkey = bytes(self.get_next_public_key())
+        puzzlehash = puzzle_hash_for_pk(pubkey)
         return puzzlehash
 
     def sign(self, value, pubkey):
-        privatekey = self.extended_secret_key.private_child(self.pubkey_num_lookup[pubkey])
+        child = self.puzzle_hash_lookup.child_for_pubkey(pubkey)
+        if child is None:
+            raise ValueError("unknown pubkey %s" % bytes(pubkey).hex())
+        privatekey = self.extended_secret_key.private_child(child)
         return privatekey.sign(value)
 
     def make_solution(self, primaries=[], min_time=0, me={}, consumed=[]):
@@ -122,10 +311,13 @@ class Wallet:
         if self.temp_balance < amount:
             return None  # TODO: Should we throw a proper error here, or just return None?
         utxos = self.select_coins(amount)
+        if utxos is None:
+            return None
         spends = []
         output_created = False
         spend_value = sum([coin.amount for coin in utxos])
         change = spend_value - amount
+        change_coins = []
         for coin in utxos:
             puzzle_hash = coin.puzzle_hash
 
@@ -138,32 +330,80 @@ class Wallet:
                     primaries.append(
                         {'puzzlehash': changepuzzlehash, 'amount': change})
                     # add change coin into temp_utxo set
-                    self.temp_utxos.add(Coin(coin, changepuzzlehash, change))
+                    change_coins.append(Coin(coin, changepuzzlehash, change))
+                    self.temp_utxos.add(change_coins[-1])
                     self.temp_balance += change
                 solution = self.make_solution(primaries=primaries)
                 output_created = True
             else:
                 solution = self.make_solution(consumed=[coin.name()])
             spends.append((puzzle, CoinSolution(coin, solution)))
+        self.pending_spends.add(utxos, change_coins)
+        return spends
+
+    # payments is a list or iterator of (puzzlehash, amount). A puzzlehash
+    # may also be a function of the name of the coin whose spend creates
+    # the output, for puzzles which commit to their parent, like RL ones
+    def generate_unsigned_batch_transaction(self, payments, max_outputs_per_spend=MAX_OUTPUTS_PER_SPEND):
+        primaries = [{'puzzlehash': puzzlehash, 'amount': amount} for puzzlehash, amount in payments]
+        amount = sum(_['amount'] for _ in primaries)
+        if not primaries or self.temp_balance < amount:
+            return None
+        utxos = self.select_coins(amount)
+        if utxos is None:
+            return None
+        # take small extra coins to carry outputs rather than overfill a
+        # spend, if there are any, never zero-value ones
+        spend_count = -(-(len(primaries) + 1) // max_outputs_per_spend)
+        for coin in self.temp_utxos.smallest_spendable(max(0, spend_count - len(utxos))):
+            self.temp_utxos.remove(coin)
+            self.temp_balance -= coin.amount
+            utxos.append(coin)
+        change = sum(coin.amount for coin in utxos) - amount
+        if change > 0:
+            changepuzzlehash = self.get_new_puzzlehash()
+            primaries.append({'puzzlehash': changepuzzlehash, 'amount': change})
+        # spread the outputs evenly, going over budget only if there are
+        # not enough coins to carry them
+        spend_count = min(-(-len(primaries) // max_outputs_per_spend), len(utxos))
+        if spend_count == 0:
+            return None
+        per_spend = -(-len(primaries) // spend_count)
+        change_coins = []
+        if change > 0:
+            # add change coin into temp_utxo set, its parent is whichever
+            # coin carries the last output
+            parent = utxos[(len(primaries) - 1) // per_spend]
+            change_coins.append(Coin(parent, changepuzzlehash, change))
+            self.temp_utxos.add(change_coins[-1])
+            self.temp_balance += change
+        self.pending_spends.add(utxos, change_coins)
+        spends = []
+        for index, coin in enumerate(utxos):
+            pubkey, secretkey = self.get_keys(coin.puzzle_hash)
+            puzzle = puzzle_for_pk(pubkey)
+            chunk = [dict(_, puzzlehash=_['puzzlehash'](coin.name())) if callable(_['puzzlehash']) else _
+                     for _ in primaries[index * per_spend:(index + 1) * per_spend]]
+            if chunk:
+                solution = self.make_solution(primaries=chunk)
+            else:
+                solution = self.make_solution(consumed=[coin.name()])
+            spends.append((puzzle, CoinSolution(coin, solution)))
         return spends
 
+    def generate_signed_batch_transaction(self, payments, max_outputs_per_spend=MAX_OUTPUTS_PER_SPEND):
+        transaction = self.generate_unsigned_batch_transaction(payments, max_outputs_per_spend)
+        if transaction is None:
+            return None
+        return self.sign_transaction(transaction)
+
     def sign_transaction(self, spends: (Program, [CoinSolution])):
-        sigs = []
+        items = []
         for puzzle, solution in spends:
             pubkey, secretkey = self.get_keys(solution.coin.puzzle_hash)
-            code_ = [puzzle, solution.solution]
-            sexp = clvm.to_sexp_f(code_)
-            conditions_dict = conditions_by_opcode(
-                conditions_for_solution(sexp))
-            for _ in hash_key_pairs_for_conditions_dict(conditions_dict):
-                signature = secretkey.sign(_.message_hash)
-                sigs.append(signature)
-        aggsig = BLSSignature.aggregate(sigs)
-        solution_list = CoinSolutionList(
-            [CoinSolution(coin_solution.coin, clvm.to_sexp_f([puzzle, coin_solution.solution])) for
-             (puzzle, coin_solution) in spends])
-        spend_bundle = SpendBundle(solution_list, aggsig)
-        return spend_bundle
+            items.append((secretkey, puzzle, solution.solution))
+        sigs = self.signing_engine.sign_solutions(items)
+        return spend_bundle_for_signatures(spends, sigs)
 
     def generate_signed_transaction(self, amount, newpuzzlehash):
         transaction = self.generate_unsigned_transaction(amount, newpuzzlehash)
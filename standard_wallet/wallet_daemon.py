@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import pathlib
+
+from aiter import map_aiter
+
+from chiasim.clients.ledger_sim import connect_to_ledger_sim
+from chiasim.hashable import ProgramHash
+from chiasim.remote.api_server import api_server
+from chiasim.remote.client import RemoteError, request_response_proxy
+from chiasim.utils.server import start_unix_server_aiter
+
+from standard_wallet.wallet import RESTORE_GAP_LIMIT, Wallet
+from standard_wallet.wallet_store import WalletStore
+from utilities.chain_follower import ChainFollower
+from utilities.instrumentation import enable_from_environment, wrap_remote
+
+
+log = logging.getLogger(__name__)
+
+# seconds between checks for a new tip
+SYNC_INTERVAL = 1.0
+
+# every result is made of plain cbor types, so nothing needs converting
+REMOTE_SIGNATURES = {}
+
+
+def check_amount(amount):
+    """
+    Amounts come from remote callers, so anything but a positive int is
+    refused before any coin is selected.
+    """
+    if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+        raise ValueError("invalid amount %r" % (amount,))
+    return amount
+
+
+class WalletAPI:
+    """
+    Serves one standard wallet over the chiasim.remote request/response
+    protocol, so `remote.send(puzzlehash=..., amount=...)` on a client
+    proxy calls do_send here.
+
+    The chain is followed by a background task started with
+    follow_chain. Requests never wait for it, except do_sync, which waits
+    for the wallet to catch up to the current tip.
+    """
+
+    def __init__(self, wallet, ledger_api, store=None, tip=None):
+        self.wallet = wallet
+        self.ledger_api = wrap_remote(ledger_api)
+        self.store = store
+        self.tip = tip
+        self.follower = ChainFollower(ledger_api, coin_cache=wallet.coin_cache)
+        self._sync_lock = asyncio.Lock()
+
+    def save(self):
+        # called after anything that derives a key, so an address handed out
+        # is never handed out again after a restart
+        if self.store is not None:
+            self.store.save(self.wallet, self.tip)
+
+    async def sync(self):
+        async with self._sync_lock:
+            r = await self.ledger_api.get_tip()
+            if r['tip_hash'] != self.tip:
+                last_known_header = r['genesis_hash'] if self.tip is None else self.tip
+                async for block in self.follower.blocks_between(last_known_header, r['tip_hash']):
+                    self.wallet.notify(block.additions, block.removals)
+                self.tip = r['tip_hash']
+            self.save()
+            return self.tip
+
+    async def restore(self, gap_limit=RESTORE_GAP_LIMIT, executor=None):
+        # rediscover the coins of the wallet's seed over the whole chain
+        async with self._sync_lock:
+            r = await self.ledger_api.get_tip()
+            async for block in self.follower.blocks_between(r['genesis_hash'], r['tip_hash']):
+                self.wallet.restore_block(block.additions, block.removals, gap_limit, executor)
+            self.tip = r['tip_hash']
+            self.save()
+            return self.tip
+
+    async def follow_chain(self, interval=SYNC_INTERVAL):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("sync failed")
+            await asyncio.sleep(interval)
+
+    async def push(self, spend_bundle):
+        # the change key stays derived even if the ledger refuses the spend
+        self.save()
+        if spend_bundle is None:
+            raise ValueError("insufficient funds")
+        try:
+            r = await self.ledger_api.push_tx(tx=spend_bundle)
+        except Exception:
+            self.wallet.release_transaction(spend_bundle)
+            raise
+        if isinstance(r, RemoteError):
+            self.wallet.release_transaction(spend_bundle)
+            raise r
+        return dict(ok=True)
+
+    async def do_get_balance(self):
+        return dict(balance=self.wallet.current_balance, available=self.wallet.temp_balance)
+
+    async def do_get_new_puzzlehash(self):
+        puzzlehash = self.wallet.get_new_puzzlehash()
+        self.save()
+        return dict(puzzlehash=bytes(puzzlehash))
+
+    async def do_send(self, puzzlehash, amount):
+        amount = check_amount(amount)
+        spend_bundle = self.wallet.generate_signed_transaction(amount, ProgramHash(bytes(puzzlehash)))
+        return await self.push(spend_bundle)
+
+    async def do_send_batch(self, payments):
+        payments = [(ProgramHash(bytes(puzzlehash)), check_amount(amount)) for puzzlehash, amount in payments]
+        spend_bundle = self.wallet.generate_signed_batch_transaction(payments)
+        return await self.push(spend_bundle)
+
+    async def do_sync(self):
+        return dict(tip=bytes(await self.sync()))
+
+
+async def start_wallet_daemon(path, api, interval=SYNC_INTERVAL):
+    """
+    Serve api on the unix socket at path and start following the chain.
+    Returns the server task and the follower task.
+    """
+    server, aiter = await start_unix_server_aiter(path)
+    rws_aiter = map_aiter(lambda rw: dict(
+        reader=rw[0], writer=rw[1], server=server), aiter)
+    server_task = asyncio.ensure_future(api_server(rws_aiter, api))
+    follow_task = asyncio.ensure_future(api.follow_chain(interval))
+    return server_task, follow_task
+
+
+async def connect_to_wallet_daemon(path):
+    reader, writer = await asyncio.open_unix_connection(str(path))
+    return request_response_proxy(reader, writer, REMOTE_SIGNATURES)
+
+
+async def run_daemon(args):
+    ledger_api = await connect_to_ledger_sim(args.ledger_host, args.ledger_port)
+    wallet = Wallet()
+    store = None
+    loaded = None
+    tip = None
+    if args.db is not None:
+        store = WalletStore(args.db)
+        loaded = store.load(wallet)
+        if loaded is not None:
+            wallet, tip = loaded
+    api = WalletAPI(wallet, ledger_api, store, tip)
+    if args.restore is not None and loaded is None:
+        wallet.set_seed(bytes.fromhex(args.restore))
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            await api.restore(args.gap_limit, executor)
+    server_task, follow_task = await start_wallet_daemon(pathlib.Path(args.socket), api, args.interval)
+    print(f"wallet '{wallet.name}' serving on {args.socket}")
+    await server_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a standard wallet over a unix socket.")
+    parser.add_argument("socket", help="path of the unix socket to listen on")
+    parser.add_argument("--db", help="sqlite file to keep the wallet in between runs")
+    parser.add_argument("--ledger-host", default="localhost")
+    parser.add_argument("--ledger-port", type=int, default=9868)
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL,
+                        help="seconds between checks for new blocks")
+    parser.add_argument("--restore", metavar="SEED",
+                        help="hex seed of a wallet to restore, unless --db already holds one")
+    parser.add_argument("--gap-limit", type=int, default=RESTORE_GAP_LIMIT,
+                        help="unused addresses to look past when restoring")
+    args = parser.parse_args()
+    enable_from_environment()
+    asyncio.get_event_loop().run_until_complete(run_daemon(args))
+
+
+if __name__ == "__main__":
+    main()
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -0,0 +1,168 @@
+import asyncio
+import inspect
+import logging
+
+from chiasim.remote.client import RemoteError
+
+from utilities.chain_follower import ChainFollower
+from utilities.instrumentation import wrap_remote
+
+
+log = logging.getLogger(__name__)
+
+# seconds between checks for a new tip
+SYNC_INTERVAL = 1.0
+
+
+def notify_takes_index(wallet):
+    """
+    The rate limited and custody wallets are notified with the index of the
+    block as well as its additions and removals.
+    """
+    return "index" in inspect.signature(wallet.notify).parameters
+
+
+class WalletHost:
+    """
+    Runs many wallets in one process behind a single ledger connection.
+
+    Each block is fetched once. Its additions and removals are routed to
+    the wallets owning their puzzle hashes through one table, which wallets
+    keep current as they derive new addresses, and only the wallets a block
+    touches are notified, with just their own coins. Wallets that can't list
+    the puzzle hashes they care about, like the rate limited or atomic swap
+    ones, see every block in full. A wallet with transactions pending is
+    notified of every block too, with no coins if the block has none of
+    its own, so its pending transactions expire on time.
+
+    Spend bundles returned by notify, e.g. aggregations, are pushed.
+    """
+
+    def __init__(self, ledger_api, tip=None, tip_index=None):
+        self.ledger_api = wrap_remote(ledger_api)
+        self.follower = ChainFollower(ledger_api)
+        self.tip = tip
+        self.tip_index = tip_index
+        self.wallets = []
+        self.routes = {}  # {puzzle_hash: wallet}
+        self.unrouted = []  # wallets notified of every block
+        self._takes_index = {}  # {id(wallet): bool}
+        self._sync_lock = asyncio.Lock()
+
+    def add_wallet(self, wallet):
+        wallet.router = self
+        self.wallets.append(wallet)
+        self._takes_index[id(wallet)] = notify_takes_index(wallet)
+        puzzle_hashes = wallet.watched_puzzle_hashes()
+        if puzzle_hashes is None:
+            self.unrouted.append(wallet)
+        else:
+            for puzzle_hash in puzzle_hashes:
+                self.route(puzzle_hash, wallet)
+
+    def remove_wallet(self, wallet):
+        self.wallets.remove(wallet)
+        if wallet in self.unrouted:
+            self.unrouted.remove(wallet)
+        for puzzle_hash in [k for k, v in self.routes.items() if v is wallet]:
+            del self.routes[puzzle_hash]
+        del self._takes_index[id(wallet)]
+        wallet.router = None
+
+    def route(self, puzzle_hash, wallet):
+        self.routes[puzzle_hash] = wallet
+
+    def deltas_by_wallet(self, additions, removals):
+        """
+        Split the coins of a block by the wallet they belong to. Returns
+        {id(wallet): (wallet, additions, removals)} for the wallets to notify.
+        """
+        touched = {}
+
+        def deltas_for(wallet):
+            deltas = touched.get(id(wallet))
+            if deltas is None:
+                deltas = touched[id(wallet)] = (wallet, [], [])
+            return deltas
+
+        for coin in additions:
+            wallet = self.routes.get(coin.puzzle_hash)
+            if wallet is not None:
+                deltas_for(wallet)[1].append(coin)
+        for coin in removals:
+            wallet = self.routes.get(coin.puzzle_hash)
+            if wallet is not None:
+                deltas_for(wallet)[2].append(coin)
+        for wallet in self.unrouted:
+            touched[id(wallet)] = (wallet, additions, removals)
+        for wallet in self.wallets:
+            if len(wallet.pending_spends) and id(wallet) not in touched:
+                touched[id(wallet)] = (wallet, [], [])
+        return touched
+
+    def notify(self, additions, removals, index=None):
+        """
+        Notify the wallets touched by one block. Returns the spend bundles
+        they asked to have pushed.
+        """
+        spend_bundles = []
+        for wallet, wallet_additions, wallet_removals in self.deltas_by_wallet(additions, removals).values():
+            if self._takes_index[id(wallet)]:
+                r = wallet.notify(wallet_additions, wallet_removals, index)
+            else:
+                r = wallet.notify(wallet_additions, wallet_removals)
+            if r:
+                spend_bundles.extend((wallet, _) for _ in r)
+        return spend_bundles
+
+    async def push(self, wallet, spend_bundle):
+        try:
+            r = await self.ledger_api.push_tx(tx=spend_bundle)
+        except Exception:
+            log.exception("push from wallet '%s' failed", wallet.name)
+            wallet.release_transaction(spend_bundle)
+            return
+        if isinstance(r, RemoteError):
+            log.error("push from wallet '%s' failed: %s", wallet.name, r)
+            wallet.release_transaction(spend_bundle)
+
+    async def sync(self):
+        async with self._sync_lock:
+            r = await self.ledger_api.get_tip()
+            if r['tip_hash'] == self.tip:
+                return self.tip
+            last_known_header = r['genesis_hash'] if self.tip is None else self.tip
+            headers = await self.follower.headers_between(last_known_header, r['tip_hash'])
+            tip_index = int(r['tip_index'])
+            index = tip_index - len(headers)
+            async for block in self.follower.blocks_for_headers(headers):
+                index += 1
+                for wallet, spend_bundle in self.notify(block.additions, block.removals, index):
+                    await self.push(wallet, spend_bundle)
+            self.tip = r['tip_hash']
+            self.tip_index = tip_index
+            return self.tip
+
+    async def follow_chain(self, interval=SYNC_INTERVAL):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("sync failed")
+            await asyncio.sleep(interval)
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -1,13 +1,15 @@
 import asyncio
+import sys
 from utilities.decorations import print_leaf, divider, prompt, start_list, close_list, selectable, informative
 from utilities.puzzle_utilities import puzzlehash_from_string
-from chiasim.hashable import Coin, Header, HeaderHash
+from chiasim.hashable import HeaderHash
 from chiasim.clients.ledger_sim import connect_to_ledger_sim
-from chiasim.wallet.deltas import additions_for_body, removals_for_body
-from chiasim.hashable.Body import Body
 from binascii import hexlify
 from authorised_payees import ap_wallet_a_functions
 from standard_wallet.wallet import Wallet
+from standard_wallet.wallet_store import WalletStore
+from utilities.chain_follower import ChainFollower
+from utilities.instrumentation import enable_from_environment
 try:
     import qrcode
     from PIL import Image
@@ -138,16 +140,10 @@ async def initiate_ap(wallet, ledger_api):
 
 
 async def process_blocks(wallet, ledger_api, last_known_header, current_header_hash):
-    r = await ledger_api.hash_preimage(hash=current_header_hash)
-    header = Header.from_bytes(r)
-    body = Body.from_bytes(await ledger_api.hash_preimage(hash=header.body_hash))
-    if header.previous_hash != last_known_header:
-        await process_blocks(wallet, ledger_api, last_known_header, header.previous_hash)
-    print(f'processing block {HeaderHash(header)}')
-    additions = list(additions_for_body(body))
-    removals = removals_for_body(body)
-    removals = [Coin.from_bytes(await ledger_api.hash_preimage(hash=x)) for x in removals]
-    wallet.notify(additions, removals)
+    follower = ChainFollower(ledger_api, coin_cache=wallet.coin_cache)
+    async for block in follower.blocks_between(last_known_header, current_header_hash):
+        print(f'processing block {block.header_hash}')
+        wallet.notify(block.additions, block.removals)
 
 
 async def farm_block(wallet, ledger_api, last_known_header):
@@ -174,14 +170,47 @@ async def update_ledger(wallet, ledger_api, most_recent_header):
     return r['tip_hash']
 
 
-async def main_loop():
+async def handle_selection(selection, wallet, ledger_api, most_recent_header, store=None):
+    if selection == "1":
+        r = await make_payment(wallet, ledger_api)
+    elif selection == "2":
+        most_recent_header = await update_ledger(wallet, ledger_api, most_recent_header)
+    elif selection == "3":
+        most_recent_header = await farm_block(wallet, ledger_api, most_recent_header)
+    elif selection == "4":
+        print_my_details(wallet)
+    elif selection == "5":
+        set_name(wallet)
+    elif selection == "6":
+        await initiate_ap(wallet, ledger_api)
+    if qrcode:
+        if selection == "7":
+            make_QR(wallet)
+        elif selection == "8":
+            r = read_qr(wallet)
+            if r is not None:
+                await ledger_api.push_tx(tx=r)
+    # every option may have moved the wallet on, if only by an address
+    if store is not None:
+        store.save(wallet, most_recent_header)
+    return most_recent_header
+
+
+async def main_loop(db_path=None):
     ledger_api = await connect_to_ledger_sim("localhost", 9868)
     selection = ""
     wallet = Wallet()
+    store = None if db_path is None else WalletStore(db_path)
     print(divider)
     print_leaf()
     r = await ledger_api.get_tip()
     most_recent_header = r['genesis_hash']
+    loaded = None if store is None else store.load(wallet)
+    if loaded is not None:
+        wallet, tip = loaded
+        if tip is not None:
+            most_recent_header = tip
+        print(f"{informative} Loaded wallet '{wallet.name}' from {db_path}")
     while selection != "q":
         print(divider)
         view_funds(wallet)
@@ -200,30 +229,14 @@ async def main_loop():
         print(f"{selectable} q: Quit")
         print(close_list)
         selection = input(prompt)
-        if selection == "1":
-            r = await make_payment(wallet, ledger_api)
-        elif selection == "2":
-            most_recent_header = await update_ledger(wallet, ledger_api, most_recent_header)
-        elif selection == "3":
-            most_recent_header = await farm_block(wallet, ledger_api, most_recent_header)
-        elif selection == "4":
-            print_my_details(wallet)
-        elif selection == "5":
-            set_name(wallet)
-        elif selection == "6":
-            await initiate_ap(wallet, ledger_api)
-        if qrcode:
-            if selection == "7":
-                make_QR(wallet)
-            elif selection == "8":
-                r = read_qr(wallet)
-                if r is not None:
-                    await ledger_api.push_tx(tx=r)
+        most_recent_header = await handle_selection(selection, wallet, ledger_api, most_recent_header, store)
 
 
 def main():
+    enable_from_environment()
     run = asyncio.get_event_loop().run_until_complete
-    run(main_loop())
+    # an optional path to an sqlite file keeps the wallet between runs
+    run(main_loop(sys.argv[1] if len(sys.argv) > 1 else None))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import sqlite3
+
+import cbor
+
+from chiasim.atoms import hexbytes
+from chiasim.hashable import BLSPublicKey, BLSSignature, Coin, ProgramHash
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB);
+CREATE TABLE IF NOT EXISTS utxos (name BLOB PRIMARY KEY, coin BLOB);
+CREATE TABLE IF NOT EXISTS puzzle_hashes (puzzle_hash BLOB PRIMARY KEY, child INTEGER, pubkey BLOB);
+"""
+
+TAG = "__type__"
+
+# streamable types that are stored as their serialized bytes, checked in order
+# since some of them are bytes subclasses
+BLOB_TYPES = [
+    ("coin", Coin, Coin.from_bytes),
+    ("signature", BLSSignature, BLSSignature.from_bytes),
+    ("pubkey", BLSPublicKey, BLSPublicKey.from_bytes),
+    ("puzzle_hash", ProgramHash, ProgramHash),
+    ("hexbytes", hexbytes, hexbytes),
+]
+
+
+def encode_value(v):
+    """
+    Turn a piece of wallet state into something cbor can store, tagging
+    the types which need to come back as something other than bytes,
+    lists or dicts.
+    """
+    for tag, the_type, from_bytes in BLOB_TYPES:
+        if isinstance(v, the_type):
+            return {TAG: tag, "blob": bytes(v)}
+    if isinstance(v, (set, frozenset)):
+        return {TAG: "set", "items": [encode_value(_) for _ in v]}
+    if isinstance(v, tuple):
+        return {TAG: "tuple", "items": [encode_value(_) for _ in v]}
+    if isinstance(v, list):
+        return [encode_value(_) for _ in v]
+    if isinstance(v, dict):
+        return {TAG: "dict", "items": [[encode_value(key), encode_value(value)] for key, value in v.items()]}
+    return v
+
+
+def decode_value(v):
+    """
+    Undo encode_value.
+    """
+    if isinstance(v, list):
+        return [decode_value(_) for _ in v]
+    if not isinstance(v, dict):
+        return v
+    tag = v[TAG]
+    for blob_tag, the_type, from_bytes in BLOB_TYPES:
+        if tag == blob_tag:
+            return from_bytes(v["blob"])
+    items = [decode_value(_) for _ in v["items"]]
+    if tag == "set":
+        return set(items)
+    if tag == "tuple":
+        return tuple(items)
+    if tag == "dict":
+        return {key: value for key, value in items}
+    raise ValueError("unknown tag %s" % tag)
+
+
+class WalletStore:
+    """
+    Keeps a wallet's seed, derived keys, unspent coins and the last block it
+    processed in an sqlite database so that it can be reloaded without
+    replaying the chain.
+
+    Subclasses of Wallet put anything else they need into
+    get_extra_state/set_extra_state, which is stored alongside.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(str(path))
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def get(self, key, default=None):
+        row = self._db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        return decode_value(cbor.loads(row[0]))
+
+    def set(self, key, value):
+        self._db.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+            (key, cbor.dumps(encode_value(value))))
+
+    def tip(self):
+        """
+        Return the hash of the last block the stored wallet processed.
+        """
+        return self.get("tip")
+
+    def has_wallet(self):
+        return self.get("seed") is not None
+
+    def save(self, wallet, tip=None):
+        """
+        Write a snapshot of the wallet's confirmed state. Derived keys are
+        only ever appended, so only the ones added since the last save are
+        written.
+        """
+        with self._db:
+            self.set("seed", wallet.seed)
+            self.set("name", wallet.name)
+            self.set("next_address", wallet.next_address)
+            self.set("current_balance", wallet.current_balance)
+            self.set("extra", wallet.get_extra_state())
+            if tip is not None:
+                self.set("tip", tip)
+            self._db.execute("DELETE FROM utxos")
+            self._db.executemany(
+                "INSERT INTO utxos (name, coin) VALUES (?, ?)",
+                ((bytes(coin.name()), bytes(coin)) for coin in wallet.my_utxos))
+            row = self._db.execute("SELECT MAX(child) FROM puzzle_hashes").fetchone()
+            saved = -1 if row[0] is None else row[0]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO puzzle_hashes (puzzle_hash, child, pubkey) VALUES (?, ?, ?)",
+                ((bytes(puzzle_hash), child, bytes(pubkey))
+                 for puzzle_hash, (child, pubkey) in wallet.puzzle_hash_lookup.items()
+                 if child > saved))
+
+    def load(self, wallet):
+        """
+        Restore the stored state into wallet and return (wallet, tip), tip
+        being None if the wallet was saved without one. Return None and
+        leave wallet alone if nothing was saved yet.
+        """
+        seed = self.get("seed")
+        if seed is None:
+            return None
+        wallet.set_seed(seed)
+        wallet.name = self.get("name", wallet.name)
+        wallet.next_address = self.get("next_address")
+        for puzzle_hash, child, pubkey in self._db.execute(
+                "SELECT puzzle_hash, child, pubkey FROM puzzle_hashes"):
+            wallet.puzzle_hash_lookup.add(child, pubkey, ProgramHash(puzzle_hash))
+        coins = [Coin.from_bytes(blob) for (blob,) in self._db.execute("SELECT coin FROM utxos")]
+        wallet.my_utxos = set(coins)
+        wallet.current_balance = self.get("current_balance")
+        wallet.update_temp_utxos()
+        wallet.set_extra_state(self.get("extra", {}))
+        return wallet, self.tip()
+
+    def close(self):
+        self._db.close()
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
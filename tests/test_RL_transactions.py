@@ -1,9 +1,11 @@
 import asyncio
 import pathlib
 import tempfile
+import pytest
 from aiter import map_aiter
 from standard_wallet.wallet import Wallet
-from rate_limit.rl_wallet import RLWallet
+from rate_limit.rl_wallet import RLWallet, rl_puzzle_source
+from rate_limit.rl_fleet import RLFleet
 from chiasim.utils.log import init_logging
 from chiasim.remote.api_server import api_server
 from chiasim.remote.client import request_response_proxy
@@ -14,6 +16,8 @@ from chiasim.storage import RAM_DB
 from chiasim.utils.server import start_unix_server_aiter
 from chiasim.wallet.deltas import additions_for_body, removals_for_body
 from chiasim.atoms import hexbytes
+from clvm_tools import binutils
+from chiasim.hashable import Program
 
 
 async def proxy_for_unix_connection(path):
@@ -364,6 +368,43 @@ def test_rl_aggregation():
     assert wallet_c.current_balance == 0
 
 
+def test_rl_batch_aggregation():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallet_a = RLWallet()
+    wallet_b = RLWallet()
+    wallets = [wallet_a, wallet_b]
+
+    limit = 10
+    interval = 1
+    commit_and_notify(remote, wallets, wallet_a)
+
+    origin_coin = wallet_a.my_utxos.copy().pop()
+    wallet_b_pk = bytes(wallet_b.get_next_public_key())
+    wallet_b.set_origin(origin_coin)
+    wallet_b.limit = limit
+    wallet_b.interval = interval
+    clawback_pk = hexbytes(bytes(wallet_a.get_next_public_key()))
+    wallet_b.rl_clawback_pk = clawback_pk
+    rl_puzzlehash = wallet_b.rl_puzzle_hash_for_pk(wallet_b_pk, limit, interval, origin_coin.name(), clawback_pk)
+
+    spend_bundle = wallet_a.generate_signed_transaction_with_origin(5000, rl_puzzlehash, origin_coin.name())
+    _ = run(remote.push_tx(tx=spend_bundle))
+    commit_and_notify(remote, wallets, Wallet())
+    assert wallet_b.current_rl_balance == 5000
+
+    # several top ups in one block are folded in by one bundle
+    agg_puzzlehash = wallet_b.rl_get_aggregation_puzzlehash(rl_puzzlehash)
+    payments = [(agg_puzzlehash, amount) for amount in (1000, 2000, 3000)]
+    spend_bundle = wallet_a.generate_signed_batch_transaction(payments)
+    _ = run(remote.push_tx(tx=spend_bundle))
+    commit_and_notify(remote, wallets, Wallet())
+    commit_and_notify(remote, wallets, Wallet())
+    assert wallet_b.current_rl_balance == 11000
+    assert wallet_b.rl_coin.amount == 11000
+    assert not wallet_b.aggregation_coins
+
+
 def test_rl_spend_all():
     remote = make_client_server()
     run = asyncio.get_event_loop().run_until_complete
@@ -421,6 +462,82 @@ def test_rl_spend_all():
     assert wallet_c.current_balance == 300
 
 
+def test_rl_puzzle_template():
+    wallet = RLWallet()
+    pubkey = bytes(wallet.get_next_public_key())
+    clawback_pk = hexbytes(bytes(RLWallet().get_next_public_key()))
+    origin_id = hexbytes(bytes(range(32)))
+    puzzle = Program(binutils.assemble(rl_puzzle_source((10, 3), pubkey, origin_id, clawback_pk)))
+    assert bytes(wallet.rl_puzzle_for_pk(pubkey, 10, 3, origin_id, clawback_pk)) == bytes(puzzle)
+    assert wallet.rl_puzzle_hash_for_pk(pubkey, 10, 3, origin_id, clawback_pk) == ProgramHash(puzzle)
+    # hex strings, as the runnable passes them, give the same puzzle
+    assert wallet.rl_puzzle_hash_for_pk(pubkey, "10", 3, origin_id.hex(), clawback_pk.hex()) == ProgramHash(puzzle)
+
+
+def test_rl_puzzle_hash_index():
+    wallet = RLWallet()
+    pubkeys = [bytes(wallet.get_next_public_key()) for _ in range(3)]
+    clawback_pk = hexbytes(bytes(RLWallet().get_next_public_key()))
+    origin_id = hexbytes(bytes(range(32)))
+    assert wallet.rl_puzzle_hash_index() == {}
+    wallet.set_origin(dict(name=origin_id))
+    wallet.limit = 10
+    wallet.interval = 3
+    wallet.rl_clawback_pk = clawback_pk
+    puzzle_hash = wallet.rl_puzzle_hash_for_pk(pubkeys[2], 10, 3, origin_id, clawback_pk)
+    assert wallet.can_generate_rl_puzzle_hash(puzzle_hash)
+    assert bytes(wallet.get_keys(puzzle_hash)[0]) == pubkeys[2]
+    # addresses handed out later are added, changing the limit starts over
+    pubkey = bytes(wallet.get_next_public_key())
+    assert wallet.can_generate_rl_puzzle_hash(wallet.rl_puzzle_hash_for_pk(pubkey, 10, 3, origin_id, clawback_pk))
+    wallet.limit = 20
+    assert not wallet.can_generate_rl_puzzle_hash(puzzle_hash)
+    assert len(wallet.rl_puzzle_hash_index()) == 4
+
+
+def test_rl_fleet():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    issuer = Wallet()
+    fleet = RLFleet(issuer)
+    wallets = [issuer, fleet]
+    commit_and_notify(remote, wallets, issuer)
+
+    receivers = [RLWallet() for _ in range(5)]
+    grants = [(receiver.get_next_public_key(), 1000 * (index + 1), 10, 1)
+              for index, receiver in enumerate(receivers)]
+    # two outputs per spend, so the coins have different origins
+    spend_bundle, issued = fleet.generate_signed_issue_transaction(grants, max_outputs_per_spend=2)
+    assert len(issued) == 5 and len(set(_.origin_id for _ in issued)) > 1
+    _ = run(remote.push_tx(tx=spend_bundle))
+    commit_and_notify(remote, wallets, Wallet())
+    assert len(fleet.outstanding()) == 5
+    assert fleet.outstanding_balance() == 15000
+
+    balance = issuer.current_balance
+    clawed_back = [_.puzzle_hash for _ in issued if _.amount in (2000, 5000)]
+    spend_bundle = fleet.generate_signed_clawback_transaction(clawed_back)
+    _ = run(remote.push_tx(tx=spend_bundle))
+    commit_and_notify(remote, wallets, Wallet())
+    assert issuer.current_balance == balance + 7000
+    assert fleet.outstanding_balance() == 8000
+    assert fleet.generate_signed_clawback_transaction(clawed_back) is None
+
+    # a second grant on the same terms would share the first one's puzzle
+    # hash, and with it its tracking and clawback
+    temp_balance = issuer.temp_balance
+    with pytest.raises(ValueError):
+        fleet.generate_signed_issue_transaction([grants[0], grants[0]])
+    assert issuer.temp_balance == temp_balance
+    assert len(issuer.pending_spends) == 0
+
+    # a fleet can't claw back coins issued under another wallet's key
+    stranger = RLFleet(Wallet())
+    stranger.issued = fleet.issued
+    with pytest.raises(ValueError):
+        stranger.generate_signed_clawback_transaction([_.puzzle_hash for _ in fleet.outstanding()])
+
+
 """
 Copyright 2018 Chia Network Inc
 Licensed under the Apache License, Version 2.0 (the "License");
@@ -0,0 +1,44 @@
+from clvm_tools import binutils
+
+from chiasim.hashable import Program, ProgramHash
+
+from utilities.assembler import AssemblerCache
+
+
+def test_assembled_programs_are_shared():
+    cache = AssemblerCache(size=2)
+    source = "(c (q 1) (q ()))"
+    program, program_hash = cache.assemble_with_hash(source)
+    assert program_hash == ProgramHash(Program(binutils.assemble(source)))
+    assert cache.assemble(source) is program
+    assert cache.program_hash(program) == program_hash
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate() == 0.5
+
+
+def test_least_recently_used_is_dropped():
+    cache = AssemblerCache(size=2)
+    first = cache.assemble("(q 1)")
+    cache.assemble("(q 2)")
+    cache.assemble("(q 1)")
+    cache.assemble("(q 3)")
+    assert len(cache) == 2
+    assert cache.assemble("(q 1)") is first
+    assert cache.misses == 3
+    # a program from elsewhere is still hashed correctly
+    other = Program(binutils.assemble("(q 2)"))
+    assert cache.program_hash(other) == ProgramHash(other)
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -0,0 +1,87 @@
+import bisect
+import random
+
+from chiasim.hashable import Coin
+
+from standard_wallet.utxo_store import (
+    SortedKeys, UTXOStore, LARGEST_FIRST, BRANCH_AND_BOUND, FEWEST_INPUTS
+)
+
+
+def make_coins(amounts):
+    puzzle_hash = bytes([1] * 32)
+    return [Coin(index.to_bytes(32, "big"), puzzle_hash, amount)
+            for index, amount in enumerate(amounts)]
+
+
+def test_store_is_sorted_and_tracks_total():
+    store = UTXOStore(make_coins([50, 10, 30, 0, 20]))
+    assert len(store) == 5
+    assert store.total() == 110
+    assert [_.amount for _ in store.coins_by_amount()] == [0, 10, 20, 30, 50]
+    coin = store.pop()
+    assert coin.amount == 50
+    assert coin not in store
+    assert store.total() == 60
+
+
+def test_largest_first():
+    store = UTXOStore(make_coins([1, 2, 3, 40, 50]))
+    selected = store.select(60, LARGEST_FIRST)
+    assert sorted(_.amount for _ in selected) == [40, 50]
+    assert store.total() == 6
+
+
+def test_fewest_inputs():
+    store = UTXOStore(make_coins([1, 2, 35, 40, 50]))
+    selected = store.select(30, FEWEST_INPUTS)
+    assert [_.amount for _ in selected] == [35]
+    selected = store.select(60, FEWEST_INPUTS)
+    assert sorted(_.amount for _ in selected) == [40, 50]
+
+
+def test_branch_and_bound():
+    store = UTXOStore(make_coins([7, 11, 13, 40]))
+    selected = store.select(31, BRANCH_AND_BOUND)
+    assert sorted(_.amount for _ in selected) == [7, 11, 13]
+    # no exact match, falls back to fewest inputs
+    selected = store.select(5, BRANCH_AND_BOUND)
+    assert [_.amount for _ in selected] == [40]
+
+
+def test_insufficient_funds():
+    store = UTXOStore(make_coins([0, 5, 5]))
+    for strategy in (LARGEST_FIRST, BRANCH_AND_BOUND, FEWEST_INPUTS):
+        assert store.select(11, strategy) is None
+    assert len(store) == 3
+
+
+def test_dust():
+    store = UTXOStore(make_coins([1] * 10000 + [1000000]))
+    selected = store.select(5000, FEWEST_INPUTS)
+    assert [_.amount for _ in selected] == [1000000]
+
+
+def test_sorted_keys():
+    r = random.Random(0)
+    keys = SortedKeys()
+    expected = []
+    for index in range(5000):
+        if expected and r.random() < 0.4:
+            key = r.choice(expected)
+            expected.remove(key)
+            keys.remove(key)
+        else:
+            key = (r.randrange(100), index)
+            bisect.insort(expected, key)
+            keys.add(key)
+    assert list(keys) == expected
+    assert [keys[_] for _ in range(len(keys))] == expected
+    assert keys[-1] == expected[-1]
+    for amount in range(0, 101, 5):
+        assert keys.bisect_left((amount,)) == bisect.bisect_left(expected, (amount,))
+        assert keys.bisect_left((amount,), 10, 100) == bisect.bisect_left(expected, (amount,), 10, 100)
+    assert keys.slice(10, 100) == expected[10:100]
+    while expected:
+        assert keys.pop() == expected.pop()
+    assert len(keys) == 0
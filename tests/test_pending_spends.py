@@ -0,0 +1,64 @@
+import hashlib
+from collections import namedtuple
+
+from standard_wallet.pending_spends import PendingSpends
+
+
+class FakeCoin(namedtuple("FakeCoin", "label amount")):
+    def name(self):
+        return hashlib.sha256(self.label.encode()).digest()
+
+
+def test_confirmed_when_an_input_is_spent():
+    pending = PendingSpends(timeout=5)
+    a, b, change = FakeCoin("a", 10), FakeCoin("b", 20), FakeCoin("change", 5)
+    tx_id = pending.add([a, b], [change])
+    assert set(pending.reserved_names()) == {a.name(), b.name()}
+    assert pending.pending_change() == [change]
+    confirmed, expired = pending.reconcile([b])
+    assert confirmed == [tx_id] and expired == []
+    assert len(pending) == 0
+    assert not pending.reserved_names()
+
+
+def test_expiry_releases_spends_of_change():
+    pending = PendingSpends(timeout=2)
+    a, change = FakeCoin("a", 10), FakeCoin("change", 5)
+    first = pending.add([a], [change])
+    second = pending.add([change], [FakeCoin("change2", 1)])
+    assert pending.reconcile([]) == ([], [])
+    pending.reconcile([FakeCoin("other", 1)])
+    confirmed, expired = pending.reconcile([])
+    assert confirmed == []
+    assert set(expired) == {first, second}
+    assert len(pending) == 0
+    assert pending.pending_change() == []
+
+
+def test_drain_reports_dropped_spends():
+    pending = PendingSpends(timeout=1)
+    a, b, change = FakeCoin("a", 10), FakeCoin("b", 20), FakeCoin("change", 5)
+    pending.add([a], [change])
+    assert pending.is_pending_change(change)
+    pending.add([b])
+    pending.reconcile([a])
+    assert [spend.inputs for spend in pending.drain()] == [[a]]
+    assert not pending.is_pending_change(change)
+    assert pending.drain() == []
+    pending.reconcile([])
+    pending.reconcile([])
+    assert [spend.inputs for spend in pending.drain()] == [[b]]
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
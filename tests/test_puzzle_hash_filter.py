@@ -0,0 +1,40 @@
+import hashlib
+from collections import namedtuple
+
+from standard_wallet.puzzle_hash_filter import PuzzleHashFilter
+
+
+Coin = namedtuple("Coin", "parent_coin_info puzzle_hash amount")
+
+
+def h(label):
+    return hashlib.sha256(label.encode()).digest()
+
+
+def test_select_keeps_watched_coins_in_order():
+    watch_filter = PuzzleHashFilter()
+    watch_filter.add("standard", [h("a"), h("b")])
+    coins = [Coin(h("p%d" % _), h(label), 1) for _, label in enumerate("axbyb")]
+    assert watch_filter.select(coins) == [coins[0], coins[2], coins[4]]
+    assert h("a") in watch_filter and h("x") not in watch_filter
+
+
+def test_replacing_a_group_keeps_shared_prefixes():
+    watch_filter = PuzzleHashFilter()
+    watch_filter.add("standard", [h("a")])
+    watch_filter.replace("rl", [h("a"), h("b")])
+    watch_filter.replace("rl", [h("c")])
+    assert h("a") in watch_filter
+    assert h("b") not in watch_filter
+    assert h("c") in watch_filter
+    watch_filter.discard("standard")
+    assert h("a") not in watch_filter
+    assert watch_filter.group_size("rl") == 1
+
+
+def test_children_of_watched_parents():
+    watch_filter = PuzzleHashFilter()
+    other = Coin(h("p"), h("theirs"), 10)
+    watch_filter.replace("ap", [], [h("parent")])
+    child = Coin(h("parent"), h("theirs"), 5)
+    assert watch_filter.select([other, child]) == [child]
@@ -4,6 +4,7 @@ import tempfile
 from unittest import TestCase
 
 from aiter import map_aiter
+from clvm_tools import binutils
 
 from chiasim.clients import ledger_sim
 from chiasim.hack.keys import (
@@ -14,7 +15,7 @@ from chiasim.hack.keys import (
     puzzle_hash_for_index,
     DEFAULT_KEYCHAIN,
 )
-from chiasim.hashable import Coin, ProgramHash
+from chiasim.hashable import Coin, Program, ProgramHash
 from chiasim.ledger import ledger_api
 from chiasim.remote.api_server import api_server
 from chiasim.remote.client import request_response_proxy
@@ -29,6 +30,7 @@ from puzzles import (
     p2_puzzle_hash,
     p2_m_of_n_delegate_direct,
     p2_delegated_puzzle_or_hidden_puzzle,
+    puzzle_template,
 )
 
 
@@ -144,6 +146,30 @@ class TestPuzzles(TestCase):
 
         run_test(puzzle_hash, solution, payments)
 
+    def test_p2_delegated_puzzle_template(self):
+        for index in range(3):
+            pk = public_key_bytes_for_index(index)
+            puzzle_program = p2_delegated_puzzle.puzzle_for_pk(pk)
+            # the puzzle as it was assembled before it had a template
+            expected = Program.to(binutils.assemble(p2_delegated_puzzle.make_source(bytes(pk))))
+            self.assertEqual(bytes(puzzle_program), bytes(expected))
+            self.assertEqual(p2_delegated_puzzle.puzzle_hash_for_pk(pk), ProgramHash(expected))
+
+    def test_puzzle_template(self):
+        def make_source(pubkey, amount):
+            return (f"(c (c (q 50) (c (q 0x{pubkey.hex()}) (q ()))) "
+                    f"(c (c (q 51) (c (q 0x{pubkey.hex()}) (c (q {amount}) (q ())))) (q ())))")
+
+        template = puzzle_template.PuzzleTemplate(
+            lambda pubkey, amount: make_source(pubkey, "0x%s" % amount.hex()), 2)
+        self.assertEqual(template.holes, [0, 0, 1])
+        for index, amount in enumerate([0, 1, 127, 128, 1000000]):
+            pk = public_key_bytes_for_index(index)
+            expected = Program.to(binutils.assemble(make_source(pk, amount)))
+            self.assertEqual(bytes(template.program(pk, amount)), bytes(expected))
+            self.assertEqual(template.program_hash(pk, amount), ProgramHash(expected))
+            self.assertEqual(template.program_hash(pk.hex(), amount), ProgramHash(expected))
+
     def test_p2_delegated_puzzle_graftroot(self):
         payments, conditions = default_payments_and_conditions()
 
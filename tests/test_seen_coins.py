@@ -0,0 +1,53 @@
+import hashlib
+
+from standard_wallet.seen_coins import SeenCoins
+
+
+def names(count, start=0):
+    return [hashlib.sha256(index.to_bytes(8, "big")).digest() for index in range(start, start + count)]
+
+
+def test_recent_blocks_are_exact():
+    seen = SeenCoins(window=2, capacity=100, error_rate=1e-6)
+    block = names(10)
+    for name in block:
+        seen.add(name)
+    assert all(name in seen for name in block)
+    assert not any(name in seen for name in names(10, 10))
+    seen.next_block()
+    seen.next_block()
+    # moved out of the window into the filter, still seen
+    assert len(seen) == 0
+    assert all(name in seen for name in block)
+
+
+def test_memory_is_bounded():
+    seen = SeenCoins(window=5, capacity=1000, error_rate=1e-4)
+    # nothing is allocated until names leave the window
+    assert seen._filters == []
+    sizes = set()
+    for height in range(100):
+        for name in names(100, height * 100):
+            seen.add(name)
+        seen.next_block()
+        assert len(seen) <= 500
+        assert len(seen._filters) <= 2
+        if seen._filters:
+            sizes.add(sum(len(_.bits) for _ in seen._filters))
+    assert max(sizes) <= 2 * min(sizes)
+    # the last few blocks are always remembered exactly
+    assert all(name in seen for name in names(500, 9500))
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -1,9 +1,19 @@
 import asyncio
+import concurrent.futures
 import pathlib
 import tempfile
+import pytest
 import clvm
 from aiter import map_aiter
+from standard_wallet import wallet as wallet_module
 from standard_wallet.wallet import Wallet
+from standard_wallet.wallet_store import WalletStore
+from standard_wallet import wallet_runnable
+from standard_wallet.wallet_host import WalletHost
+from utilities import instrumentation
+from utilities.assembler import assemble
+from utilities.chain_follower import ChainFollower
+from utilities.signing import SigningEngine
 from chiasim.utils.log import init_logging
 from chiasim.remote.api_server import api_server
 from chiasim.remote.client import request_response_proxy
@@ -39,6 +49,12 @@ def make_client_server():
     return remote
 
 
+def blocks_between(follower, last_known_header, tip_hash):
+    async def collect():
+        return [block async for block in follower.blocks_between(last_known_header, tip_hash)]
+    return asyncio.get_event_loop().run_until_complete(collect())
+
+
 def commit_and_notify(remote, wallets, reward_recipient):
     run = asyncio.get_event_loop().run_until_complete
     coinbase_puzzle_hash = reward_recipient.get_new_puzzlehash()
@@ -178,6 +194,319 @@ def test_spend_failure():
     assert wallet_a.temp_balance == 1000
 
 
+def test_puzzle_hash_lookup():
+    wallet = Wallet()
+    puzzlehashes = [wallet.get_new_puzzlehash() for _ in range(5)]
+    for index, puzzlehash in enumerate(puzzlehashes):
+        assert wallet.can_generate_puzzle_hash(puzzlehash)
+        pubkey, secretkey = wallet.get_keys(puzzlehash)
+        assert bytes(pubkey) == bytes(wallet.extended_secret_key.public_child(index))
+    assert not wallet.can_generate_puzzle_hash(Wallet().get_new_puzzlehash())
+    assert wallet.get_keys(Wallet().get_new_puzzlehash()) is None
+
+
+def test_wallets_dont_share_keys():
+    wallet_a = Wallet()
+    wallet_b = Wallet()
+    pubkey = wallet_a.get_next_public_key()
+    assert wallet_b.next_address == 0
+    assert len(wallet_b.puzzle_hash_lookup) == 0
+    assert wallet_a.puzzle_hash_lookup.child_for_pubkey(pubkey) == 0
+    assert wallet_b.puzzle_hash_lookup.child_for_pubkey(pubkey) is None
+    wallet_b.get_next_public_key()
+    assert bytes(wallet_a.puzzle_hash_lookup.pubkey(0)) == bytes(pubkey)
+    with pytest.raises(ValueError):
+        wallet_b.sign(b"message", wallet_a.get_next_public_key())
+
+
+def test_wallet_store():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallet_a = Wallet()
+    commit_and_notify(remote, [wallet_a], wallet_a)
+
+    path = pathlib.Path(tempfile.mkdtemp(), "wallet.db")
+    store = WalletStore(path)
+    store.save(wallet_a, tip=b"tip")
+    store.close()
+    # nothing saved is told apart from a wallet saved without a tip
+    assert WalletStore(pathlib.Path(tempfile.mkdtemp(), "empty.db")).load(Wallet()) is None
+    untipped_path = pathlib.Path(tempfile.mkdtemp(), "wallet.db")
+    WalletStore(untipped_path).save(wallet_a)
+    untipped = Wallet()
+    assert WalletStore(untipped_path).load(untipped) == (untipped, None)
+
+    store = WalletStore(path)
+    wallet_b = Wallet()
+    assert store.load(wallet_b) == (wallet_b, b"tip")
+    assert wallet_b.seed == wallet_a.seed
+    assert wallet_b.current_balance == wallet_a.current_balance
+    assert wallet_b.my_utxos == wallet_a.my_utxos
+    assert wallet_b.puzzle_hash_lookup.keys() == wallet_a.puzzle_hash_lookup.keys()
+
+    # the restored wallet can spend what the original received
+    wallet_c = Wallet()
+    spend_bundle = wallet_b.generate_signed_transaction(5000, wallet_c.get_new_puzzlehash())
+    _ = run(remote.push_tx(tx=spend_bundle))
+    commit_and_notify(remote, [wallet_b, wallet_c], Wallet())
+    assert wallet_b.current_balance == 999995000
+    assert wallet_c.current_balance == 5000
+
+
+def test_menu_with_store(monkeypatch):
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    path = pathlib.Path(tempfile.mkdtemp(), "wallet.db")
+    store = WalletStore(path)
+    wallet = Wallet()
+    wallet_b = Wallet()
+    answers = iter([
+        "5000", hexlify(bytes(wallet_b.get_new_puzzlehash())).decode("ascii"),  # 1: make payment
+        "carol",  # 5: set name
+        "00", "q",  # 6: initiate AP, then back out
+    ])
+    monkeypatch.setattr("builtins.input", lambda *args: next(answers))
+    tip = run(remote.get_tip())["genesis_hash"]
+
+    def select(selection):
+        return run(wallet_runnable.handle_selection(selection, wallet, remote, tip, store))
+
+    tip = select("3")
+    assert wallet.current_balance == 1000000000
+    tip = select("1")
+    assert wallet.temp_balance == 999995000
+    tip = select("3")
+    tip = select("2")
+    next_address = wallet.next_address
+    tip = select("4")
+    assert wallet.next_address > next_address
+    tip = select("5")
+    assert wallet.name == "carol"
+    tip = select("6")
+    assert next(answers, None) is None
+
+    # each option was dispatched and saved after
+    restored = Wallet()
+    assert WalletStore(path).load(restored) == (restored, tip)
+    assert restored.name == "carol"
+    assert restored.next_address == wallet.next_address
+    assert restored.current_balance == wallet.current_balance
+
+
+def test_parallel_signing():
+    remote = make_client_server()
+    wallet = Wallet()
+    for _ in range(3):
+        commit_and_notify(remote, [wallet], wallet)
+    spends = wallet.generate_unsigned_transaction(wallet.current_balance, Wallet().get_new_puzzlehash())
+    assert len(spends) == 6
+    serial = wallet.sign_transaction(spends)
+    with concurrent.futures.ProcessPoolExecutor(2) as executor:
+        wallet.signing_engine = SigningEngine(executor, min_parallel=1)
+        parallel = wallet.sign_transaction(spends)
+    assert bytes(parallel) == bytes(serial)
+
+
+def test_batch_payment():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallet_a = Wallet()
+    wallet_b = Wallet()
+    for _ in range(3):
+        commit_and_notify(remote, [wallet_a], wallet_a)
+    payments = [(wallet_b.get_new_puzzlehash(), 1000 + _) for _ in range(250)]
+    spends = wallet_a.generate_unsigned_batch_transaction(iter(payments), max_outputs_per_spend=100)
+    assert len(spends) == 3
+    assert all(solution.coin.amount > 0 for puzzle, solution in spends)
+    spend_bundle = wallet_a.sign_transaction(spends)
+    _ = run(remote.push_tx(tx=spend_bundle))
+    commit_and_notify(remote, [wallet_a, wallet_b], Wallet())
+    total = sum(amount for puzzlehash, amount in payments)
+    assert wallet_b.current_balance == total
+    assert len(wallet_b.my_utxos) == 250
+    assert wallet_a.current_balance == 3000000000 - total
+
+
+def test_batch_payment_with_too_few_coins():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallet_a = Wallet()
+    wallet_b = Wallet()
+    commit_and_notify(remote, [wallet_a], wallet_a)
+    # one coin to carry three spends' worth of outputs, so it carries
+    # them all rather than spending a zero-value coin alongside it
+    payments = [(wallet_b.get_new_puzzlehash(), 1000) for _ in range(10)]
+    spends = wallet_a.generate_unsigned_batch_transaction(payments, max_outputs_per_spend=4)
+    assert len(spends) == 1
+    assert spends[0][1].coin.amount == 1000000000
+    _ = run(remote.push_tx(tx=wallet_a.sign_transaction(spends)))
+    commit_and_notify(remote, [wallet_a, wallet_b], Wallet())
+    assert len(wallet_b.my_utxos) == 10
+    assert wallet_a.current_balance == 1000000000 - 10000
+
+
+def test_batch_payment_from_empty_wallet():
+    wallet = Wallet()
+    # nothing to pay, but no coin to carry the outputs either
+    payments = [(Wallet().get_new_puzzlehash(), 0) for _ in range(3)]
+    assert wallet.generate_unsigned_batch_transaction(payments) is None
+    assert len(wallet.pending_spends) == 0
+
+
+def test_sends_survive_notify():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallet_a = Wallet()
+    wallet_b = Wallet()
+    wallets = [wallet_a, wallet_b]
+    commit_and_notify(remote, wallets, wallet_a)
+    spend_bundles = [wallet_a.generate_signed_transaction(1000, wallet_b.get_new_puzzlehash())
+                     for _ in range(3)]
+    assert wallet_a.temp_balance == wallet_a.current_balance - 3000
+    # a block without them doesn't make their coins selectable again
+    commit_and_notify(remote, wallets, Wallet())
+    assert wallet_a.temp_balance == wallet_a.current_balance - 3000
+    spend_bundles.append(wallet_a.generate_signed_transaction(1000, wallet_b.get_new_puzzlehash()))
+    for spend_bundle in spend_bundles:
+        _ = run(remote.push_tx(tx=spend_bundle))
+    commit_and_notify(remote, wallets, Wallet())
+    assert wallet_b.current_balance == 4000
+    assert wallet_a.temp_balance == wallet_a.current_balance
+    assert len(wallet_a.pending_spends) == 0
+
+
+def test_restore():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallet = Wallet()
+    puzzlehashes = [wallet.get_new_puzzlehash() for _ in range(61)]
+    # 39 and 40 are only within the gap limit once 20 and 21 have been
+    # seen, and 59 and 60 came before that so they're out of reach
+    for first, second in [(0, 1), (59, 60), (20, 21), (39, 40)]:
+        run(remote.next_block(coinbase_puzzle_hash=puzzlehashes[first],
+                              fees_puzzle_hash=puzzlehashes[second]))
+    tip = run(remote.get_tip())
+    blocks = blocks_between(ChainFollower(remote), tip["genesis_hash"], tip["tip_hash"])
+
+    copy = Wallet()
+    copy.set_seed(wallet.seed)
+    copy.restore(blocks, gap_limit=20)
+    assert len(copy.my_utxos) == 6
+    assert copy.next_address == 41
+    assert copy.temp_balance == copy.current_balance > 0
+    # restored coins are known the same way notified ones are
+    for coin in copy.my_utxos:
+        assert coin.name() in copy.all_additions
+        assert coin.name() in copy.coin_cache
+
+    too_short = Wallet()
+    too_short.set_seed(wallet.seed)
+    too_short.restore(blocks, gap_limit=10)
+    assert len(too_short.my_utxos) == 2
+
+
+def test_wallet_host():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallets = [Wallet() for _ in range(3)]
+    host = WalletHost(remote)
+    for wallet in wallets:
+        host.add_wallet(wallet)
+    # addresses handed out after the wallet joined are routed too
+    run(remote.next_block(coinbase_puzzle_hash=wallets[0].get_new_puzzlehash(),
+                          fees_puzzle_hash=wallets[0].get_new_puzzlehash()))
+    run(host.sync())
+    assert wallets[0].current_balance == 1000000000
+    assert len(wallets[0].my_utxos) == 2
+    for wallet in wallets[1:]:
+        assert wallet.current_balance == 0
+        assert len(wallet.my_utxos) == 0
+
+    spend_bundle = wallets[0].generate_signed_transaction(1000, wallets[1].get_new_puzzlehash())
+    _ = run(remote.push_tx(tx=spend_bundle))
+    run(remote.next_block(coinbase_puzzle_hash=Wallet().get_new_puzzlehash(),
+                          fees_puzzle_hash=Wallet().get_new_puzzlehash()))
+    run(host.sync())
+    assert wallets[0].current_balance == 1000000000 - 1000
+    assert len(wallets[0].pending_spends) == 0
+    assert wallets[1].current_balance == 1000
+    assert len(wallets[1].my_utxos) == 1
+    assert wallets[2].current_balance == 0
+    assert len(wallets[2].my_utxos) == 0
+
+
+def test_chain_follower():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallet_a = Wallet()
+    wallet_b = Wallet()
+    for _ in range(5):
+        commit_and_notify(remote, [wallet_a], wallet_a)
+    spend_bundle = wallet_a.generate_signed_transaction(5000, wallet_b.get_new_puzzlehash())
+    _ = run(remote.push_tx(tx=spend_bundle))
+    commit_and_notify(remote, [wallet_a], Wallet())
+
+    # a copy of wallet_a that only learns about the chain from the follower
+    store_path = pathlib.Path(tempfile.mkdtemp(), "wallet.db")
+    WalletStore(store_path).save(wallet_a)
+    wallet_c = Wallet()
+    store = WalletStore(store_path)
+    store.load(wallet_c)
+    wallet_c.my_utxos = set()
+    wallet_c.current_balance = 0
+
+    tip = run(remote.get_tip())
+    follower = ChainFollower(remote, window=4)
+    blocks = blocks_between(follower, tip["genesis_hash"], tip["tip_hash"])
+    assert len(blocks) == 6
+    assert blocks[-1].header_hash == tip["tip_hash"]
+    assert sum(len(_.removals) for _ in blocks) == 1
+    # the spent coin was created in an earlier block, so it came from the cache
+    assert follower.coin_cache.hits == 1
+    assert follower.coin_cache.misses == 0
+    for block in blocks:
+        wallet_c.notify(block.additions, block.removals)
+    assert wallet_c.current_balance == wallet_a.current_balance
+    assert wallet_c.my_utxos == wallet_a.my_utxos
+
+
+def test_instrumentation():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        wallet = Wallet()
+        commit_and_notify(remote, [wallet], wallet)
+        follower = ChainFollower(remote)
+        tip = run(follower.ledger_api.get_tip())
+        blocks_between(follower, tip["genesis_hash"], tip["tip_hash"])
+        wallet.generate_signed_transaction(1000, Wallet().get_new_puzzlehash())
+        # a source nothing else assembles, so the cache misses
+        assemble("(q 0x%s)" % bytes(wallet.get_new_puzzlehash()).hex())
+        # the wrapped class still stands for the class
+        puzzle_hash = ProgramHash(bytes(wallet.get_new_puzzlehash()))
+        assert isinstance(puzzle_hash, wallet_module.ProgramHash)
+        assert issubclass(wallet_module.ProgramHash, ProgramHash)
+    finally:
+        instrumentation.disable()
+    report = instrumentation.report()
+    assert report["sign"]["total"]["count"] > 0
+    assert report["ProgramHash"]["total"]["count"] > 0
+    assert report["rpc.hash_preimage"]["total"]["count"] > 0
+    # templated puzzle hashes are timed as a whole, against their caller
+    assert "puzzles.p2_delegated_puzzle:puzzle_hash_for_pk" in report["ProgramHash"]
+    assert "puzzles.puzzle_template:program_hash" not in report["ProgramHash"]
+    # assembling is counted against the caller of the cache
+    assert "tests.test_transactions:test_instrumentation" in report["assemble"]
+    assert not any(site.startswith("utilities.assembler:") for site in report["assemble"])
+    # once disabled nothing is recorded and nothing is wrapped
+    count = report["ProgramHash"]["total"]["count"]
+    Wallet().get_new_puzzlehash()
+    assert instrumentation.report()["ProgramHash"]["total"]["count"] == count
+    assert instrumentation.wrap_remote(remote) is remote
+
+
 """
 Copyright 2018 Chia Network Inc
 Licensed under the Apache License, Version 2.0 (the "License");
@@ -1,6 +1,7 @@
 import utilities.puzzle_utilities as pu
 from standard_wallet.wallet import Wallet
 from binascii import hexlify
+from utilities.BLSHDKey import PUBLIC_KEY_SIZE, PRIVATE_KEY_SIZE, unpack_keys
 import pytest
 
 
@@ -18,3 +19,21 @@ def test_pubkey_format_exception():
 def test_pubkey_format_invalid_pubkey():
     with pytest.raises(ValueError):
         assert pu.pubkey_format("0xdeadbeef")
+
+
+def test_derive_public_range():
+    wallet = Wallet()
+    key = wallet.extended_secret_key
+    blob = key.derive_public_range(3, 4)
+    assert len(blob) == 4 * PUBLIC_KEY_SIZE
+    expected = [bytes(key.public_child(_)) for _ in range(3, 7)]
+    assert unpack_keys(blob) == expected
+    assert unpack_keys(key.public_hd_key().derive_public_range(3, 4)) == expected
+
+
+def test_derive_private_range():
+    wallet = Wallet()
+    key = wallet.extended_secret_key
+    blob = key.derive_private_range(0, 3)
+    expected = [bytes(key.private_child(_)) for _ in range(3)]
+    assert unpack_keys(blob, PRIVATE_KEY_SIZE) == expected
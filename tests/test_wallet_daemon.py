@@ -0,0 +1,96 @@
+import asyncio
+import pathlib
+import tempfile
+
+from chiasim.remote.client import RemoteError
+
+from standard_wallet.wallet import Wallet
+from standard_wallet.wallet_daemon import WalletAPI, start_wallet_daemon, connect_to_wallet_daemon
+from standard_wallet.wallet_store import WalletStore
+
+from tests.test_transactions import make_client_server
+
+
+def farm_block(remote, wallet):
+    run = asyncio.get_event_loop().run_until_complete
+    run(remote.next_block(coinbase_puzzle_hash=wallet.get_new_puzzlehash(),
+                          fees_puzzle_hash=wallet.get_new_puzzlehash()))
+
+
+def test_wallet_daemon():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallet = Wallet()
+    api = WalletAPI(wallet, remote)
+    path = pathlib.Path(tempfile.mkdtemp(), "wallet")
+    server_task, follow_task = run(start_wallet_daemon(path, api, interval=0.01))
+    client = run(connect_to_wallet_daemon(path))
+
+    farm_block(remote, wallet)
+    run(client.sync())
+    r = run(client.get_balance())
+    assert r["balance"] == 1000000000
+
+    wallet_b = Wallet()
+    for amount in (-5000, 0, "5000", 1.5):
+        r = run(client.send(puzzlehash=bytes(wallet_b.get_new_puzzlehash()), amount=amount))
+        assert isinstance(r, RemoteError)
+    r = run(client.send_batch(payments=[[bytes(wallet_b.get_new_puzzlehash()), -1]]))
+    assert isinstance(r, RemoteError)
+    assert wallet.temp_balance == 1000000000
+    r = run(client.send(puzzlehash=bytes(wallet_b.get_new_puzzlehash()), amount=5000))
+    assert r["ok"]
+    payments = [[bytes(wallet_b.get_new_puzzlehash()), 100 * (_ + 1)] for _ in range(10)]
+    r = run(client.send_batch(payments=payments))
+    assert r["ok"]
+    farm_block(remote, Wallet())
+    run(client.sync())
+    r = run(client.get_balance())
+    assert r["balance"] == 1000000000 - 5000 - 5500
+
+    # the background task keeps up without being asked
+    farm_block(remote, wallet)
+    run(asyncio.sleep(0.5))
+    assert wallet.current_balance == 2000000000 - 5000 - 5500
+    follow_task.cancel()
+
+
+def test_wallet_daemon_saves_addresses():
+    remote = make_client_server()
+    run = asyncio.get_event_loop().run_until_complete
+    wallet = Wallet()
+    db_path = pathlib.Path(tempfile.mkdtemp(), "wallet.db")
+    api = WalletAPI(wallet, remote, WalletStore(db_path))
+    farm_block(remote, wallet)
+    run(api.do_sync())
+    # nothing new on the chain, but the addresses above are kept
+    run(api.do_sync())
+    restored = Wallet()
+    WalletStore(db_path).load(restored)
+    assert restored.next_address == wallet.next_address
+
+    r = run(api.do_get_new_puzzlehash())
+    restored = Wallet()
+    WalletStore(db_path).load(restored)
+    assert restored.can_generate_puzzle_hash(r["puzzlehash"])
+    assert restored.next_address == wallet.next_address
+
+    # the change address of a send is kept before the send is confirmed
+    run(api.do_send(puzzlehash=bytes(Wallet().get_new_puzzlehash()), amount=5000))
+    restored = Wallet()
+    WalletStore(db_path).load(restored)
+    assert restored.next_address == wallet.next_address
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -5,6 +5,14 @@ from chiasim.hashable import BLSPublicKey
 from chiasim.wallet.BLSPrivateKey import BLSPrivateKey
 
 
+PUBLIC_KEY_SIZE = 48
+PRIVATE_KEY_SIZE = 32
+
+# number of children each worker derives when a range is split across
+# an executor
+DERIVATION_CHUNK_SIZE = 1024
+
+
 def fingerprint_for_pk(pk):
     """
     Take a public key and get the fingerprint for it.
@@ -13,6 +21,51 @@ def fingerprint_for_pk(pk):
     return hashlib.sha256(bytes(pk)).digest()[-4:]
 
 
+def public_range_for_blob(blob, start, count):
+    """
+    Derive children [start, start + count) of the serialized extended
+    public key blob and return their public keys packed end to end.
+    """
+    bls_public_hd_key = blspy.ExtendedPublicKey.from_bytes(blob)
+    return b"".join(
+        bls_public_hd_key.public_child(idx).get_public_key().serialize()
+        for idx in range(start, start + count)
+    )
+
+
+def private_range_for_blob(blob, start, count):
+    """
+    Derive children [start, start + count) of the serialized extended
+    private key blob and return their private keys packed end to end.
+    """
+    bls_private_hd_key = blspy.ExtendedPrivateKey.from_bytes(blob)
+    return b"".join(
+        bls_private_hd_key.private_child(idx).get_private_key().serialize()
+        for idx in range(start, start + count)
+    )
+
+
+def derive_range(range_f, blob, start, count, executor=None, chunk_size=DERIVATION_CHUNK_SIZE):
+    """
+    Run range_f over [start, start + count), optionally splitting the range
+    into chunks that are mapped over an executor (such as a
+    concurrent.futures.ProcessPoolExecutor). The chunks are joined in order.
+    """
+    if executor is None or count <= chunk_size:
+        return range_f(blob, start, count)
+    starts = range(start, start + count, chunk_size)
+    counts = [min(chunk_size, start + count - _) for _ in starts]
+    return b"".join(executor.map(range_f, [blob] * len(starts), starts, counts))
+
+
+def unpack_keys(blob, key_size=PUBLIC_KEY_SIZE):
+    """
+    Split a packed blob returned by one of the derive_*_range methods
+    into a list of serialized keys.
+    """
+    return [blob[_:_ + key_size] for _ in range(0, len(blob), key_size)]
+
+
 class BLSPublicHDKey:
     """
     A class for public hierarchical deterministic bls keys.
@@ -32,6 +85,13 @@ class BLSPublicHDKey:
     def public_child(self, idx) -> BLSPublicKey:
         return self.public_hd_child(idx).public_key()
 
+    def derive_public_range(self, start, count, executor=None) -> bytes:
+        """
+        Return the public keys of children [start, start + count) as one
+        blob of packed PUBLIC_KEY_SIZE byte keys.
+        """
+        return derive_range(public_range_for_blob, bytes(self), start, count, executor)
+
     def public_key(self):
         return BLSPublicKey.from_bytes(
             self._bls_public_hd_key.get_public_key().serialize()
@@ -84,6 +144,21 @@ class BLSPrivateHDKey:
     def private_child(self, idx):
         return self.private_hd_child(idx).private_key()
 
+    def derive_public_range(self, start, count, executor=None) -> bytes:
+        """
+        Return the public keys of children [start, start + count) as one
+        blob of packed PUBLIC_KEY_SIZE byte keys.
+        """
+        blob = self._bls_private_hd_key.get_extended_public_key().serialize()
+        return derive_range(public_range_for_blob, blob, start, count, executor)
+
+    def derive_private_range(self, start, count, executor=None) -> bytes:
+        """
+        Return the private keys of children [start, start + count) as one
+        blob of packed PRIVATE_KEY_SIZE byte keys.
+        """
+        return derive_range(private_range_for_blob, bytes(self), start, count, executor)
+
     def secret_exponent(self):
         return int.from_bytes(
             self._bls_private_hd_key.get_private_key().serialize(), "big"
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+from clvm_tools import binutils
+
+from chiasim.hashable import Program, ProgramHash
+
+
+# about this many assembled sources are kept, least recently used are dropped first
+ASSEMBLER_CACHE_SIZE = 4096
+
+
+class AssemblerCache:
+    """
+    A least recently used map from clvm source text to the assembled
+    Program and its ProgramHash, so puzzles built from the same template
+    and arguments are only assembled and hashed once.
+
+    The hash is computed the first time it's asked for. Programs handed
+    out are shared between callers, which is safe as clvm programs are
+    never modified in place.
+    """
+
+    def __init__(self, size=ASSEMBLER_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()  # {source: [program, program_hash or None]}
+        self._sources = {}  # {id(program): source} for the programs held above
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, source):
+        entry = self._entries.get(source)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(source)
+            return entry
+        self.misses += 1
+        program = Program(binutils.assemble(source))
+        entry = self._entries[source] = [program, None]
+        self._sources[id(program)] = source
+        if len(self._entries) > self.size:
+            _, (old_program, _) = self._entries.popitem(last=False)
+            del self._sources[id(old_program)]
+        return entry
+
+    def assemble(self, source):
+        return self._entry(source)[0]
+
+    def assemble_with_hash(self, source):
+        entry = self._entry(source)
+        if entry[1] is None:
+            entry[1] = ProgramHash(entry[0])
+        return entry[0], entry[1]
+
+    def program_hash(self, program):
+        """
+        Return ProgramHash(program), from the cache if program was
+        assembled here and is still held.
+        """
+        source = self._sources.get(id(program))
+        if source is not None:
+            entry = self._entries[source]
+            if entry[0] is program:
+                if entry[1] is None:
+                    entry[1] = ProgramHash(program)
+                return entry[1]
+        return ProgramHash(program)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, hit_rate=self.hit_rate(),
+                    size=len(self._entries), max_size=self.size)
+
+    def clear(self):
+        self._entries.clear()
+        self._sources.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# shared by every wallet in the process
+ASSEMBLER = AssemblerCache()
+
+
+def assemble(source):
+    return ASSEMBLER.assemble(source)
+
+
+def assemble_with_hash(source):
+    return ASSEMBLER.assemble_with_hash(source)
+
+
+def program_hash(program):
+    return ASSEMBLER.program_hash(program)
+
+
+def assembler_stats():
+    return ASSEMBLER.stats()
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -0,0 +1,174 @@
+import asyncio
+import itertools
+from collections import deque, namedtuple
+
+from chiasim.hashable import Body, Coin, Header
+from chiasim.hashable.Body import BodyList
+from chiasim.wallet.deltas import additions_for_body, removals_for_body
+
+from .coin_cache import CoinCache
+from .instrumentation import wrap_remote
+
+
+# how many hash_preimage requests are kept in flight at once
+FETCH_WINDOW = 32
+
+
+Block = namedtuple("Block", "header_hash header body additions removals")
+
+
+class ChainFollower:
+    """
+    Fetches the blocks a wallet hasn't seen yet and yields them oldest
+    first with their additions and removals resolved, ready to pass to
+    wallet.notify.
+
+    Headers are walked iteratively from the tip back to the last known
+    header, keeping only the headers. Blocks are then fetched in order, at
+    most `window` ahead of the one being yielded, with up to `window`
+    requests in flight, so memory stays bounded however far behind the
+    wallet is and the first block is yielded as soon as it arrives.
+
+    Removals are looked up in coin_cache first, which also learns the
+    additions of every block fetched, and only the misses are fetched.
+    """
+
+    def __init__(self, ledger_api, window=FETCH_WINDOW, coin_cache=None):
+        self.ledger_api = wrap_remote(ledger_api)
+        self.window = window
+        self.coin_cache = CoinCache() if coin_cache is None else coin_cache
+        self._semaphore = None
+
+    async def hash_preimage(self, hash):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.window)
+        async with self._semaphore:
+            return await self.ledger_api.hash_preimage(hash=hash)
+
+    async def coins_for_names(self, names):
+        blobs = await asyncio.gather(*[self.hash_preimage(_) for _ in names])
+        return [Coin.from_bytes(_) for _ in blobs]
+
+    async def blocks_for_bodies(self, bodies, headers=None):
+        """
+        Resolve the removals of already fetched bodies, keeping their order.
+        headers, if given, is a matching list of (header_hash, header).
+        """
+        if headers is None:
+            headers = [(None, None)] * len(bodies)
+        known = {}
+        missing = []
+        block_additions = []
+        removal_names = []
+        for body in bodies:
+            # additions go in first, a coin can be spent in the block that
+            # creates it
+            additions = list(additions_for_body(body))
+            self.coin_cache.add_coins(additions)
+            block_additions.append(additions)
+            names = list(removals_for_body(body))
+            for name in names:
+                coin = self.coin_cache.get(name)
+                if coin is None:
+                    missing.append(name)
+                else:
+                    known[name] = coin
+            removal_names.append(names)
+        for coin in await self.coins_for_names(missing):
+            known[coin.name()] = coin
+        return [Block(header_hash, header, body, additions, [known[_] for _ in names])
+                for (header_hash, header), body, additions, names
+                in zip(headers, bodies, block_additions, removal_names)]
+
+    async def headers_between(self, last_known_header, tip_hash):
+        """
+        Return (header_hash, header) for the blocks after last_known_header
+        up to and including tip_hash, oldest first. A header only names its
+        parent, so this takes one round trip per header.
+        """
+        headers = []
+        header_hash = tip_hash
+        while header_hash != last_known_header:
+            # the walk skips the window so it never waits behind bodies
+            header = Header.from_bytes(await self.ledger_api.hash_preimage(hash=header_hash))
+            headers.append((header_hash, header))
+            header_hash = header.previous_hash
+        headers.reverse()
+        return headers
+
+    async def _block_for_header(self, header_hash, header, after, done):
+        # after is set once the additions of every earlier block are in the
+        # cache, and done once this block's are, so removals are resolved
+        # in chain order while bodies and missing coins are fetched at once
+        body = Body.from_bytes(await self.hash_preimage(header.body_hash))
+        additions = list(additions_for_body(body))
+        await after.wait()
+        self.coin_cache.add_coins(additions)
+        names = list(removals_for_body(body))
+        known = {}
+        missing = []
+        for name in names:
+            coin = self.coin_cache.get(name)
+            if coin is None:
+                missing.append(name)
+            else:
+                known[name] = coin
+        done.set()
+        for coin in await self.coins_for_names(missing):
+            known[coin.name()] = coin
+        return Block(header_hash, header, body, additions, [known[_] for _ in names])
+
+    async def blocks_for_headers(self, headers):
+        """
+        Yield the blocks for headers, a list of (header_hash, header), in
+        order, fetching up to `window` of them ahead.
+        """
+        headers = iter(headers)
+        tasks = deque()
+        done = asyncio.Event()
+        done.set()
+        try:
+            while True:
+                for header_hash, header in itertools.islice(headers, self.window - len(tasks)):
+                    after, done = done, asyncio.Event()
+                    tasks.append(asyncio.ensure_future(self._block_for_header(header_hash, header, after, done)))
+                if not tasks:
+                    return
+                yield await tasks.popleft()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def blocks_between(self, last_known_header, tip_hash):
+        """
+        Yield the blocks after last_known_header up to and including
+        tip_hash, oldest first.
+        """
+        headers = await self.headers_between(last_known_header, tip_hash)
+        async for block in self.blocks_for_headers(headers):
+            yield block
+
+    async def recent_blocks(self, most_recent_header=None):
+        """
+        Fetch every body after most_recent_header, or the whole chain if it
+        is None, using the ledger's bulk block calls.
+        """
+        if most_recent_header is None:
+            r = await self.ledger_api.get_all_blocks()
+        else:
+            r = await self.ledger_api.get_recent_blocks(most_recent_header=most_recent_header)
+        return await self.blocks_for_bodies(BodyList.from_bytes(r))
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
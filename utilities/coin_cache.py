@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+
+# about this many coins are kept, least recently used are dropped first
+COIN_CACHE_SIZE = 20000
+
+
+class CoinCache:
+    """
+    A least recently used map from coin name to coin, filled from the
+    additions of each block so that removals of those coins can be
+    resolved without asking the ledger for their preimage.
+    """
+
+    def __init__(self, size=COIN_CACHE_SIZE):
+        self.size = size
+        self._coins = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, coin):
+        name = coin.name()
+        self._coins[name] = coin
+        self._coins.move_to_end(name)
+        if len(self._coins) > self.size:
+            self._coins.popitem(last=False)
+
+    def add_coins(self, coins):
+        for coin in coins:
+            self.add(coin)
+
+    def get(self, name):
+        coin = self._coins.get(name)
+        if coin is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._coins.move_to_end(name)
+        return coin
+
+    def __contains__(self, name):
+        return name in self._coins
+
+    def __len__(self):
+        return len(self._coins)
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -0,0 +1,302 @@
+"""
+Opt-in timing of the expensive calls the wallets make: assembling and
+running clvm, hashing programs, BLS signing and remote calls to the ledger.
+
+Nothing is wrapped until enable() is called, so when instrumentation is off
+the wallets run the original functions with no overhead at all. Entry points
+call enable_from_environment(), so setting WALLET_INSTRUMENT=1 turns it on
+and dumps a report to stderr at exit, and WALLET_INSTRUMENT=path writes
+the report to path instead.
+
+Counters are kept per call site, which is the module and function that
+made the call, e.g. "rate_limit.rl_wallet:rl_puzzle_for_pk". Each one has
+a latency histogram with power of two buckets in microseconds.
+"""
+
+import atexit
+import importlib
+import json
+import os
+import sys
+import time
+
+
+ENV_VAR = "WALLET_INSTRUMENT"
+
+# modules whose imported names are wrapped, so calls made from them are seen
+TARGET_MODULES = [
+    "standard_wallet.wallet",
+    "rate_limit.rl_wallet",
+    "authorised_payees.ap_wallet",
+    "authorised_payees.ap_wallet_a_functions",
+    "atomic_swaps.as_wallet",
+    "custody_wallet.custody_wallet",
+    "recoverable_wallet.recoverable_wallet",
+    "multisig.MultisigHDWallet",
+    "multisig.signer",
+    "multisig.wallet",
+    "puzzles.p2_conditions",
+    "puzzles.p2_delegated_puzzle",
+    "utilities.assembler",
+    "utilities.signing",
+]
+
+# names imported into the target modules which get wrapped there
+WRAPPED_GLOBALS = ["ProgramHash", "run_program", "conditions_for_solution"]
+
+
+class Stats:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = {}  # {power of two microseconds: count}
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if self.min is None or elapsed < self.min:
+            self.min = elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        bucket = 1 << int(elapsed * 1e6).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def as_dict(self):
+        return dict(
+            count=self.count,
+            total=self.total,
+            mean=self.total / self.count if self.count else 0,
+            min=self.min,
+            max=self.max,
+            histogram_us={"<%d" % k: v for k, v in sorted(self.buckets.items())},
+        )
+
+
+_stats = {}  # {(name, call_site): Stats}
+_patches = []  # [(owner, attribute, original)]
+_enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(name, site, elapsed):
+    key = (name, site)
+    stats = _stats.get(key)
+    if stats is None:
+        stats = _stats[key] = Stats()
+    stats.add(elapsed)
+
+
+def call_site(depth=2, skip=()):
+    """
+    Return the call site depth frames up, or the first one above it which
+    isn't in one of the modules in skip.
+    """
+    frame = sys._getframe(depth)
+    while frame.f_back is not None and frame.f_globals.get("__name__") in skip:
+        frame = frame.f_back
+    return "%s:%s" % (frame.f_globals.get("__name__"), frame.f_code.co_name)
+
+
+def timed(name, f, skip=()):
+    """
+    Wrap f so each call is recorded under name and the caller's call site.
+    Callers in the modules in skip are looked through.
+    """
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            record(name, call_site(skip=skip), time.perf_counter() - start)
+    wrapper.__wrapped__ = f
+    return wrapper
+
+
+def timed_class(name, cls):
+    """
+    Return a subclass of cls whose construction is recorded like timed. It
+    still makes instances of cls itself, and isinstance and issubclass
+    checks against it are answered for cls, so it can stand in for cls
+    wherever cls is imported.
+    """
+    class TimedType(type(cls)):
+        def __call__(self, *args, **kwargs):
+            if self is not timed_cls:
+                return super().__call__(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return cls(*args, **kwargs)
+            finally:
+                record(name, call_site(), time.perf_counter() - start)
+
+        def __instancecheck__(self, instance):
+            if self is timed_cls:
+                return isinstance(instance, cls)
+            return super().__instancecheck__(instance)
+
+        def __subclasscheck__(self, subclass):
+            if self is timed_cls:
+                return issubclass(subclass, cls)
+            return super().__subclasscheck__(subclass)
+
+    timed_cls = TimedType(cls.__name__, (cls,), dict(__module__=cls.__module__, __wrapped__=cls))
+    return timed_cls
+
+
+def _patch(owner, attribute, wrapper):
+    original = vars(owner).get(attribute, getattr(owner, attribute))
+    _patches.append((owner, attribute, original))
+    setattr(owner, attribute, wrapper)
+
+
+def enable():
+    """
+    Start recording. Safe to call more than once.
+    """
+    global _enabled
+    if _enabled:
+        return
+    import clvm
+    from clvm_tools import binutils
+    from chiasim.hashable import BLSSignature
+    from chiasim.wallet.BLSPrivateKey import BLSPrivateKey
+    from puzzles.puzzle_template import PuzzleTemplate
+
+    modules = [importlib.import_module(_) for _ in TARGET_MODULES]
+    # assembling goes through the cache, so it's counted against whoever
+    # asked the cache for the program
+    _patch(binutils, "assemble", timed("assemble", binutils.assemble, skip=("utilities.assembler",)))
+    _patch(clvm, "run_program", timed("run_program", clvm.run_program))
+    _patch(BLSPrivateKey, "sign", timed("sign", BLSPrivateKey.sign))
+    _patch(BLSSignature, "create", staticmethod(timed("sign", BLSSignature.create)))
+    # a template hashes its segments itself, so it's timed as a whole
+    _patch(PuzzleTemplate, "program_hash", timed("ProgramHash", PuzzleTemplate.program_hash))
+    for module in modules:
+        for name in WRAPPED_GLOBALS:
+            if name not in module.__dict__:
+                continue
+            f = module.__dict__[name]
+            _patch(module, name, timed_class(name, f) if isinstance(f, type) else timed(name, f))
+    _enabled = True
+
+
+def disable():
+    """
+    Put back every original function. The recorded stats are kept.
+    """
+    global _enabled
+    while _patches:
+        owner, attribute, original = _patches.pop()
+        setattr(owner, attribute, original)
+    _enabled = False
+
+
+def reset():
+    _stats.clear()
+
+
+class TimedRemote:
+    """
+    Wraps a chiasim.remote client proxy so that every remote call is
+    recorded as "rpc.<method>".
+    """
+
+    def __init__(self, remote):
+        self._remote = remote
+
+    def __getattr__(self, attribute):
+        f = getattr(self._remote, attribute)
+        if not callable(f):
+            return f
+        name = "rpc.%s" % attribute
+
+        async def wrapper(*args, **kwargs):
+            site = call_site()
+            start = time.perf_counter()
+            try:
+                return await f(*args, **kwargs)
+            finally:
+                record(name, site, time.perf_counter() - start)
+        return wrapper
+
+
+def wrap_remote(remote):
+    """
+    Return remote wrapped by TimedRemote if instrumentation is on, or
+    remote itself if it is off.
+    """
+    if not _enabled or isinstance(remote, TimedRemote):
+        return remote
+    return TimedRemote(remote)
+
+
+def report():
+    """
+    Return {name: {call_site: stats}} with a "total" entry for each name.
+    """
+    r = {}
+    for (name, site), stats in sorted(_stats.items()):
+        r.setdefault(name, {})[site] = stats.as_dict()
+    for name, sites in r.items():
+        total = Stats()
+        for (other_name, site), stats in _stats.items():
+            if other_name == name:
+                total.count += stats.count
+                total.total += stats.total
+                total.max = max(total.max, stats.max)
+                if stats.min is not None and (total.min is None or stats.min < total.min):
+                    total.min = stats.min
+                for bucket, count in stats.buckets.items():
+                    total.buckets[bucket] = total.buckets.get(bucket, 0) + count
+        sites["total"] = total.as_dict()
+    return r
+
+
+def dump(f=None):
+    """
+    Write the report as JSON to f, stderr by default.
+    """
+    f = sys.stderr if f is None else f
+    json.dump(report(), f, indent=2, sort_keys=True)
+    f.write("\n")
+
+
+def _dump_to(path):
+    if path in ("1", "stderr"):
+        dump()
+        return
+    with open(path, "w") as f:
+        dump(f)
+
+
+def enable_from_environment():
+    """
+    Turn instrumentation on if WALLET_INSTRUMENT is set, and dump the
+    report at exit.
+    """
+    value = os.environ.get(ENV_VAR)
+    if not value or value == "0":
+        return
+    enable()
+    atexit.register(_dump_to, value)
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
@@ -0,0 +1,133 @@
+import clvm
+
+from chiasim.hashable import BLSSignature, CoinSolution, Program, SpendBundle
+from chiasim.hashable.CoinSolution import CoinSolutionList
+from chiasim.validation.Conditions import conditions_by_opcode
+from chiasim.validation.consensus import conditions_for_solution, hash_key_pairs_for_conditions_dict
+from chiasim.wallet.BLSPrivateKey import BLSPrivateKey
+
+
+# below this many items the cost of shipping work to another process is
+# more than the cost of doing it here
+MIN_PARALLEL_ITEMS = 16
+
+
+def sign_with(key, message_hash):
+    """
+    Sign message_hash with either a BLSPrivateKey or a bare secret
+    exponent, which is what some of the wallets keep.
+    """
+    if isinstance(key, int):
+        return BLSSignature.create(message_hash, key)
+    return key.sign(message_hash)
+
+
+def portable_key(key):
+    """
+    Turn a key into something that can be pickled and sent to a worker.
+    """
+    if isinstance(key, int):
+        return (key, True)
+    return (key.secret_exponent(), False)
+
+
+def key_for_portable(portable):
+    """
+    Undo portable_key.
+    """
+    secret_exponent, is_exponent = portable
+    if is_exponent:
+        return secret_exponent
+    return BLSPrivateKey.from_secret_exponent(secret_exponent)
+
+
+def signatures_for_solution(key, sexp):
+    """
+    Run a (puzzle solution) pair and sign each AGG_SIG condition it
+    returns.
+    """
+    conditions_dict = conditions_by_opcode(conditions_for_solution(sexp))
+    return [sign_with(key, _.message_hash)
+            for _ in hash_key_pairs_for_conditions_dict(conditions_dict)]
+
+
+def _signatures_for_solution_blob(item):
+    portable, blob = item
+    key = key_for_portable(portable)
+    return [_.sig for _ in signatures_for_solution(key, Program.from_bytes(blob))]
+
+
+def _signature_for_message(item):
+    portable, message_hash = item
+    return sign_with(key_for_portable(portable), message_hash).sig
+
+
+class SigningEngine:
+    """
+    Signs the spends of a transaction, either here or by fanning the work
+    out over an executor such as a concurrent.futures.ProcessPoolExecutor.
+
+    The signatures are returned in the same order either way, so the
+    aggregate signature and the resulting spend bundle are identical.
+    """
+
+    def __init__(self, executor=None, min_parallel=MIN_PARALLEL_ITEMS):
+        self.executor = executor
+        self.min_parallel = min_parallel
+
+    def _use_executor(self, items):
+        return self.executor is not None and len(items) >= self.min_parallel
+
+    def _map(self, f, items):
+        chunksize = max(1, len(items) // (4 * getattr(self.executor, "_max_workers", 1)))
+        return self.executor.map(f, items, chunksize=chunksize)
+
+    def sign_solutions(self, items):
+        """
+        items is a list of (key, puzzle, solution). Returns the signatures for
+        every AGG_SIG condition, in order.
+        """
+        if not self._use_executor(items):
+            sigs = []
+            for key, puzzle, solution in items:
+                sigs.extend(signatures_for_solution(key, clvm.to_sexp_f([puzzle, solution])))
+            return sigs
+        work = [(portable_key(key), bytes(Program(clvm.to_sexp_f([puzzle, solution]))))
+                for key, puzzle, solution in items]
+        return [BLSSignature(sig) for sig_list in self._map(_signatures_for_solution_blob, work)
+                for sig in sig_list]
+
+    def sign_messages(self, items):
+        """
+        items is a list of (key, message_hash). Returns one signature for
+        each, in order.
+        """
+        if not self._use_executor(items):
+            return [sign_with(key, message_hash) for key, message_hash in items]
+        work = [(portable_key(key), message_hash) for key, message_hash in items]
+        return [BLSSignature(sig) for sig in self._map(_signature_for_message, work)]
+
+
+def spend_bundle_for_signatures(spends, sigs):
+    """
+    Build the SpendBundle for (puzzle, CoinSolution) spends signed by sigs.
+    """
+    aggsig = BLSSignature.aggregate(sigs)
+    solution_list = CoinSolutionList(
+        [CoinSolution(coin_solution.coin, clvm.to_sexp_f([puzzle, coin_solution.solution])) for
+         (puzzle, coin_solution) in spends])
+    return SpendBundle(solution_list, aggsig)
+
+
+"""
+Copyright 2018 Chia Network Inc
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+   http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""